@@ -20,12 +20,7 @@ admin.site.register(models.BalanceLinearityUpDown)
 admin.site.register(models.BalanceRepeatability)
 admin.site.register(models.BalanceTaringLinearity)
 admin.site.register(models.BalanceOffCenter)
-
-
-
-
-
-
-
-
-
+admin.site.register(models.IngestJob)
+admin.site.register(models.UploadFingerprint)
+admin.site.register(models.CertificateSnapshot)
+admin.site.register(models.CalibrationIndex)
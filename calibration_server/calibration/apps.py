@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CalibrationConfig(AppConfig):
     name = 'calibration'
+
+    def ready(self):
+        from calibration import signals
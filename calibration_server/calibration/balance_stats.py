@@ -0,0 +1,145 @@
+from statistics import mean, stdev
+
+from calibration.standard_index import StandardLineIndex
+from calibration.uncertainty import balance_uncertainty
+
+BALANCE_READINGS = [
+    'balancecoldstart_set',
+    'balancesettlingtime_set',
+    'balancelinearity_set',
+    'balancelinearityupdown_set',
+    'balancetaringlinearity_set',
+    'balancerepeatability_set',
+    'balanceoffcenter_set',
+]
+
+
+class BalanceStats(object):
+    '''Every statistic reported on a balance certificate.
+
+    The readings of all seven child tables and the lines of the standard
+    are read once, using the prefetch cache when the balance was loaded
+    with Balance.objects.with_readings(), and the statistics are computed
+    in a single pass when the object is created.'''
+
+    def __init__(self, balance):
+        self.balance = balance
+        self.cold_start = list(balance.balancecoldstart_set.all())
+        self.settling_time = list(balance.balancesettlingtime_set.all())
+        self.linearity = list(balance.balancelinearity_set.all())
+        self.linearity_up_down = list(
+            balance.balancelinearityupdown_set.all())
+        self.taring_linearity = list(
+            balance.balancetaringlinearity_set.all())
+        self.repeatability = list(balance.balancerepeatability_set.all())
+        self.off_center = list(balance.balanceoffcenter_set.all())
+        self.standard_lines = list(balance.standard.standardline_set.all()) \
+            if balance.standard_id else []
+        self.line_index = StandardLineIndex(self.standard_lines)
+
+        self.compute_cold_start()
+        self.compute_off_center()
+        self.compute_repeatability()
+        self.settling_average = mean(
+            i.measurement for i in self.settling_time) \
+                if self.settling_time else None
+        self.up_down_linearity = self.compute_up_down_linearity()
+        self.uncertainty = self.compute_uncertainty()
+
+    def closest_line(self, value):
+        '''the line of the standard whose actual mass is nearest value'''
+        return self.line_index.nearest(value)
+
+    def compute_cold_start(self):
+        self.cold_nominal = None
+        self.cold_drift = None
+        if self.cold_start:
+            cold_values = [i.measurement for i in self.cold_start]
+            self.cold_nominal = self.cold_start[0].nominal
+            average_over_span = (min(cold_values) + max(cold_values)) / 2
+            self.cold_drift = round(abs(float(self.cold_nominal) - \
+                average_over_span), 4)
+
+    def compute_off_center(self):
+        measurements = [i.measurement for i in self.off_center]
+        self.corner_weight = self.off_center[0].mass_piece \
+            if self.off_center else None
+        self.max_corner_error = None
+        if self.corner_weight:
+            self.max_corner_error = max([0] + [abs(m - self.corner_weight) \
+                for m in measurements])
+
+        self.off_center_min = min(measurements) if measurements else None
+        self.off_center_max = max(measurements) if measurements else None
+        self.off_center_mean = mean(measurements) if measurements else None
+        self.off_center_min_error = min(i.difference \
+            for i in self.off_center) if self.off_center else None
+        self.off_center_stdev = stdev(measurements) \
+            if len(measurements) > 1 else None
+
+    def compute_repeatability(self):
+        half = [i.half_load for i in self.repeatability]
+        full = [i.full_load for i in self.repeatability]
+        self.half_repeat = stdev(half) if len(half) > 1 else 0
+        self.full_repeat = stdev(full) if len(full) > 1 else 0
+        self.repeat_half_average = mean(half) if half else None
+        self.repeat_full_average = mean(full) if full else None
+        self.repeat_half_stdev = round(self.half_repeat, 4) \
+            if len(half) > 1 else None
+        self.repeat_full_stdev = round(self.full_repeat, 4) \
+            if len(full) > 1 else None
+
+        self.repeat_nominal_half = self.repeat_actual_half = None
+        self.repeat_nominal_full = self.repeat_actual_full = None
+        if self.repeatability:
+            closest_half = self.closest_line(half[0])
+            closest_full = self.closest_line(full[0])
+            if closest_half:
+                self.repeat_nominal_half = closest_half.nominal
+                self.repeat_actual_half = closest_half.actual
+            if closest_full:
+                self.repeat_nominal_full = closest_full.nominal
+                self.repeat_actual_full = closest_full.actual
+
+    def compute_up_down_linearity(self):
+        readings = self.linearity_up_down
+        up = readings[:5]
+        down = readings[4:9]
+        up2 = readings[10:15]
+
+        if len(up) != len(down) or len(up) != len(up2):
+            return None
+
+        closest_lines = self.line_index.nearest_many(
+            [mea.measurement for mea in up])
+        res = []
+        for i in range(len(up)):
+            closest = closest_lines[i]
+            data = {}
+            data['nom'] = closest.nominal if closest else None
+            data['actual'] = closest.actual if closest else None
+            data['up'] = up[i].measurement
+            data['down'] = down[i].measurement
+            data['up2'] = up2[i].measurement
+            reading_list = [up[i].measurement,
+                            down[i].measurement,
+                            up2[i].measurement]
+            data['avg'] = round(mean(reading_list), 4)
+            data['stdev'] = round(stdev(reading_list), 4)
+            data['diff'] = round(abs(data['actual'] - mean(reading_list)), 4) \
+                if closest else None
+
+            res.append(data)
+
+        return res
+
+    def compute_uncertainty(self):
+        '''overall uncertainty of the data derived from the
+        uncertainty of the standards, the measurements
+        drift, repeatbility'''
+        return balance_uncertainty(
+            [i.uncertainty for i in self.standard_lines],
+            self.balance.resolution,
+            self.cold_drift,
+            self.half_repeat,
+            self.full_repeat)
@@ -0,0 +1,93 @@
+from django.db import transaction
+
+from calibration import models, search
+from calibration.certificates import calibration_type
+from calibration.dashboard import invalidate_dashboard_stats
+
+INDEX_MODELS = [models.Balance, models.Autoclave, models.GenericCalibration]
+# the calibration_type of each indexed model, by name so that the migration
+# creating the index can fill it from its historical models
+INDEX_MODEL_NAMES = [
+    ('balance', 'Balance'),
+    ('autoclave', 'Autoclave'),
+    ('generic', 'GenericCalibration'),
+]
+
+# copied from the calibration to its CalibrationIndex row
+INDEX_FIELDS = [
+    'customer_id',
+    'date',
+    'due',
+    'serial',
+    'name_of_instrument',
+    'certificate_number',
+    'certificate_timestamp',
+]
+
+
+def index_values(obj):
+    values = {field: getattr(obj, field) for field in INDEX_FIELDS}
+    values['type'] = obj.type_string
+    return values
+
+
+def sync(obj):
+    row, _ = models.CalibrationIndex.objects.update_or_create(
+        calibration_type=calibration_type(obj),
+        calibration_id=obj.pk,
+        defaults=index_values(obj))
+    search.update(row.pk, obj)
+    return row
+
+
+def remove(obj):
+    rows = models.CalibrationIndex.objects.filter(
+        calibration_type=calibration_type(obj),
+        calibration_id=obj.pk)
+    search.remove(list(rows.values_list('pk', flat=True)))
+    rows.delete()
+
+
+def fill(index_model, get_model, batch_size=1000, progress=None):
+    '''bulk creates an index row for every calibration. Only model fields
+    are read, so it also runs on the historical models of a migration,
+    get_model returns the model class for a name.'''
+    written = 0
+    for typ, name in INDEX_MODEL_NAMES:
+        # only what the row is built from, the TextFields are skipped
+        fields = ['customer'] + INDEX_FIELDS[1:]
+        if typ == 'generic':
+            fields.append('type')
+
+        rows = []
+        for obj in get_model(name).objects.only(*fields).iterator(
+                chunk_size=batch_size):
+            values = {field: getattr(obj, field) for field in INDEX_FIELDS}
+            values['type'] = obj.type if typ == 'generic' else typ
+            rows.append(index_model(calibration_type=typ,
+                calibration_id=obj.pk, **values))
+            if len(rows) >= batch_size:
+                index_model.objects.bulk_create(rows)
+                written += len(rows)
+                rows = []
+                if progress:
+                    progress(written)
+
+        index_model.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def rebuild(batch_size=1000, progress=None):
+    '''replaces the whole index, and the full text search index keyed on
+    it, with rows built from the calibration tables. For calibrations
+    written without signals such as by bulk_create.'''
+    with transaction.atomic():
+        models.CalibrationIndex.objects.all().delete()
+        written = fill(models.CalibrationIndex,
+            lambda name: getattr(models, name), batch_size, progress)
+        search.rebuild()
+        # the dashboard counts are read from the index
+        transaction.on_commit(invalidate_dashboard_stats)
+
+    return written
@@ -0,0 +1,170 @@
+import json
+
+from calibration import models
+
+# bump when the layout of the results changes so snapshots written by an
+# older version can be told apart
+SNAPSHOT_VERSION = 1
+
+STAT_FIELDS = [
+    'cold_nominal',
+    'cold_drift',
+    'corner_weight',
+    'max_corner_error',
+    'settling_average',
+    'half_repeat',
+    'full_repeat',
+    'uncertainty',
+    'up_down_linearity',
+    'repeat_half_average',
+    'repeat_full_average',
+    'repeat_half_stdev',
+    'repeat_full_stdev',
+    'repeat_nominal_half',
+    'repeat_nominal_full',
+    'repeat_actual_half',
+    'repeat_actual_full',
+    'off_center_min',
+    'off_center_max',
+    'off_center_mean',
+    'off_center_min_error',
+    'off_center_stdev',
+]
+
+
+def calibration_type(obj):
+    '''the type keys used by the certificate urls'''
+    if isinstance(obj, models.Balance):
+        return 'balance'
+    if isinstance(obj, models.Autoclave):
+        return 'autoclave'
+    return 'generic'
+
+
+def standard_results(standard):
+    if standard is None:
+        return None
+    return {
+        'name': standard.name,
+        'serial': standard.serial,
+        'certificate': standard.certificate,
+        'traceability': standard.traceability,
+    }
+
+
+def balance_results(bal):
+    stats = bal.stats
+    results = {field: getattr(stats, field) for field in STAT_FIELDS}
+    results.update({
+        'standard': standard_results(bal.standard),
+        'standard_lines': [{
+            'nominal': line.nominal,
+            'actual': line.actual,
+            'uncertainty': line.uncertainty,
+        } for line in stats.standard_lines],
+        'cold_start': [{
+            'measurement': mea.measurement
+        } for mea in stats.cold_start],
+        'settling_time': [{
+            'measurement': mea.measurement
+        } for mea in stats.settling_time],
+        'linearity': [{
+            'nominal': mea.nominal,
+            'actual': mea.actual,
+            'measurement': mea.measurement,
+            'difference': mea.difference,
+        } for mea in stats.linearity],
+        'repeatability': [{
+            'half_load': mea.half_load,
+            'full_load': mea.full_load,
+        } for mea in stats.repeatability],
+        'off_center': [{
+            'measurement': mea.measurement,
+            'difference': mea.difference,
+        } for mea in stats.off_center],
+    })
+    return results
+
+
+def autoclave_results(auto):
+    return {
+        'uncertainty_pressure': auto.uncertainty_pressure,
+        'uncertainty_temp': auto.uncertainty_temp,
+        'standard': standard_results(auto.standard),
+        'temp_standard': standard_results(auto.temp_standard),
+        'pressure_lines': [{
+            'applied_mass': line.applied_mass,
+            'calculated_pressure': line.calculated_pressure,
+            'measured': line.measured,
+            'correction': line.correction,
+        } for line in auto.pressure_lines],
+        'temperature_lines': [{
+            'input_signal': line.input_signal,
+            'measured': line.measured,
+            'correction': line.correction,
+        } for line in auto.autoclavetemperaturecalibrationline_set.all()],
+    }
+
+
+def generic_results(gc):
+    results = {
+        'uncertainty': gc.uncertainty,
+        'standard': standard_results(gc.standard),
+        'lines': [{
+            'input_signal': line.input_signal,
+            'measured': line.measured,
+            'correction': line.correction,
+        } for line in gc.genericcalibrationline_set.all()],
+    }
+    if gc.type == 'pressure':
+        results['pressure_lines'] = [{
+            'applied_mass': line.applied_mass,
+            'calculated_pressure': line.calculated_pressure,
+            'measured': line.measured,
+            'correction': line.correction,
+        } for line in gc.pressure_lines]
+    return results
+
+
+def certificate_results(obj):
+    '''computes every derived value a certificate displays'''
+    return {
+        'balance': balance_results,
+        'autoclave': autoclave_results,
+        'generic': generic_results,
+    }[calibration_type(obj)](obj)
+
+
+def issue(obj):
+    '''freezes the results of an issued certificate so later downloads
+    render from the snapshot rather than from the readings'''
+    snapshot, _ = models.CertificateSnapshot.objects.update_or_create(
+        calibration_type=calibration_type(obj),
+        calibration_id=obj.pk,
+        defaults={
+            'certificate_number': obj.certificate_number,
+            'version': SNAPSHOT_VERSION,
+            'data': json.dumps(certificate_results(obj)),
+        })
+    return snapshot
+
+
+def snapshot_for(obj):
+    '''the snapshot of an issued certificate, None for a draft and for
+    certificates issued before snapshots existed'''
+    if not obj.certificate_number:
+        return None
+    return models.CertificateSnapshot.objects.filter(
+        calibration_type=calibration_type(obj),
+        calibration_id=obj.pk,
+        certificate_number=obj.certificate_number).first()
+
+
+def results_for(obj):
+    '''the snapshot of an issued certificate, or the live results for a
+    preview and for certificates issued before snapshots existed'''
+    snapshot = snapshot_for(obj)
+    if snapshot:
+        return snapshot.results
+
+    return certificate_results(obj)
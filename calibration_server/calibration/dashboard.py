@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from calibration import metrics, models
+
+DASHBOARD_STATS_KEY = 'calibration:dashboard-stats'
+
+GENERIC_TYPES = [
+    ('Temperature', 'temperature'),
+    ('Pressure', 'pressure'),
+    ('Current', 'current'),
+    ('Flow', 'flow'),
+    ('Voltage', 'voltage'),
+    ('PH', 'ph'),
+    ('Conductivity', 'conductivity'),
+]
+
+
+def compute_dashboard_stats():
+    '''computes the dashboard figures with one aggregate query over the 
+    calibration index'''
+    counts = models.CalibrationIndex.objects.aggregate(
+        outstanding=Count('pk', filter=Q(certificate_number='')),
+        balance=Count('pk', filter=Q(calibration_type='balance')),
+        autoclave=Count('pk', filter=Q(calibration_type='autoclave')),
+        **{typ: Count('pk', filter=Q(calibration_type='generic', type=typ)) \
+            for _, typ in GENERIC_TYPES})
+
+    types = [
+        {'name': 'Balance', 'count': counts['balance']},
+        {'name': 'Autoclave', 'count': counts['autoclave']},
+    ]
+    for name, typ in GENERIC_TYPES:
+        types.append({'name': name, 'count': counts[typ]})
+
+    customers = [{
+            'pk': cus.pk,
+            'name': cus.name,
+            'total': cus.total
+        } for cus in models.Customer.objects.with_stats()]
+
+    return {
+        'outstanding': counts['outstanding'],
+        'types': types,
+        'customers': customers,
+        'standard_count': models.Standard.objects.count(),
+    }
+
+
+def dashboard_stats():
+    '''returns the cached dashboard snapshot, computing it if it has been 
+    invalidated since the last read'''
+    stats = cache.get(DASHBOARD_STATS_KEY)
+    metrics.cache_lookup('dashboard', stats is not None)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_STATS_KEY, stats, None)
+
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_STATS_KEY)
@@ -0,0 +1,365 @@
+import csv
+import io
+import itertools
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import dateparse
+
+from calibration import metrics, models
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+CERTIFICATE_TYPES = {
+    'balance': (models.Balance, 'calibration:balance-pdf'),
+    'autoclave': (models.Autoclave, 'calibration:autoclave-pdf'),
+    'generic': (models.GenericCalibration, 'calibration:generic-pdf'),
+}
+
+
+def request_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def render_certificate(typ, pk):
+    '''renders a certificate through its pdf view outside of a request, so
+    the certificate cache is used and filled as it is for downloads'''
+    from calibration import views
+    view = {
+        'balance': views.BalancePDFView,
+        'autoclave': views.AutoclavePDFView,
+        'generic': views.GenericPDFView,
+    }[typ]
+    _, url_name = CERTIFICATE_TYPES[typ]
+    request = RequestFactory(HTTP_HOST=request_host()).get(
+        reverse(url_name, kwargs={'pk': pk}))
+    response = view.as_view()(request, pk=pk)
+    if hasattr(response, 'render'):
+        response.render()
+        return response.content
+
+    # cached certificates come back as file responses
+    try:
+        return b''.join(response.streaming_content)
+    finally:
+        response.close()
+
+
+class SelectionError(ValueError):
+    pass
+
+
+def parse_date(value):
+    try:
+        date = dateparse.parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise SelectionError('%r is not a YYYY-MM-DD date' % value)
+    return date
+
+
+def parse_ids(ids):
+    '''{type: [pk]} for "type:pk" strings'''
+    wanted = {}
+    for value in ids:
+        typ, _, pk = value.partition(':')
+        if typ not in CERTIFICATE_TYPES or not pk.isdigit():
+            raise SelectionError('%r is not a certificate, expected one of '
+                '%s followed by :pk' % (value, ', '.join(CERTIFICATE_TYPES)))
+        wanted.setdefault(typ, []).append(int(pk))
+    return wanted
+
+
+def select_certificates(customer=None, start=None, end=None, ids=None):
+    '''returns (type, pk, certificate number) for the issued certificates
+    of a customer and date range, or for the "type:pk" strings in ids.
+    Raises SelectionError for a malformed id, customer or date.'''
+    if ids:
+        querysets = {typ: CERTIFICATE_TYPES[typ][0].objects.filter(
+            pk__in=pks) for typ, pks in parse_ids(ids).items()}
+    else:
+        if customer is not None and not isinstance(customer,
+                models.Customer) and not str(customer).isdigit():
+            raise SelectionError('%r is not a customer id' % customer)
+        start = parse_date(start) if start else None
+        end = parse_date(end) if end else None
+        querysets = {}
+        for typ, (model, _) in CERTIFICATE_TYPES.items():
+            qs = model.objects.all()
+            if customer:
+                qs = qs.filter(customer=customer)
+            if start:
+                qs = qs.filter(date__gte=start)
+            if end:
+                qs = qs.filter(date__lte=end)
+            querysets[typ] = qs
+
+    certificates = []
+    for typ, qs in querysets.items():
+        # drafts have no certificate to export
+        qs = qs.exclude(certificate_number='')
+        certificates += [(typ, pk, number) for pk, number in \
+            qs.order_by('date', 'pk').values_list('pk', 'certificate_number')]
+    return certificates
+
+
+def init_worker():
+    # a no-op for forked workers, sets django up for spawned ones
+    django.setup()
+
+
+def render_job(typ, pk):
+    '''runs in a pool process, failures are returned rather than raised
+    so one certificate cannot abort the export'''
+    try:
+        return render_certificate(typ, pk), None
+    except Exception as e:
+        return None, '%s: %s' % (type(e).__name__, e)
+    finally:
+        # the pool may be shut down before a later flush
+        metrics.registry.flush(force=True)
+
+
+def render_all(certificates, workers=None):
+    '''renders the certificates in a process pool, yielding
+    (certificate, pdf, error) as they complete. At most a few jobs per
+    process are in flight so finished pdfs do not pile up in memory.'''
+    workers = workers or os.cpu_count() or 1
+    # forked processes must not share the parent's database connections
+    connections.close_all()
+    pending = iter(certificates)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers,
+            initializer=init_worker) as executor:
+        while True:
+            while len(running) < workers * 2:
+                cert = next(pending, None)
+                if cert is None:
+                    break
+                running[executor.submit(render_job, cert[0], cert[1])] = cert
+            if not running:
+                return
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                cert = running.pop(future)
+                try:
+                    pdf, error = future.result()
+                except Exception as e:
+                    pdf, error = None, '%s: %s' % (type(e).__name__, e)
+                yield cert, pdf, error
+
+
+class ZipBuffer(object):
+    '''a write only file object whose contents are handed out and dropped
+    as the zip is produced'''
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def certificate_filename(cert):
+    typ, pk, number = cert
+    return '%s-%d-%s.pdf' % (typ, pk, number or 'draft')
+
+
+def stream_zip(certificates, workers=None):
+    '''yields a zip archive of the rendered certificates chunk by chunk,
+    failed certificates are listed in errors.txt'''
+    buffer = ZipBuffer()
+    errors = []
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for cert, pdf, error in render_all(certificates, workers):
+            if error:
+                errors.append('%s %s' % (certificate_filename(cert), error))
+            else:
+                archive.writestr(certificate_filename(cert), pdf)
+            yield buffer.drain()
+
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+    yield buffer.drain()
+
+
+# the columns exported from each list, calibration_status is annotated by
+# with_status()
+CALIBRATION_COLUMNS = ['date', 'customer__name', 'name_of_instrument',
+    'manufacturer', 'model', 'serial', 'units', 'range_lower', 'range_upper',
+    'resolution', 'certificate_number', 'due', 'calibration_status']
+EXPORT_COLUMNS = {
+    models.Balance: CALIBRATION_COLUMNS,
+    models.Autoclave: CALIBRATION_COLUMNS,
+    models.GenericCalibration: ['type'] + CALIBRATION_COLUMNS,
+    models.CalibrationIndex: ['calibration_type', 'calibration_id', 'type',
+        'date', 'customer__name', 'name_of_instrument', 'serial',
+        'certificate_number', 'due', 'calibration_status'],
+}
+EXPORT_HEADERS = {
+    'customer__name': 'customer',
+    'calibration_status': 'status',
+}
+
+# the line models holding the readings of each calibration
+READING_MODELS = {
+    models.Balance: [
+        models.BalanceColdStart,
+        models.BalanceSettlingTime,
+        models.BalanceLinearityUpDown,
+        models.BalanceLinearity,
+        models.BalanceTaringLinearity,
+        models.BalanceRepeatability,
+        models.BalanceOffCenter,
+    ],
+    models.Autoclave: [
+        models.AutoclaveTemperatureCalibrationLine,
+        models.AutoclavePressureCalibrationLine,
+    ],
+    models.GenericCalibration: [
+        models.GenericCalibrationLine,
+        models.PressureCalibrationLine,
+    ],
+}
+
+EXPORT_CHUNK_SIZE = 500
+# rows per worksheet allowed by the xlsx format, less the heading
+XLSX_MAX_ROWS = 1048575
+
+
+def reading_fields(model):
+    return [f.name for f in model._meta.concrete_fields \
+        if f.name not in ('id', 'calibration')]
+
+
+def reading_columns(model):
+    '''the union of the reading fields of a calibration model's lines, in
+    the order they are first seen'''
+    columns = []
+    for line_model in READING_MODELS.get(model, []):
+        columns += [f for f in reading_fields(line_model) if f not in columns]
+    return columns
+
+
+def export_headings(model):
+    headings = ['id'] + [EXPORT_HEADERS.get(c, c) for c in \
+        EXPORT_COLUMNS[model]]
+    if model in READING_MODELS:
+        headings += ['reading'] + reading_columns(model)
+    return headings
+
+
+def chunk_readings(model, ids):
+    '''the readings of the calibrations in ids as {id: [(kind, values)]},
+    one query per line model'''
+    columns = reading_columns(model)
+    readings = {}
+    for line_model in READING_MODELS[model]:
+        fields = reading_fields(line_model)
+        kind = line_model._meta.verbose_name
+        for row in line_model.objects.filter(calibration_id__in=ids) \
+                .order_by('calibration_id', 'id') \
+                .values_list('calibration_id', *fields):
+            values = dict(zip(fields, row[1:]))
+            readings.setdefault(row[0], []).append(
+                (kind, [values.get(c, '') for c in columns]))
+    return readings
+
+
+def export_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    '''yields the export rows of a filtered list queryset a chunk at a
+    time, with a row per reading. The calibrations are read with a server
+    side iterator and their readings are fetched a chunk at a time, so
+    only one chunk is ever held.'''
+    model = queryset.model
+    rows = queryset.order_by('-date', '-id').values_list('pk',
+        *EXPORT_COLUMNS[model]).iterator(chunk_size=chunk_size)
+    width = len(reading_columns(model))
+    while True:
+        calibrations = list(itertools.islice(rows, chunk_size))
+        if not calibrations:
+            return
+        if model not in READING_MODELS:
+            yield calibrations
+            continue
+
+        readings = chunk_readings(model, [row[0] for row in calibrations])
+        chunk = []
+        for row in calibrations:
+            lines = readings.get(row[0]) or [('', [''] * width)]
+            for kind, values in lines:
+                chunk.append(list(row) + [kind] + values)
+        yield chunk
+
+
+def stream_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    '''yields the csv export of queryset, a chunk of rows at a time'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_headings(queryset.model))
+    for chunk in export_chunks(queryset, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(queryset, output, chunk_size=EXPORT_CHUNK_SIZE):
+    '''writes the export of queryset to the output file as a workbook.
+    xlsxwriter's constant memory mode flushes each row to disk as it is
+    written, a new sheet is started when one is full.'''
+    headings = export_headings(queryset.model)
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+    })
+    sheet = None
+    row_number = XLSX_MAX_ROWS
+    for chunk in export_chunks(queryset, chunk_size):
+        for row in chunk:
+            if row_number >= XLSX_MAX_ROWS:
+                sheet = workbook.add_worksheet()
+                sheet.write_row(0, 0, headings)
+                row_number = 0
+            row_number += 1
+            sheet.write_row(row_number, 0, row)
+    if sheet is None:
+        workbook.add_worksheet().write_row(0, 0, headings)
+    workbook.close()
+
+
+def xlsx_file(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    '''the workbook in an anonymous temporary file, ready to be read'''
+    output = tempfile.TemporaryFile()
+    write_xlsx(queryset, output, chunk_size)
+    output.seek(0)
+    return output
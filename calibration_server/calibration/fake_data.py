@@ -0,0 +1,486 @@
+import datetime
+import random
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from calibration import calibration_index, models
+from calibration.dashboard import GENERIC_TYPES
+from calibration.standard_index import bump_version
+from calibration.units import GRAMS_PER_PSI, PRESSURE_UNITS, pressure_psi
+
+CHUNK_SIZE = 5000
+
+# readings written for each calibration, the most each section of the
+# datasheet takes
+BALANCE_READINGS = {
+    models.BalanceColdStart: 5,
+    models.BalanceSettlingTime: 10,
+    models.BalanceLinearityUpDown: 15,
+    models.BalanceLinearity: 5,
+    models.BalanceTaringLinearity: 10,
+    models.BalanceRepeatability: 10,
+    models.BalanceOffCenter: 5,
+}
+AUTOCLAVE_READINGS = {
+    models.AutoclaveTemperatureCalibrationLine: 5,
+    models.AutoclavePressureCalibrationLine: 5,
+}
+GENERIC_READINGS = 5
+
+# (instrument, units, range lower, range upper, resolution) per type
+INSTRUMENTS = {
+    'balance': [
+        ('Analytical Balance', 'g', 0, 220, 0.0001),
+        ('Precision Balance', 'g', 0, 3000, 0.01),
+        ('Top Loading Balance', 'g', 0, 6000, 0.1),
+    ],
+    'autoclave': [
+        ('Autoclave', 'bar', 0, 4, 0.01),
+        ('Steriliser', 'kpa', 0, 400, 1),
+    ],
+    'temperature': [('Thermometer', 'C', -20, 150, 0.1)],
+    'pressure': [('Pressure Gauge', 'psi', 0, 100, 0.5)],
+    'current': [('Current Loop Calibrator', 'mA', 4, 20, 0.01)],
+    'flow': [('Flow Meter', 'L/min', 0, 100, 0.1)],
+    'voltage': [('Multimeter', 'V', 0, 100, 0.01)],
+    'ph': [('pH Meter', 'pH', 0, 14, 0.01)],
+    'conductivity': [('Conductivity Meter', 'uS/cm', 0, 2000, 1)],
+}
+MANUFACTURERS = ['Mettler Toledo', 'Sartorius', 'Ohaus', 'Fluke', 'WIKA',
+    'Hanna', 'Tuttnauer', 'Adam', 'Kern', 'Endress+Hauser']
+LOCATIONS = ['Laboratory', 'Workshop', 'Production', 'Stores', 'QC']
+
+# the weights of a standard mass set in grams
+MASS_SET = [1, 2, 2, 5, 10, 20, 20, 50, 100, 200, 200, 500, 1000, 2000, 5000]
+
+ISSUED = 0.85
+
+
+def bulk_insert(model, fields, rows):
+    '''writes rows of values for fields straight to the model's table with
+    executemany, no model instances are built and no signals are sent'''
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(field).column for field in fields]
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        quote(model._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def next_id(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return (last or 0) + 1
+
+
+class FakeDataGenerator(object):
+    '''Fills the database with random but plausible customers, standards
+    and calibrations of every type with a full set of readings.
+
+    The same seed gives the same data on an empty database. Primary keys
+    are assigned here so readings can refer to calibrations that were
+    written with executemany, and rows are written a chunk at a time each
+    in its own transaction. The calibration index is rebuilt at the end as
+    bulk inserts skip the signals that maintain it.'''
+
+    def __init__(self, seed=0, chunk_size=CHUNK_SIZE, progress=None):
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        # called with (table, rows) after each chunk is written
+        self.progress = progress
+        self.today = datetime.date.today()
+        self.rows = 0
+        self.customer_ids = []
+        self.standard_ids = []
+        self.standard_lines = {}
+
+    def run(self, customers, standards, calibrations, years=5):
+        '''calibrations of each type, spread over the last years'''
+        self.years = years
+        self.create_customers(customers)
+        self.create_standards(standards)
+        self.create_balances(calibrations)
+        self.create_autoclaves(calibrations)
+        self.create_generic(calibrations)
+        self.reset_sequences()
+        calibration_index.rebuild(self.chunk_size)
+        return self.rows
+
+    def report(self, model, written):
+        self.rows += written
+        if self.progress:
+            self.progress(model._meta.db_table, written)
+
+    def write(self, model, fields, rows):
+        with transaction.atomic():
+            bulk_insert(model, fields, rows)
+        self.report(model, len(rows))
+
+    def create_customers(self, count):
+        start = next_id(models.Customer)
+        rows = []
+        for pk in range(start, start + count):
+            rows.append((pk, 'Customer %d' % pk,
+                '%d Industrial Road' % self.rng.randint(1, 500),
+                'lab%d@example.com' % pk,
+                '0%09d' % self.rng.randint(0, 10 ** 9 - 1)))
+            if len(rows) >= self.chunk_size:
+                self.write(models.Customer, ['id', 'name', 'address',
+                    'email', 'phone'], rows)
+                rows = []
+        self.write(models.Customer, ['id', 'name', 'address', 'email',
+            'phone'], rows)
+        self.customer_ids = list(range(start, start + count))
+
+    def create_standards(self, count):
+        start = next_id(models.Standard)
+        line_id = next_id(models.StandardLine)
+        standards = []
+        lines = []
+        for pk in range(start, start + count):
+            standards.append((pk, 'Fake Standard %d' % pk,
+                'STD-%06d' % pk, 'SN%08d' % self.rng.randint(0, 10 ** 8),
+                'Traceable to national standards'))
+            self.standard_lines[pk] = []
+            for nominal in MASS_SET:
+                actual = nominal + self.rng.gauss(0, nominal * 1e-5)
+                lines.append((line_id, pk, nominal, actual,
+                    nominal * 5e-6 + 0.00002))
+                self.standard_lines[pk].append((nominal, actual))
+                line_id += 1
+
+        self.write(models.Standard, ['id', 'name', 'certificate', 'serial',
+            'traceability'], standards)
+        self.write(models.StandardLine, ['id', 'standard', 'nominal',
+            'actual', 'uncertainty'], lines)
+        self.standard_ids = list(range(start, start + count))
+        for pk in self.standard_ids:
+            bump_version(pk)
+
+    def common(self, pk, typ):
+        '''the values of the fields every calibration type shares, in the
+        order of COMMON_FIELDS'''
+        rng = self.rng
+        instrument, units, lower, upper, resolution = rng.choice(
+            INSTRUMENTS[typ])
+        date = self.today - datetime.timedelta(
+            days=rng.randint(0, self.years * 365))
+        start = datetime.time(rng.randint(7, 16), rng.choice([0, 15, 30]))
+        timestamp = None
+        number = ''
+        if rng.random() < ISSUED:
+            number = 'CERT-%s-%07d' % (typ[:3].upper(), pk)
+            timestamp = timezone.make_aware(datetime.datetime.combine(
+                date + datetime.timedelta(days=rng.randint(0, 14)), start))
+        return [
+            pk,
+            connection.ops.adapt_datefield_value(date),
+            connection.ops.adapt_datefield_value(
+                date + datetime.timedelta(days=365)),
+            rng.choice(self.customer_ids) if self.customer_ids else None,
+            rng.choice(self.standard_ids) if self.standard_ids else None,
+            connection.ops.adapt_timefield_value(start),
+            connection.ops.adapt_timefield_value(datetime.time(
+                start.hour + 1, start.minute)),
+            '%.1f' % rng.uniform(18, 25),
+            '%d' % rng.randint(30, 70),
+            '%s-%06d' % (typ[:2].upper(), rng.randint(0, 10 ** 6)),
+            rng.choice(MANUFACTURERS),
+            '',
+            'M%d' % rng.randint(100, 999),
+            instrument,
+            resolution,
+            units,
+            rng.choice(LOCATIONS),
+            lower,
+            upper,
+            '',
+            number,
+            connection.ops.adapt_datetimefield_value(timestamp),
+        ]
+
+    def create_calibrations(self, model, count, typ_for, extra_fields,
+            extra, readings):
+        '''writes count calibrations of model, typ_for picks the type of
+        each one and extra and readings give the type specific fields and
+        reading rows of a calibration'''
+        fields = COMMON_FIELDS + extra_fields
+        start = next_id(model)
+        line_ids = {line_model: next_id(line_model) \
+            for line_model in readings.keys()}
+        parents = []
+        lines = {line_model: [] for line_model in readings.keys()}
+        for pk in range(start, start + count):
+            typ = typ_for()
+            row = self.common(pk, typ)
+            parents.append(row + extra(typ, row))
+            for line_model, make in readings.items():
+                for values in make(typ, row):
+                    lines[line_model].append(
+                        (line_ids[line_model], pk) + values)
+                    line_ids[line_model] += 1
+
+            if len(parents) >= self.chunk_size or pk == start + count - 1:
+                with transaction.atomic():
+                    bulk_insert(model, fields, parents)
+                    for line_model, rows in lines.items():
+                        bulk_insert(line_model, ['id', 'calibration'] + \
+                            LINE_FIELDS[line_model], rows)
+                self.report(model, len(parents))
+                for line_model, rows in lines.items():
+                    self.report(line_model, len(rows))
+                parents = []
+                lines = {line_model: [] for line_model in readings.keys()}
+
+    def measured(self, value, resolution):
+        '''a reading of value by an instrument of the resolution'''
+        noise = self.rng.gauss(0, resolution * 2)
+        return round(round((value + noise) / resolution) * resolution, 6)
+
+    def pressure_readings(self, row, n):
+        '''(applied mass, input pressure, measured) for n dead weight
+        tester loads spread up to the top of the range'''
+        convert = PRESSURE_UNITS[row[UNITS]]
+        top = (row[UPPER] / convert(1.0) - pressure_psi(0)) * GRAMS_PER_PSI
+        readings = []
+        for i in range(n):
+            mass = round(top * (i + 1) / n)
+            pressure = convert(pressure_psi(mass))
+            readings.append((float(mass), round(pressure, 6),
+                self.measured(pressure, row[RESOLUTION])))
+        return readings
+
+    def create_balances(self, count):
+        measured = self.measured
+
+        def loads(row, n):
+            upper = row[UPPER]
+            return [upper * (i + 1) / n for i in range(n)]
+
+        def cold_start(typ, row):
+            load = row[UPPER] / 2
+            return [(measured(load, row[RESOLUTION]), load) \
+                for _ in range(BALANCE_READINGS[models.BalanceColdStart])]
+
+        def settling_time(typ, row):
+            load = row[UPPER] / 2
+            return [(measured(load, row[RESOLUTION]),) \
+                for _ in range(BALANCE_READINGS[models.BalanceSettlingTime])]
+
+        def linearity_up_down(typ, row):
+            n = BALANCE_READINGS[models.BalanceLinearityUpDown]
+            up = loads(row, (n + 1) // 2)
+            values = up + list(reversed(up))[1:]
+            return [(measured(load, row[RESOLUTION]),) \
+                for load in values[:n]]
+
+        def linearity(typ, row):
+            lines = self.standard_lines.get(row[STANDARD]) or []
+            ranged = [l for l in lines if l[0] <= row[UPPER]] or lines
+            # weights spread from the lightest to the heaviest in range
+            n = BALANCE_READINGS[models.BalanceLinearity]
+            picked = [ranged[round(i * (len(ranged) - 1) / (n - 1))] \
+                for i in range(n)] if ranged else []
+            return [(actual, nominal, measured(actual, row[RESOLUTION])) \
+                for nominal, actual in picked]
+
+        def taring(typ, row):
+            load = row[UPPER] / 4
+            return [(tare, measured(load, row[RESOLUTION])) for tare in \
+                loads(row, BALANCE_READINGS[models.BalanceTaringLinearity])]
+
+        def repeatability(typ, row):
+            half, full = row[UPPER] / 2, row[UPPER]
+            return [(measured(half, row[RESOLUTION]),
+                     measured(full, row[RESOLUTION])) for _ in \
+                range(BALANCE_READINGS[models.BalanceRepeatability])]
+
+        def off_center(typ, row):
+            piece = row[UPPER] / 3
+            return [(measured(piece, row[RESOLUTION]), piece) \
+                for _ in range(BALANCE_READINGS[models.BalanceOffCenter])]
+
+        self.create_calibrations(models.Balance, count, lambda: 'balance',
+            [], lambda typ, row: [], {
+                models.BalanceColdStart: cold_start,
+                models.BalanceSettlingTime: settling_time,
+                models.BalanceLinearityUpDown: linearity_up_down,
+                models.BalanceLinearity: linearity,
+                models.BalanceTaringLinearity: taring,
+                models.BalanceRepeatability: repeatability,
+                models.BalanceOffCenter: off_center,
+            })
+
+    def create_autoclaves(self, count):
+        rng = self.rng
+        measured = self.measured
+        if count and not self.standard_ids:
+            # the temperature standard is required
+            self.create_standards(1)
+
+        def extra(typ, row):
+            return [0.0, 150.0, 0.1, rng.choice(self.standard_ids), 'C']
+
+        def temperature(typ, row):
+            return [(setting, measured(setting, 0.1)) for setting in \
+                [100.0, 110.0, 121.0, 126.0, 134.0][:AUTOCLAVE_READINGS[
+                    models.AutoclaveTemperatureCalibrationLine]]]
+
+        def pressure(typ, row):
+            return self.pressure_readings(row, AUTOCLAVE_READINGS[
+                models.AutoclavePressureCalibrationLine])
+
+        self.create_calibrations(models.Autoclave, count,
+            lambda: 'autoclave', AUTOCLAVE_FIELDS, extra, {
+                models.AutoclaveTemperatureCalibrationLine: temperature,
+                models.AutoclavePressureCalibrationLine: pressure,
+            })
+
+    def create_generic(self, count):
+        rng = self.rng
+        measured = self.measured
+        types = [typ for _, typ in GENERIC_TYPES]
+
+        def points(row):
+            lower, upper = row[LOWER], row[UPPER]
+            step = (upper - lower) / (GENERIC_READINGS - 1)
+            return [lower + step * i for i in range(GENERIC_READINGS)]
+
+        def generic(typ, row):
+            if typ == 'pressure':
+                return []
+            return [(point, measured(point, row[RESOLUTION])) \
+                for point in points(row)]
+
+        def pressure(typ, row):
+            if typ != 'pressure':
+                return []
+            return self.pressure_readings(row, GENERIC_READINGS)
+
+        self.create_calibrations(models.GenericCalibration, count,
+            lambda: rng.choice(types), ['type'],
+            lambda typ, row: [typ], {
+                models.GenericCalibrationLine: generic,
+                models.PressureCalibrationLine: pressure,
+            })
+
+    def reset_sequences(self):
+        '''moves the id sequences past the assigned keys, a no-op on
+        SQLite'''
+        statements = connection.ops.sequence_reset_sql(no_style(), [
+            models.Customer, models.Standard, models.StandardLine,
+            models.Balance, models.Autoclave, models.GenericCalibration,
+        ] + list(BALANCE_READINGS) + list(AUTOCLAVE_READINGS) + [
+            models.GenericCalibrationLine, models.PressureCalibrationLine,
+        ])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+# the columns of FakeDataGenerator.common, and the positions of the values
+# the readings are generated from
+COMMON_FIELDS = ['id', 'date', 'due', 'customer', 'standard', 'start_time',
+    'end_time', 'temperature', 'humidity', 'serial', 'manufacturer',
+    'immersion_depth', 'model', 'name_of_instrument', 'resolution', 'units',
+    'location', 'range_lower', 'range_upper', 'comments',
+    'certificate_number', 'certificate_timestamp']
+STANDARD = COMMON_FIELDS.index('standard')
+RESOLUTION = COMMON_FIELDS.index('resolution')
+UNITS = COMMON_FIELDS.index('units')
+LOWER = COMMON_FIELDS.index('range_lower')
+UPPER = COMMON_FIELDS.index('range_upper')
+
+AUTOCLAVE_FIELDS = ['range_temp_lower', 'range_temp_upper',
+    'resolution_temp', 'temp_standard', 'temp_unit']
+
+LINE_FIELDS = {
+    models.BalanceColdStart: ['measurement', 'nominal'],
+    models.BalanceSettlingTime: ['measurement'],
+    models.BalanceLinearityUpDown: ['measurement'],
+    models.BalanceLinearity: ['actual', 'nominal', 'measurement'],
+    models.BalanceTaringLinearity: ['tare', 'indicated'],
+    models.BalanceRepeatability: ['half_load', 'full_load'],
+    models.BalanceOffCenter: ['measurement', 'mass_piece'],
+    models.AutoclaveTemperatureCalibrationLine: ['input_signal', 'measured'],
+    models.AutoclavePressureCalibrationLine: ['applied_mass',
+        'input_pressure', 'measured'],
+    models.GenericCalibrationLine: ['input_signal', 'measured'],
+    models.PressureCalibrationLine: ['applied_mass', 'input_pressure',
+        'measured'],
+}
+
+
+def tablet_records(count, customers, standard, seed=0):
+    '''count calibrations in the format the tablet uploads, cycling through
+    balance, autoclave and generic records for the named customers and
+    standard'''
+    rng = random.Random(seed)
+
+    def readings(n, value, spread):
+        return [[0, round(value + rng.gauss(0, spread), 4)] \
+            for _ in range(n)]
+
+    records = []
+    for i in range(count):
+        common = {
+            'date': '%sT%02d:%02d:00' % (datetime.date.today() - \
+                datetime.timedelta(days=rng.randint(0, 365)),
+                rng.randint(7, 16), rng.randint(0, 59)),
+            'customer': rng.choice(customers),
+            'manufacturer': rng.choice(MANUFACTURERS),
+            'serial': 'UP-%d-%06d' % (seed, i),
+            'immersion': '',
+            'model': 'M%d' % rng.randint(100, 999),
+            'location': rng.choice(LOCATIONS),
+            'standard': standard,
+        }
+        kind = i % 3
+        if kind == 0:
+            common.update({
+                'type': 'balance', 'instrument': 'Analytical Balance',
+                'resolution': 0.001, 'rangeLower': 0, 'rangeUpper': 200,
+                'unit': 'g',
+                'cold_start': readings(5, 100, 0.002),
+                'cold_start_nominal': 100,
+                'settling_time': readings(10, 100, 0.002),
+                'linearity_up': [[nominal, nominal, round(
+                    nominal + rng.gauss(0, 0.002), 4)] \
+                        for nominal in [1, 10, 50, 100, 200]],
+                'linearity': [[value[1]] for value in readings(15, 100,
+                    0.002)],
+                'tare': [[tare, round(50 + rng.gauss(0, 0.002), 4)] \
+                    for tare in range(10, 110, 10)],
+                'repeatability': [[value[1]] for value in \
+                    readings(5, 100, 0.002) + readings(5, 200, 0.002)],
+                'off_center_data': readings(5, 50, 0.002),
+                'off_center_mass_piece': 50,
+            })
+        elif kind == 1:
+            common.update({
+                'type': 'autoclave', 'instrument': 'Autoclave',
+                'resolution': 0.1, 'rangeLower': 0, 'rangeUpper': 150,
+                'unit': 'C', 'pressureResolution': 0.01,
+                'pressureRangeLower': 0, 'pressureRangeUpper': 4,
+                'pressureUnit': 'bar', 'pressureStandard': standard,
+                'tempData': [[setting, round(setting + rng.gauss(0, 0.2),
+                    1)] for setting in [100, 110, 121, 126, 134]],
+                'data': [[mass, round(PRESSURE_UNITS['bar'](
+                    pressure_psi(mass)) + rng.gauss(0, 0.02), 2)] \
+                        for mass in [500, 1000, 1500, 2000, 2500]],
+            })
+        else:
+            common.update({
+                'type': 'temperature', 'instrument': 'Thermometer',
+                'resolution': 0.1, 'rangeLower': 0, 'rangeUpper': 150,
+                'unit': 'C',
+                'data': [[point, round(point + rng.gauss(0, 0.2), 1)] \
+                    for point in [0, 37.5, 75, 112.5, 150]],
+            })
+        records.append(common)
+    return records
@@ -1,8 +1,16 @@
 import django_filters
-from calibration import models
+from calibration import models, search
 
 
-class CalibrationFilter(django_filters.FilterSet):
+class CalibrationStatusFilterSet(django_filters.FilterSet):
+    status = django_filters.ChoiceFilter(choices=models.STATUS_CHOICES,
+        method='filter_status')
+
+    def filter_status(self, queryset, name, value):
+        return queryset.filter_status(value)
+
+
+class CalibrationFilter(CalibrationStatusFilterSet):
     class Meta:
         fields = {
             'type': ['exact'],
@@ -12,7 +20,7 @@ class CalibrationFilter(django_filters.FilterSet):
         model = models.GenericCalibration
 
 
-class BalanceCalibrationFilter(django_filters.FilterSet):
+class BalanceCalibrationFilter(CalibrationStatusFilterSet):
     class Meta:
         fields = {
             'date': ['exact', 'gt', 'lt'],
@@ -22,7 +30,7 @@ class BalanceCalibrationFilter(django_filters.FilterSet):
 
 
 
-class AutoclaveCalibrationFilter(django_filters.FilterSet):
+class AutoclaveCalibrationFilter(CalibrationStatusFilterSet):
     class Meta:
         fields = {
             'date': ['exact', 'gt', 'lt'],
@@ -32,6 +40,24 @@ class AutoclaveCalibrationFilter(django_filters.FilterSet):
 
 
 
+class CalibrationIndexFilter(CalibrationStatusFilterSet):
+    q = django_filters.CharFilter(method='filter_search', label='Search')
+
+    def filter_search(self, queryset, name, value):
+        return search.filter_queryset(queryset, value)
+
+    class Meta:
+        fields = {
+            'calibration_type': ['exact'],
+            'type': ['exact'],
+            'date': ['exact', 'gt', 'lt'],
+            'customer': ['exact'],
+            'serial': ['icontains'],
+            'name_of_instrument': ['icontains'],
+        }
+        model = models.CalibrationIndex
+
+
 class CustomerFilter(django_filters.FilterSet):
     class Meta:
         fields = {
@@ -0,0 +1,469 @@
+import datetime
+import hashlib
+import json
+import time
+
+from django.db import transaction
+
+from calibration import models
+from calibration.dashboard import invalidate_dashboard_stats
+from calibration.standard_index import bump_version
+
+
+def parse_start(value):
+    '''splits the tablet's ISO timestamp into the calibration date and
+    start time'''
+    date, start_time = value.split('T')
+    return date, datetime.datetime.strptime(start_time.split('.')[0],
+        '%H:%M:%S')
+
+
+def fingerprint(record):
+    '''sha256 of the canonical JSON of an uploaded record, so the same 
+    record hashes identically however the tablet formatted it'''
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'),
+        ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def balance_lines(bal, cal):
+    lines = []
+    for cs in cal['cold_start']:
+        lines.append(models.BalanceColdStart(
+            calibration=bal,
+            measurement=cs[1],
+            nominal=cal['cold_start_nominal']
+        ))
+
+    for st in cal['settling_time']:
+        lines.append(models.BalanceSettlingTime(
+            calibration=bal,
+            measurement=st[1],
+        ))
+
+    for lin in cal['linearity_up']:
+        nominal, actual, linearity = lin
+        lines.append(models.BalanceLinearity(
+            calibration=bal,
+            actual=actual,
+            nominal=nominal,
+            measurement=linearity
+        ))
+
+    for lin in cal['linearity']:
+        lines.append(models.BalanceLinearityUpDown(
+            calibration=bal,
+            measurement=lin[0],
+        ))
+
+    for tare in cal['tare']:
+        t, indicated = tare
+        lines.append(models.BalanceTaringLinearity(
+            calibration=bal,
+            tare=t,
+            indicated=indicated
+        ))
+
+    half = cal.get('repeatability', [])[:5]
+    full = cal.get('repeatability', [])[5:10]
+    if len(half) == len(full):
+        for i, j in zip(half, full):
+            lines.append(models.BalanceRepeatability(
+                calibration=bal,
+                half_load=i[0],
+                full_load=j[0]
+            ))
+
+    for oc in cal['off_center_data']:
+        lines.append(models.BalanceOffCenter(
+            calibration=bal,
+            measurement=oc[1],
+            mass_piece=cal['off_center_mass_piece']
+        ))
+
+    return lines
+
+
+def autoclave_lines(auto, cal):
+    lines = []
+    for temp in cal['tempData']:
+        inp, measured = temp
+        lines.append(models.AutoclaveTemperatureCalibrationLine(
+            calibration=auto,
+            input_signal=inp,
+            measured=measured
+        ))
+
+    for pres in cal['data']:
+        inp, measured = pres
+        lines.append(models.AutoclavePressureCalibrationLine(
+            calibration=auto,
+            applied_mass=inp,
+            measured=measured
+        ))
+
+    return lines
+
+
+def generic_lines(gc, cal):
+    lines = []
+    if cal['type'] == 'pressure':
+        for pres in cal['data']:
+            inp, measured = pres
+            lines.append(models.PressureCalibrationLine(
+                calibration=gc,
+                applied_mass=inp,
+                measured=measured
+            ))
+    else:
+        for mea in cal['data']:
+            inp, measured = mea
+            lines.append(models.GenericCalibrationLine(
+                calibration=gc,
+                input_signal=inp,
+                measured=measured
+            ))
+
+    return lines
+
+
+class CalibrationIngest(object):
+    '''Writes uploaded calibrations in batches.
+
+    Customers and standards for a batch are resolved with one query each,
+    the parent calibrations are inserted inside a single transaction and
+    every reading is written with bulk_create. Calibrations are accepted
+    one at a time with add() so the caller does not have to hold the whole
+    upload in memory.
+
+    Every calibration is fingerprinted and those whose fingerprint has 
+    been stored by an earlier upload are skipped. The upload as a whole is 
+    fingerprinted from the ordered record fingerprints.'''
+
+    def __init__(self, batch_size=200, line_batch_size=500, progress=None):
+        self.batch_size = batch_size
+        self.line_batch_size = line_batch_size
+        # called with the summary after every committed batch
+        self.progress = progress
+        self.pending = []
+        self.calibrations = 0
+        self.duplicates = 0
+        self.duplicate_batch = False
+        self.batch_digest = hashlib.sha256()
+        self.rows = 0
+        self.elapsed = 0.0
+
+    def add(self, cal):
+        digest = fingerprint(cal)
+        self.batch_digest.update(digest.encode('ascii'))
+        self.pending.append((cal, digest))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def run(self, calibrations):
+        for cal in calibrations:
+            self.add(cal)
+        self.flush()
+        self.record_batch()
+        return self.summary()
+
+    def summary(self):
+        return {
+            'calibrations': self.calibrations,
+            'new': self.calibrations - self.duplicates,
+            'duplicates': self.duplicates,
+            'duplicate_batch': self.duplicate_batch,
+            'rows': self.rows,
+            'seconds': round(self.elapsed, 4),
+            'rows_per_second': round(self.rows / self.elapsed, 2) \
+                if self.elapsed else 0,
+        }
+
+    def record_batch(self):
+        if self.calibrations == 0:
+            return
+        _, created = models.UploadFingerprint.objects.get_or_create(
+            digest=self.batch_digest.hexdigest(), 
+            defaults={'kind': 'batch'})
+        self.duplicate_batch = not created
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+        start = time.perf_counter()
+        with transaction.atomic():
+            seen = set(models.UploadFingerprint.objects.filter(
+                digest__in=[digest for _, digest in batch]) \
+                    .values_list('digest', flat=True))
+            new = []
+            for cal, digest in batch:
+                if digest in seen:
+                    self.duplicates += 1
+                    continue
+                # a record repeated within the same upload is also skipped
+                seen.add(digest)
+                new.append((cal, digest))
+
+            if new:
+                self.write([cal for cal, _ in new])
+                models.UploadFingerprint.objects.bulk_create([
+                    models.UploadFingerprint(digest=digest, 
+                        kind='calibration') for _, digest in new])
+
+        self.calibrations += len(batch)
+        self.elapsed += time.perf_counter() - start
+        if self.progress:
+            self.progress(self.summary())
+
+    def write(self, batch):
+        customers = self.resolve_customers(batch)
+        standards = self.resolve_standards(batch)
+        lines = {}
+        for cal in batch:
+            parent, cal_lines = self.create_calibration(
+                cal, customers, standards)
+            for line in cal_lines:
+                lines.setdefault(type(line), []).append(line)
+            self.rows += 1
+
+        for model, objs in lines.items():
+            model.objects.bulk_create(objs,
+                batch_size=self.line_batch_size)
+            self.rows += len(objs)
+
+    def resolve_customers(self, batch):
+        names = set(cal['customer'] for cal in batch)
+        customers = {}
+        # iterate in reverse so the oldest customer with a name wins,
+        # matching filter(name=...).first()
+        for cus in models.Customer.objects.filter(name__in=names) \
+                .order_by('-pk'):
+            customers[cus.name] = cus
+
+        missing = names - set(customers.keys())
+        if missing:
+            models.Customer.objects.bulk_create(
+                [models.Customer(name=name) for name in missing])
+            for cus in models.Customer.objects.filter(name__in=missing):
+                customers[cus.name] = cus
+
+        return customers
+
+    def resolve_standards(self, batch):
+        names = set()
+        for cal in batch:
+            names.add(cal.get('standard'))
+            if cal['type'] == 'autoclave':
+                names.add(cal.get('pressureStandard'))
+
+        return {
+            std.name: std for std in \
+                models.Standard.objects.filter(name__in=names)
+        }
+
+    def create_calibration(self, cal, customers, standards):
+        date, start_time = parse_start(cal['date'])
+        common = dict(
+            date=date,
+            start_time=start_time,
+            customer=customers[cal['customer']],
+            manufacturer=cal['manufacturer'],
+            serial=cal['serial'],
+            immersion_depth=cal['immersion'],
+            model=cal['model'],
+            name_of_instrument=cal['instrument'],
+            location=cal['location'],
+            comments=cal.get('comments', '')
+        )
+
+        if cal['type'] == 'balance':
+            bal = models.Balance.objects.create(
+                resolution=cal['resolution'],
+                range_lower=cal['rangeLower'],
+                range_upper=cal['rangeUpper'],
+                units=cal['unit'],
+                standard=standards.get(cal['standard']),
+                **common
+            )
+            return bal, balance_lines(bal, cal)
+
+        elif cal['type'] == 'autoclave':
+            auto = models.Autoclave.objects.create(
+                resolution=cal['pressureResolution'],
+                range_lower=cal['pressureRangeLower'],
+                range_upper=cal['pressureRangeUpper'],
+                units=cal['pressureUnit'],
+                standard=standards.get(cal['pressureStandard']),
+                resolution_temp=cal['resolution'],
+                range_temp_lower=cal['rangeLower'],
+                range_temp_upper=cal['rangeUpper'],
+                temp_unit=cal['unit'],
+                temp_standard=standards.get(cal['standard']),
+                **common
+            )
+            return auto, autoclave_lines(auto, cal)
+
+        gc = models.GenericCalibration.objects.create(
+            resolution=cal['resolution'],
+            range_lower=cal['rangeLower'],
+            range_upper=cal['rangeUpper'],
+            units=cal['unit'],
+            standard=standards.get(cal['standard']),
+            type=cal['type'],
+            **common
+        )
+        return gc, generic_lines(gc, cal)
+
+
+STANDARD_FIELDS = ['certificate', 'serial', 'traceability']
+LINE_FIELDS = ['nominal', 'actual', 'uncertainty']
+
+
+class StandardIngest(object):
+    '''Upserts uploaded standards and their lines.
+
+    The existing standards of a batch are fetched with one query and their 
+    lines with another. Incoming lines are matched to stored lines by 
+    nominal value, so changed lines are updated, new ones created and 
+    lines missing from the upload deleted. The whole upload is applied in 
+    one transaction.'''
+
+    def __init__(self, batch_size=200, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.pending = []
+        self.names = set()
+        self.changes = {
+            'standards': 0,
+            'created': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'lines_created': 0,
+            'lines_updated': 0,
+            'lines_deleted': 0,
+            'rows': 0,
+        }
+
+    def add(self, std):
+        self.pending.append(std)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def run(self, standards):
+        with transaction.atomic():
+            for std in standards:
+                self.add(std)
+            self.flush()
+            # bulk operations do not send the signals that invalidate the
+            # dashboard snapshot
+            transaction.on_commit(invalidate_dashboard_stats)
+        # nor the ones that invalidate the nearest line indexes
+        for standard_id in models.Standard.objects.filter(
+                name__in=self.names).values_list('pk', flat=True):
+            bump_version(standard_id)
+        return self.summary()
+
+    def summary(self):
+        return dict(self.changes)
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+        # the last copy of a standard repeated in one upload wins
+        incoming = {std['name']: std for std in batch}
+        self.names.update(incoming.keys())
+        existing = {std.name: std for std in \
+            models.Standard.objects.filter(name__in=incoming.keys())}
+        stored_lines = {}
+        for line in models.StandardLine.objects.filter(
+                standard__in=existing.values()).order_by('pk'):
+            stored_lines.setdefault(line.standard_id, []).append(line)
+
+        new_standards = []
+        changed_standards = []
+        line_creates, line_updates, line_deletes = [], [], []
+        for name, std in incoming.items():
+            if name not in existing:
+                new_standards.append(models.Standard(name=name, 
+                    **{f: std[f] for f in STANDARD_FIELDS}))
+                continue
+
+            standard = existing[name]
+            changed = False
+            for field in STANDARD_FIELDS:
+                if getattr(standard, field) != std[field]:
+                    setattr(standard, field, std[field])
+                    changed = True
+            if changed:
+                changed_standards.append(standard)
+
+            creates, updates, deletes = self.diff_lines(standard, 
+                stored_lines.get(standard.pk, []), std['data'])
+            line_creates += creates
+            line_updates += updates
+            line_deletes += deletes
+            if changed or creates or updates or deletes:
+                self.changes['updated'] += 1
+            else:
+                self.changes['unchanged'] += 1
+
+        if new_standards:
+            models.Standard.objects.bulk_create(new_standards)
+            # sqlite does not return the ids of bulk inserted rows
+            for standard in models.Standard.objects.filter(
+                    name__in=[s.name for s in new_standards]):
+                line_creates += [models.StandardLine(standard=standard, 
+                    **{f: line[f] for f in LINE_FIELDS}) \
+                        for line in incoming[standard.name]['data']]
+
+        if changed_standards:
+            models.Standard.objects.bulk_update(changed_standards, 
+                STANDARD_FIELDS)
+        if line_creates:
+            models.StandardLine.objects.bulk_create(line_creates)
+        if line_updates:
+            models.StandardLine.objects.bulk_update(line_updates, 
+                LINE_FIELDS)
+        if line_deletes:
+            models.StandardLine.objects.filter(pk__in=line_deletes).delete()
+
+        self.changes['standards'] += len(batch)
+        self.changes['created'] += len(new_standards)
+        self.changes['lines_created'] += len(line_creates)
+        self.changes['lines_updated'] += len(line_updates)
+        self.changes['lines_deleted'] += len(line_deletes)
+        self.changes['rows'] += len(new_standards) + \
+            len(changed_standards) + len(line_creates) + \
+            len(line_updates) + len(line_deletes)
+        if self.progress:
+            self.progress(self.summary())
+
+    def diff_lines(self, standard, stored, data):
+        '''returns the lines to create, the lines to update and the pks of 
+        the lines to delete to make the stored lines match data'''
+        by_nominal = {}
+        for line in stored:
+            by_nominal.setdefault(line.nominal, []).append(line)
+
+        creates, updates = [], []
+        for values in data:
+            matches = by_nominal.get(float(values['nominal']))
+            if not matches:
+                creates.append(models.StandardLine(standard=standard,
+                    **{f: values[f] for f in LINE_FIELDS}))
+                continue
+
+            line = matches.pop(0)
+            if any(getattr(line, f) != float(values[f]) \
+                    for f in LINE_FIELDS):
+                for field in LINE_FIELDS:
+                    setattr(line, field, values[field])
+                updates.append(line)
+
+        deletes = [line.pk for lines in by_nominal.values() \
+            for line in lines]
+        return creates, updates, deletes
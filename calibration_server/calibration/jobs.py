@@ -0,0 +1,138 @@
+import datetime
+import json
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from calibration import metrics, models
+from calibration.ingest import CalibrationIngest, StandardIngest
+from calibration.streaming import iter_json_array
+
+# a running job without progress for this long is taken to have lost its
+# worker
+DEFAULT_JOB_TIMEOUT = 60 * 60
+# a job whose worker stopped this many times is failed, not requeued
+MAX_ATTEMPTS = 3
+STALE_ERROR = 'WorkerStopped'
+
+
+def job_dir():
+    path = getattr(settings, 'INGEST_JOB_DIR',
+        os.path.join(settings.BASE_DIR, 'ingest_jobs'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def enqueue(kind, stream):
+    '''copies an upload to the job directory in chunks and queues it for
+    the ingest worker'''
+    path = os.path.join(job_dir(), '%s-%s.json' % (kind, uuid.uuid4().hex))
+    with open(path, 'wb') as payload:
+        shutil.copyfileobj(stream, payload, 64 * 1024)
+        metrics.UPLOAD_BYTES.inc(payload.tell(), kind=kind)
+
+    return models.IngestJob.objects.create(kind=kind, payload_path=path)
+
+
+def job_timeout():
+    return getattr(settings, 'INGEST_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def recover_stale_jobs(timeout=None):
+    '''queues again the jobs left running by a worker that crashed or was
+    killed, those whose heartbeat is older than the timeout. Calibrations
+    committed before it stopped are skipped as duplicates on the next run.
+    A job that keeps stopping its worker is failed and its upload removed.
+    Returns the jobs requeued and failed.'''
+    if timeout is None:
+        timeout = job_timeout()
+    cutoff = timezone.now() - datetime.timedelta(seconds=timeout)
+    requeued = failed = 0
+    # jobs claimed before heartbeats were saved only have a start time
+    for job in models.IngestJob.objects.filter(status='running').filter(
+            Q(heartbeat__lt=cutoff) | Q(heartbeat__isnull=True,
+                started__lt=cutoff)):
+        errors = job.errors + '%s: no progress since %s\n' % (STALE_ERROR,
+            (job.heartbeat or job.started).isoformat())
+        if errors.count(STALE_ERROR + ':') >= MAX_ATTEMPTS:
+            changes = {'status': 'failed', 'finished': timezone.now()}
+        else:
+            changes = {'status': 'queued', 'started': None,
+                'heartbeat': None}
+        # another worker may be recovering the same job, or its own worker
+        # may have made progress since it was read
+        updated = models.IngestJob.objects.filter(pk=job.pk,
+            status='running', started=job.started,
+            heartbeat=job.heartbeat).update(errors=errors, **changes)
+        if not updated:
+            continue
+        if changes['status'] == 'failed':
+            failed += 1
+            try:
+                os.remove(job.payload_path)
+            except FileNotFoundError:
+                pass
+        else:
+            requeued += 1
+    return requeued, failed
+
+
+def claim_next_job():
+    '''marks the oldest queued job as running and returns it, after
+    requeueing the jobs of stopped workers. The conditional update means
+    that only one worker can claim a job.'''
+    recover_stale_jobs()
+    for job in models.IngestJob.objects.filter(status='queued') \
+            .order_by('pk')[:5]:
+        now = timezone.now()
+        claimed = models.IngestJob.objects.filter(
+            pk=job.pk, status='queued').update(
+                status='running', started=now, heartbeat=now)
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+    return None
+
+
+def run_job(job):
+    def progress(summary):
+        job.processed = summary.get('calibrations', summary.get('standards'))
+        job.duplicates = summary.get('duplicates', 0)
+        job.rows = summary['rows']
+        job.heartbeat = timezone.now()
+        job.save(update_fields=['processed', 'duplicates', 'rows',
+            'heartbeat'])
+
+    start = time.perf_counter()
+    try:
+        with open(job.payload_path, 'rb') as payload:
+            elements = iter_json_array(payload, job.kind)
+            if job.kind == 'calibrations':
+                summary = CalibrationIngest(progress=progress).run(elements)
+            else:
+                summary = StandardIngest(progress=progress).run(elements)
+    except Exception as e:
+        job.status = 'failed'
+        job.errors += '%s: %s\n' % (type(e).__name__, e)
+    else:
+        job.status = 'done'
+        job.summary = json.dumps(summary)
+        os.remove(job.payload_path)
+
+    job.finished = timezone.now()
+    job.save()
+
+    metrics.INGEST_SECONDS.observe(time.perf_counter() - start,
+        kind=job.kind)
+    metrics.INGEST_JOBS.inc(kind=job.kind, status=job.status)
+    metrics.INGEST_RECORDS.inc(job.processed, kind=job.kind)
+    metrics.INGEST_ROWS.inc(job.rows, kind=job.kind)
+    # the worker may sit idle for a long time after a job
+    metrics.registry.flush(force=True)
+    return job
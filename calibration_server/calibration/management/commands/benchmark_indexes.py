@@ -0,0 +1,198 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import QueryDict
+
+from calibration import calibration_index, models
+from calibration.dashboard import GENERIC_TYPES, compute_dashboard_stats
+from calibration.pagination import KeysetPaginator, encode_cursor
+
+CALIBRATION_MODELS = [models.Balance, models.Autoclave,
+    models.GenericCalibration]
+
+
+def indexed_models():
+    return [model for model in [
+        models.CalibrationIndex,
+        models.Balance,
+        models.Autoclave,
+        models.GenericCalibration,
+        models.StandardLine,
+        models.GenericCalibrationLine,
+        models.PressureCalibrationLine,
+        models.AutoclavePressureCalibrationLine,
+        models.AutoclaveTemperatureCalibrationLine,
+        models.BalanceColdStart,
+        models.BalanceSettlingTime,
+        models.BalanceLinearity,
+        models.BalanceLinearityUpDown,
+        models.BalanceTaringLinearity,
+        models.BalanceRepeatability,
+        models.BalanceOffCenter,
+    ] if model._meta.indexes]
+
+
+def set_indexes(enabled):
+    with connection.schema_editor() as editor:
+        for model in indexed_models():
+            for index in model._meta.indexes:
+                if enabled:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def generate(rows, customers, lines):
+    '''fills the empty benchmark database with random calibrations'''
+    rng = random.Random(0)
+    models.Customer.objects.bulk_create([
+        models.Customer(name='Customer %d' % i) for i in range(customers)])
+    # bulk_create only sets the primary keys on PostgreSQL
+    customer_objs = list(models.Customer.objects.all())
+    start = datetime.date.today() - datetime.timedelta(days=5 * 365)
+
+    def common():
+        date = start + datetime.timedelta(days=rng.randint(0, 5 * 365))
+        issued = rng.random() < 0.9
+        return {
+            'date': date,
+            'due': date + datetime.timedelta(days=365),
+            'customer': rng.choice(customer_objs),
+            'certificate_number': 'C%d' % rng.randint(1, 10 ** 6) \
+                if issued else '',
+            'name_of_instrument': 'Instrument',
+            'resolution': 0.01,
+        }
+
+    models.Balance.objects.bulk_create([models.Balance(**common()) \
+        for _ in range(rows)], batch_size=500)
+    standard = models.Standard.objects.create(name='Benchmark standard',
+        certificate='-', serial='-', traceability='-')
+    models.Autoclave.objects.bulk_create([models.Autoclave(
+        range_temp_lower=0, range_temp_upper=150, resolution_temp=0.1,
+        temp_standard=standard, temp_unit='C', **common()) \
+            for _ in range(rows)], batch_size=500)
+    models.GenericCalibration.objects.bulk_create([models.GenericCalibration(
+        type=rng.choice(GENERIC_TYPES)[1], **common()) \
+            for _ in range(rows)], batch_size=500)
+
+    ids = list(models.GenericCalibration.objects.values_list('pk', flat=True))
+    models.GenericCalibrationLine.objects.bulk_create([
+        models.GenericCalibrationLine(calibration_id=pk, input_signal=i,
+            measured=i + rng.random()) \
+                for pk in ids for i in range(lines)], batch_size=500)
+    # bulk_create skips the signals that maintain the calibration index
+    calibration_index.rebuild()
+
+
+def benchmark_queries():
+    '''the access paths served by the indexes, as (name, callable)'''
+    rng = random.Random(1)
+    customer_ids = list(models.Customer.objects.values_list('pk', flat=True))
+    generic_ids = list(models.GenericCalibration.objects.values_list('pk',
+        flat=True))
+    today = datetime.date.today()
+    since = today - datetime.timedelta(days=365)
+    middle = models.Balance.objects.order_by('-date', '-id')[
+        models.Balance.objects.count() // 2]
+    page_query = QueryDict(mutable=True)
+    page_query['after'] = encode_cursor([middle.date, middle.id])
+
+    def customer_history():
+        for model in CALIBRATION_MODELS:
+            for pk in customer_ids[:20]:
+                list(model.objects.filter(customer_id=pk,
+                    date__gt=since).values_list('pk', flat=True))
+
+    def indexed_history():
+        for pk in customer_ids[:20]:
+            list(models.CalibrationIndex.objects.filter(customer_id=pk,
+                date__gt=since).values_list('pk', flat=True))
+
+    def type_by_date():
+        for _, typ in GENERIC_TYPES:
+            list(models.GenericCalibration.objects.filter(type=typ,
+                date__gt=since).values_list('pk', flat=True))
+
+    def outstanding():
+        for model in CALIBRATION_MODELS:
+            model.objects.filter(certificate_number='').count()
+
+    def overdue():
+        for model in CALIBRATION_MODELS:
+            model.objects.filter(due__lt=today).count()
+
+    def keyset_page():
+        KeysetPaginator(models.Balance.objects.all(), 10,
+            ('-date', '-id')).page(page_query)
+
+    def calibration_lines():
+        for pk in rng.sample(generic_ids, min(200, len(generic_ids))):
+            list(models.GenericCalibrationLine.objects.filter(
+                calibration_id=pk))
+
+    return [
+        ('customer calibrations by date', customer_history),
+        ('customer history from calibration index', indexed_history),
+        ('generic calibrations by type and date', type_by_date),
+        ('outstanding certificates', outstanding),
+        ('overdue calibrations', overdue),
+        ('customer statistics',
+            lambda: list(models.Customer.objects.with_stats())),
+        ('dashboard', compute_dashboard_stats),
+        ('deep keyset page', keyset_page),
+        ('calibration lines', calibration_lines),
+    ]
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = 'Times the indexed lookups with and without the calibration ' \
+        'indexes on a generated throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000,
+            help='calibrations generated per table')
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--lines', type=int, default=5,
+            help='lines generated per generic calibration')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+            serialize=False)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        set_indexes(False)
+        self.stdout.write('generating %d calibrations per table' % \
+            options['rows'])
+        generate(options['rows'], options['customers'], options['lines'])
+
+        queries = benchmark_queries()
+        before = [best_of(func, options['repeat']) for _, func in queries]
+        set_indexes(True)
+        after = [best_of(func, options['repeat']) for _, func in queries]
+
+        self.stdout.write('%-40s %10s %10s %8s' % (
+            'query', 'before ms', 'after ms', 'speedup'))
+        for (name, _), old, new in zip(queries, before, after):
+            self.stdout.write('%-40s %10.2f %10.2f %7.1fx' % (
+                name, old * 1000, new * 1000, old / new if new else 0))
@@ -0,0 +1,212 @@
+import itertools
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from calibration import models
+from calibration.fake_data import FakeDataGenerator, tablet_records
+from calibration.jobs import run_job
+
+UPLOAD_RECORDS = 30
+
+# a measurement regresses when it grows by more than the threshold ratio,
+# timings shorter than MIN_SECONDS are too noisy to compare
+DEFAULT_THRESHOLD = 1.25
+MIN_SECONDS = 0.005
+
+
+def benchmark_targets():
+    '''the objects the detail views are measured on, the busiest customer
+    and a fully read balance that has no certificate yet so its pdf is
+    rendered rather than served from the certificate cache'''
+    customer = models.CalibrationIndex.objects.values('customer') \
+        .annotate(n=Count('pk')).order_by('-n').first()
+    balance = models.Balance.objects.filter(certificate_number='') \
+        .order_by('pk').first()
+    return customer['customer'], balance.pk
+
+
+def benchmark_requests():
+    '''(name, callable) for each view measured, each callable makes one
+    request with the test client and returns the response'''
+    client = Client()
+    customer, balance = benchmark_targets()
+    standard = models.Standard.objects.order_by('pk').first().name
+    customers = list(models.Customer.objects.order_by('pk')[:10] \
+        .values_list('name', flat=True))
+    uploads = itertools.count()
+
+    def upload():
+        # fresh records every time so none are skipped as duplicates
+        body = json.dumps({'calibrations': tablet_records(UPLOAD_RECORDS,
+            customers, standard, seed=next(uploads))})
+        return client.post(reverse('calibration:upload-calibrations'),
+            body, content_type='application/json')
+
+    def ingest():
+        job = json.loads(upload().content.decode('utf-8'))['job']
+        return run_job(models.IngestJob.objects.get(pk=job))
+
+    return [
+        ('dashboard', lambda: client.get(reverse('calibration:dashboard'))),
+        ('customer list',
+            lambda: client.get(reverse('calibration:customer-list'))),
+        ('customer detail', lambda: client.get(reverse(
+            'calibration:customer-details', kwargs={'pk': customer}))),
+        ('balance detail', lambda: client.get(reverse(
+            'calibration:balance-calibration-detail',
+            kwargs={'pk': balance}))),
+        ('balance pdf', lambda: client.get(reverse(
+            'calibration:balance-pdf', kwargs={'pk': balance}))),
+        ('upload calibrations', upload),
+        ('upload and ingest', ingest),
+    ]
+
+
+def consume(response):
+    '''reads a response through so streamed content is included'''
+    if getattr(response, 'streaming', False):
+        for _ in response.streaming_content:
+            pass
+        response.close()
+    return response
+
+
+def measure(func, repeat):
+    '''median wall time and queries over repeat calls, after a warm up
+    call, and the peak memory allocated by one more traced call'''
+    consume(func())
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = consume(func())
+            timings.append(time.perf_counter() - start)
+        queries.append(len(context.captured_queries))
+
+    tracemalloc.start()
+    try:
+        consume(func())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': round(statistics.median(timings), 6),
+        'min_seconds': round(min(timings), 6),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+        # the http status, or the status of an ingest job
+        'status': getattr(response, 'status_code', None) or \
+            getattr(response, 'status', None),
+    }
+
+
+def compare(results, baseline, threshold):
+    '''the measurements of results that are worse than the baseline, as
+    readable lines'''
+    regressions = []
+    for size, views in sorted(results['sizes'].items(), key=lambda i:
+            int(i[0])):
+        for name, new in sorted(views.items()):
+            old = baseline.get('sizes', {}).get(size, {}).get(name)
+            if not old:
+                continue
+            if new['queries'] > old['queries']:
+                regressions.append('%s at %s: %d queries, was %d' % (
+                    name, size, new['queries'], old['queries']))
+            if new['seconds'] > MIN_SECONDS and \
+                    new['seconds'] > old['seconds'] * threshold:
+                regressions.append('%s at %s: %.1fms, was %.1fms' % (
+                    name, size, new['seconds'] * 1000, old['seconds'] * 1000))
+            if new['peak_kb'] > old['peak_kb'] * threshold:
+                regressions.append('%s at %s: %.0fKB peak, was %.0fKB' % (
+                    name, size, new['peak_kb'], old['peak_kb']))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Measures the wall time, queries and peak memory of the busiest ' \
+        'views on generated databases of several sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+            default=[1000, 10000], help='calibrations generated per type')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='write the results as JSON')
+        parser.add_argument('--compare', metavar='BASELINE',
+            help='fail if the results are worse than a stored JSON result')
+        parser.add_argument('--threshold', type=float,
+            default=DEFAULT_THRESHOLD, help='ratio of the baseline above '
+            'which a timing or peak memory counts as a regression')
+
+    def handle(self, *args, **options):
+        results = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'sizes': {},
+        }
+        for size in options['sizes']:
+            results['sizes'][str(size)] = self.benchmark_size(size,
+                options['repeat'])
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                regressions = compare(results, json.load(baseline),
+                    options['threshold'])
+            if regressions:
+                raise CommandError('regressions against %s:\n%s' % (
+                    options['compare'], '\n'.join(regressions)))
+            self.stdout.write('no regressions against %s' % \
+                options['compare'])
+
+    def benchmark_size(self, size, repeat):
+        '''runs the views on a throwaway database of size calibrations per
+        type, with its own cache and file directories'''
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+            serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as directory, \
+                    override_settings(
+                        CACHES={'default': {'BACKEND': 'django.core.cache.'
+                            'backends.locmem.LocMemCache'}},
+                        CERTIFICATE_CACHE_DIR=directory,
+                        INGEST_JOB_DIR=directory,
+                        ALLOWED_HOSTS=['testserver']):
+                cache.clear()
+                self.stdout.write('generating %d calibrations per type' % \
+                    size)
+                FakeDataGenerator().run(max(size // 20, 10), 10, size)
+
+                measurements = {}
+                self.stdout.write('%-24s %10s %8s %10s' % (
+                    'view', 'ms', 'queries', 'peak KB'))
+                for name, func in benchmark_requests():
+                    result = measure(func, repeat)
+                    measurements[name] = result
+                    self.stdout.write('%-24s %10.1f %8d %10.0f' % (
+                        name, result['seconds'] * 1000, result['queries'],
+                        result['peak_kb']))
+                return measurements
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from calibration import pdf_cache
+from calibration.export import CERTIFICATE_TYPES, render_certificate
+
+
+class Command(BaseCommand):
+    help = 'Purges or pre-warms the certificate pdf cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true',
+            help='delete the cached certificates')
+        parser.add_argument('--warm', action='store_true',
+            help='render every issued certificate that is not cached')
+        parser.add_argument('--type', choices=CERTIFICATE_TYPES.keys(),
+            help='limit the command to one calibration type')
+
+    def handle(self, *args, **options):
+        types = [options['type']] if options['type'] else \
+            CERTIFICATE_TYPES.keys()
+        if options['purge']:
+            removed = sum(pdf_cache.purge(
+                CERTIFICATE_TYPES[typ][0]._meta.model_name) for typ in types)
+            self.stdout.write('removed %d certificates' % removed)
+
+        if options['warm']:
+            for typ in types:
+                model, _ = CERTIFICATE_TYPES[typ]
+                rendered = 0
+                for pk in model.objects.exclude(certificate_number='') \
+                        .values_list('pk', flat=True).iterator():
+                    render_certificate(typ, pk)
+                    rendered += 1
+                self.stdout.write('warmed %d %s certificates' % (
+                    rendered, typ))
+
+        self.stdout.write('cache holds %d bytes' % sum(
+            size for _, size, _ in pdf_cache.entries()))
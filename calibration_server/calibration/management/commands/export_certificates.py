@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from calibration import models
+from calibration.export import (
+    SelectionError, select_certificates, stream_zip)
+
+
+class Command(BaseCommand):
+    help = 'Renders certificates in parallel and writes them to a zip file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='path of the zip file to write')
+        parser.add_argument('--customer', type=int,
+            help='export the issued certificates of this customer id')
+        parser.add_argument('--start', help='earliest calibration date')
+        parser.add_argument('--end', help='latest calibration date')
+        parser.add_argument('--ids', nargs='*',
+            help='certificates to export as type:pk, e.g. balance:12')
+        parser.add_argument('--workers', type=int,
+            help='render processes, defaults to the number of cores')
+
+    def handle(self, *args, **options):
+        customer = None
+        if options['customer']:
+            try:
+                customer = models.Customer.objects.get(
+                    pk=options['customer'])
+            except models.Customer.DoesNotExist:
+                raise CommandError('customer %d does not exist' % 
+                    options['customer'])
+
+        try:
+            certificates = select_certificates(customer=customer, 
+                start=options['start'], end=options['end'],
+                ids=options['ids'])
+        except SelectionError as e:
+            raise CommandError(e)
+        with open(options['output'], 'wb') as output:
+            for chunk in stream_zip(certificates, options['workers']):
+                output.write(chunk)
+
+        self.stdout.write('exported %d certificates to %s' % (
+            len(certificates), options['output']))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calibration.fake_data import CHUNK_SIZE, FakeDataGenerator
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with generated customers, standards and ' \
+        'calibrations of every type with their readings, for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--standards', type=int, default=20)
+        parser.add_argument('--calibrations', type=int, default=10000,
+            help='calibrations generated per type')
+        parser.add_argument('--years', type=int, default=5,
+            help='calibration dates are spread over this many years')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        totals = {}
+
+        def progress(table, rows):
+            totals[table] = totals.get(table, 0) + rows
+            if options['verbosity'] > 1:
+                self.stdout.write('%s %d' % (table, totals[table]))
+
+        start = time.perf_counter()
+        rows = FakeDataGenerator(options['seed'], options['chunk_size'],
+            progress).run(options['customers'], options['standards'],
+                options['calibrations'], options['years'])
+        for table, count in sorted(totals.items()):
+            self.stdout.write('%-50s %10d' % (table, count))
+        self.stdout.write('wrote %d rows in %.1fs' % (rows,
+            time.perf_counter() - start))
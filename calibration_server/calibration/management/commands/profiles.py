@@ -0,0 +1,90 @@
+import io
+import os
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calibration import profiling
+
+
+class Command(BaseCommand):
+    help = 'Lists the request profiles saved by the profiler middleware ' \
+        'and summarizes one of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile', nargs='?',
+            help='id of the profile to summarize, or "latest"')
+        parser.add_argument('--limit', type=int, default=20,
+            help='profiles listed, or functions shown for one profile')
+        parser.add_argument('--slowest', action='store_true',
+            help='list the recent profiles slowest first')
+        parser.add_argument('--sort', choices=['cumulative', 'tottime',
+            'calls'], help='print the full profile sorted by this column '
+            'instead of the saved summary')
+        parser.add_argument('--purge', action='store_true',
+            help='delete the saved profiles')
+
+    def handle(self, *args, **options):
+        if not profiling.profile_dir():
+            raise CommandError('PROFILER_DIR is not set')
+
+        if options['purge']:
+            removed = profiling.prune(0)
+            self.stdout.write('removed %d profiles' % removed)
+        elif options['profile']:
+            self.show(options['profile'], options['limit'], options['sort'])
+        else:
+            self.list(options['limit'], options['slowest'])
+
+    def list(self, limit, slowest):
+        summaries = profiling.recent_profiles(limit)
+        if slowest:
+            summaries.sort(key=lambda s: -s['seconds'])
+        self.stdout.write('%-32s %6s %10s %8s %10s  %s' % ('created',
+            'status', 'ms', 'queries', 'query ms', 'id'))
+        for summary in summaries:
+            self.stdout.write('%-32s %6d %10.1f %8d %10.1f  %s' % (
+                summary['created'], summary['status'],
+                summary['seconds'] * 1000, summary['queries'],
+                summary['query_seconds'] * 1000, summary['id']))
+
+    def show(self, profile_id, limit, sort):
+        if profile_id == 'latest':
+            latest = profiling.recent_profiles(1)
+            if not latest:
+                raise CommandError('no profiles saved')
+            profile_id = latest[0]['id']
+        prof_path, _ = profiling.profile_paths(profile_id)
+        summary = dict((s['id'], s) for s in profiling.recent_profiles()) \
+            .get(profile_id)
+        if summary is None or not os.path.exists(prof_path):
+            raise CommandError('no profile %s' % profile_id)
+
+        self.stdout.write('%s %s -> %d, %.1fms, %d queries in %.1fms%s' % (
+            summary['method'], summary['path'], summary['status'],
+            summary['seconds'] * 1000, summary['queries'],
+            summary['query_seconds'] * 1000,
+            ', body streamed after profiling' if summary['streaming'] \
+                else ''))
+        self.stdout.write('\nown time by area')
+        for area, seconds in summary['areas'].items():
+            self.stdout.write('  %-12s %10.1fms' % (area, seconds * 1000))
+
+        if sort:
+            output = io.StringIO()
+            stats = pstats.Stats(prof_path, stream=output)
+            stats.sort_stats(sort).print_stats(limit)
+            self.stdout.write(output.getvalue())
+        else:
+            self.stdout.write('\n%8s %10s %10s  function' % ('calls',
+                'own ms', 'cum ms'))
+            for function in summary['functions'][:limit]:
+                self.stdout.write('%8d %10.1f %10.1f  %s' % (
+                    function['calls'], function['own_seconds'] * 1000,
+                    function['cumulative_seconds'] * 1000,
+                    function['function']))
+
+        self.stdout.write('\nslowest queries')
+        for query in summary['slowest_queries']:
+            self.stdout.write('%8.1fms %s\n    %s' % (query['seconds'] * 1000,
+                query['site'], query['sql']))
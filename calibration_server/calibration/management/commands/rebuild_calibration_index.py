@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from calibration import calibration_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the cross type calibration index from the ' \
+        'calibration tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = calibration_index.rebuild(options['batch_size'],
+            progress=lambda n: self.stdout.write('indexed %d' % n))
+        self.stdout.write('indexed %d calibrations' % written)
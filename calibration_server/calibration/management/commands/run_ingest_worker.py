@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calibration.jobs import claim_next_job, recover_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Processes queued tablet uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=2.0,
+            help='seconds to wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+            help='exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        requeued, failed = recover_stale_jobs()
+        if requeued or failed:
+            self.stdout.write('requeued %d and failed %d jobs of stopped '
+                'workers' % (requeued, failed))
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            run_job(job)
+            self.stdout.write('job %d %s: %d %s, %d rows' % (
+                job.pk, job.status, job.processed, job.kind, job.rows))
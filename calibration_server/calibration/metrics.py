@@ -0,0 +1,398 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from calibration.query_budget import MIDDLEWARE_FILES
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# QueryCounter wraps every query of a request
+MIDDLEWARE_FILES.add(os.path.abspath(__file__))
+
+DEFAULT_FLUSH_INTERVAL = 5
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# the values of exited processes, summed
+EXITED_FILE = 'exited.json'
+LOCK_FILE = 'collect.lock'
+
+
+def metrics_dir():
+    '''the directory shared by every process of the site, each writes its
+    own values there, or None to serve the values of this process only'''
+    path = getattr(settings, 'METRICS_DIR', None)
+    if path:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, escape(value)) \
+        for name, value in pairs)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return '%d' % value
+    return repr(float(value))
+
+
+def process_started(pid):
+    '''when a process started, None where /proc is not available'''
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            # the fields after the parenthesised command name
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/stat') as f:
+            boot = next(int(line.split()[1]) for line in f \
+                if line.startswith('btime'))
+    except (OSError, IndexError, StopIteration, ValueError):
+        return None
+    return boot + int(fields[19]) / os.sysconf('SC_CLK_TCK')
+
+
+def process_alive(filename):
+    '''whether the process that wrote a metrics file is still running, the
+    directory is only shared by the processes of one host. A process that
+    started after the file was begun has been given the pid of an exited
+    one.'''
+    try:
+        pid, started = [int(part) for part in \
+            filename.split('.')[0].split('-')]
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running as another user
+        pass
+    process_start = process_started(pid)
+    # the start time in /proc is only accurate to the second
+    return process_start is None or process_start <= started + 2
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        return {}
+
+
+def write_snapshot(snapshot, path):
+    '''replaces path atomically so readers never see a partial file'''
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def directory_lock(directory):
+    '''serialises collecting between the processes sharing directory'''
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class Counter(object):
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def empty(self):
+        return 0
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with registry.lock:
+            registry.forked()
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, old, new):
+        return old + new
+
+    def samples(self, key, value):
+        yield self.name, key, (), value
+
+
+class Histogram(object):
+    '''observations counted into buckets, stored as the count in each
+    bucket followed by the sum of the observed values'''
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.values = {}
+
+    def empty(self):
+        return [0] * (len(self.buckets) + 1)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with registry.lock:
+            registry.forked()
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = self.empty()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merge(self, old, new):
+        if len(old) != len(new):
+            # written with other buckets by an older version of the site
+            return old
+        return [a + b for a, b in zip(old, new)]
+
+    def samples(self, key, counts):
+        total = 0
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            yield self.name + '_bucket', key, (('le', format_value(bound)),), \
+                total
+        yield self.name + '_sum', key, (), counts[-1]
+        yield self.name + '_count', key, (), total
+
+
+class Registry(object):
+    '''the metrics of this process. With a METRICS_DIR each process writes
+    its values to a file of its own there and the values served are the
+    sum over every file, so the workers of a server add up. When the
+    metrics are collected the files of exited processes are added to
+    EXITED_FILE and removed, so the totals never drop as workers are
+    recycled.'''
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.metrics = OrderedDict()
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.flushed = 0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def forked(self):
+        '''a forked worker starts counting from zero, what it inherited is
+        in the file of its parent'''
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.started = time.time()
+            self.flushed = 0
+            for metric in self.metrics.values():
+                metric.values = {}
+
+    def snapshot(self):
+        with self.lock:
+            self.forked()
+            return dict((name, [[list(key), list(value) \
+                if isinstance(value, list) else value] for key, value in \
+                metric.values.items()]) for name, metric in \
+                self.metrics.items())
+
+    def filename(self):
+        return '%d-%d.json' % (self.pid, self.started)
+
+    def flush(self, force=False):
+        '''writes the values of this process to the shared directory, at
+        most once every METRICS_FLUSH_INTERVAL seconds unless forced'''
+        directory = metrics_dir()
+        if not directory or not (force or \
+                time.time() - self.flushed >= flush_interval()):
+            return
+        snapshot = self.snapshot()
+        self.flushed = time.time()
+        write_snapshot(snapshot, os.path.join(directory, self.filename()))
+
+    def merge(self, totals, snapshot):
+        '''adds a snapshot to totals of {name: {key: value}}'''
+        for name, values in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            merged = totals.setdefault(name, {})
+            for key, value in values:
+                key = tuple(key)
+                merged[key] = metric.merge(merged.get(key, metric.empty()),
+                    value)
+
+    def retire(self, directory, paths):
+        '''adds the files of exited processes to EXITED_FILE, then removes
+        them'''
+        exited_path = os.path.join(directory, EXITED_FILE)
+        exited = {}
+        self.merge(exited, read_snapshot(exited_path) or {})
+        for path in paths:
+            self.merge(exited, read_snapshot(path) or {})
+        write_snapshot(dict((name, [[list(key), value] for key, value in \
+            values.items()]) for name, values in exited.items()),
+            exited_path)
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        '''the values summed over every process, exited ones included'''
+        directory = metrics_dir()
+        if not directory:
+            return self.snapshot()
+
+        self.flush(force=True)
+        totals = {}
+        with directory_lock(directory):
+            exited = []
+            for entry in os.scandir(directory):
+                if not entry.name.endswith('.json') or \
+                        entry.name == EXITED_FILE:
+                    continue
+                if process_alive(entry.name):
+                    self.merge(totals, read_snapshot(entry.path) or {})
+                else:
+                    exited.append(entry.path)
+            if exited:
+                self.retire(directory, exited)
+            self.merge(totals, read_snapshot(os.path.join(directory,
+                EXITED_FILE)) or {})
+        return dict((name, list(values.items())) \
+            for name, values in totals.items())
+
+    def exposition(self):
+        '''the metrics in the prometheus text format'''
+        collected = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append('# HELP %s %s' % (name, metric.help))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for key, value in sorted(collected.get(name, []),
+                    key=lambda item: list(item[0])):
+                for sample, key, extra, number in metric.samples(key,
+                        value):
+                    lines.append('%s%s %s' % (sample, format_labels(
+                        metric.labels, key, extra), format_value(number)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    'calibration_request_seconds', 'Time to respond to a request by url '
+    'name', ['view', 'method']))
+REQUESTS = registry.register(Counter('calibration_requests_total',
+    'Responses by url name and status', ['view', 'method', 'status']))
+REQUEST_QUERIES = registry.register(Histogram(
+    'calibration_request_queries', 'Database queries made by a request',
+    ['view'], buckets=QUERY_BUCKETS))
+PDF_RENDER_SECONDS = registry.register(Histogram(
+    'calibration_pdf_render_seconds', 'Time to render a certificate pdf',
+    ['certificate']))
+UPLOAD_BYTES = registry.register(Counter('calibration_upload_bytes_total',
+    'Bytes of tablet uploads queued for ingest', ['kind']))
+INGEST_JOBS = registry.register(Counter('calibration_ingest_jobs_total',
+    'Ingest jobs run by outcome', ['kind', 'status']))
+INGEST_SECONDS = registry.register(Histogram('calibration_ingest_seconds',
+    'Time to run an ingest job', ['kind']))
+INGEST_RECORDS = registry.register(Counter('calibration_ingest_records_total',
+    'Calibrations or standards read by ingest jobs', ['kind']))
+INGEST_ROWS = registry.register(Counter('calibration_ingest_rows_total',
+    'Database rows written by ingest jobs', ['kind']))
+CACHE_REQUESTS = registry.register(Counter('calibration_cache_requests_total',
+    'Cache lookups by cache and result', ['cache', 'result']))
+
+
+def cache_lookup(name, hit):
+    CACHE_REQUESTS.inc(cache=name, result='hit' if hit else 'miss')
+
+
+class QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware(object):
+    '''records the latency, status and query count of every request by
+    the name of its url, so the labels stay few whatever the paths. The
+    body of a streamed response is produced after it is timed.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(queries))
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unmatched'
+        REQUEST_SECONDS.observe(seconds, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method,
+            status=response.status_code)
+        REQUEST_QUERIES.observe(queries.count, view=view)
+        registry.flush()
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calibration', '0008_ingestjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(choices=[('calibration', 'Calibration'), ('batch', 'Batch')], max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='duplicates',
+            field=models.IntegerField(default=0),
+        ),
+    ]
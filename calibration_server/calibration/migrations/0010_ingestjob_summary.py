@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calibration', '0009_uploadfingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+    ]
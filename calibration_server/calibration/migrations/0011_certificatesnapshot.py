@@ -0,0 +1,28 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calibration', '0010_ingestjob_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calibration_type', models.CharField(max_length=16)),
+                ('calibration_id', models.IntegerField()),
+                ('certificate_number', models.CharField(max_length=255)),
+                ('version', models.IntegerField()),
+                ('data', models.TextField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('calibration_type', 'calibration_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,173 @@
+# Generated by Django 2.2.6 on 2026-10-18 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calibration', '0011_certificatesnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='autoclavepressurecalibrationline',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='autoclavetemperaturecalibrationline',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='balancecoldstart',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='balancelinearity',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='balancelinearityupdown',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='balanceoffcenter',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='balancerepeatability',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='balancesettlingtime',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='balancetaringlinearity',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='genericcalibrationline',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='pressurecalibrationline',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='standardline',
+            options={'ordering': ['id']},
+        ),
+        migrations.AddIndex(
+            model_name='autoclave',
+            index=models.Index(fields=['customer', 'date'], name='autoclave_cust_date'),
+        ),
+        migrations.AddIndex(
+            model_name='autoclave',
+            index=models.Index(fields=['date', 'id'], name='autoclave_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='autoclave',
+            index=models.Index(fields=['certificate_number'], name='autoclave_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='autoclave',
+            index=models.Index(fields=['customer', 'certificate_number'], name='autoclave_cust_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='autoclave',
+            index=models.Index(fields=['due'], name='autoclave_due'),
+        ),
+        migrations.AddIndex(
+            model_name='autoclavepressurecalibrationline',
+            index=models.Index(fields=['calibration', 'id'], name='autoclave_pres_line_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='autoclavetemperaturecalibrationline',
+            index=models.Index(fields=['calibration', 'id'], name='autoclave_temp_line_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balance',
+            index=models.Index(fields=['customer', 'date'], name='balance_cust_date'),
+        ),
+        migrations.AddIndex(
+            model_name='balance',
+            index=models.Index(fields=['date', 'id'], name='balance_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balance',
+            index=models.Index(fields=['certificate_number'], name='balance_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='balance',
+            index=models.Index(fields=['customer', 'certificate_number'], name='balance_cust_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='balance',
+            index=models.Index(fields=['due'], name='balance_due'),
+        ),
+        migrations.AddIndex(
+            model_name='balancecoldstart',
+            index=models.Index(fields=['calibration', 'id'], name='balance_cold_start_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balancelinearity',
+            index=models.Index(fields=['calibration', 'id'], name='balance_linearity_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balancelinearityupdown',
+            index=models.Index(fields=['calibration', 'id'], name='balance_lin_up_down_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balanceoffcenter',
+            index=models.Index(fields=['calibration', 'id'], name='balance_off_center_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balancerepeatability',
+            index=models.Index(fields=['calibration', 'id'], name='balance_repeat_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesettlingtime',
+            index=models.Index(fields=['calibration', 'id'], name='balance_settling_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='balancetaringlinearity',
+            index=models.Index(fields=['calibration', 'id'], name='balance_taring_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='genericcalibration',
+            index=models.Index(fields=['customer', 'date'], name='generic_cust_date'),
+        ),
+        migrations.AddIndex(
+            model_name='genericcalibration',
+            index=models.Index(fields=['date', 'id'], name='generic_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='genericcalibration',
+            index=models.Index(fields=['certificate_number'], name='generic_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='genericcalibration',
+            index=models.Index(fields=['customer', 'certificate_number'], name='generic_cust_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='genericcalibration',
+            index=models.Index(fields=['due'], name='generic_due'),
+        ),
+        migrations.AddIndex(
+            model_name='genericcalibration',
+            index=models.Index(fields=['type', 'date'], name='generic_type_date'),
+        ),
+        migrations.AddIndex(
+            model_name='genericcalibrationline',
+            index=models.Index(fields=['calibration', 'id'], name='generic_line_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='pressurecalibrationline',
+            index=models.Index(fields=['calibration', 'id'], name='pressure_line_cal_id'),
+        ),
+        migrations.AddIndex(
+            model_name='standardline',
+            index=models.Index(fields=['standard', 'id'], name='standardline_std_id'),
+        ),
+    ]
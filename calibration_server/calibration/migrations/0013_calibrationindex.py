@@ -0,0 +1,70 @@
+# Generated by Django 2.2.6 on 2026-10-18 07:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from calibration import calibration_index
+
+
+def fill_index(apps, schema_editor):
+    calibration_index.fill(apps.get_model('calibration', 'CalibrationIndex'),
+        lambda name: apps.get_model('calibration', name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calibration', '0012_calibration_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalibrationIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calibration_type', models.CharField(choices=[('balance', 'Balance'), ('autoclave', 'Autoclave'), ('generic', 'Generic')], max_length=16)),
+                ('calibration_id', models.IntegerField()),
+                ('type', models.CharField(max_length=16)),
+                ('date', models.DateField()),
+                ('due', models.DateField(blank=True, null=True)),
+                ('serial', models.CharField(blank=True, max_length=255)),
+                ('name_of_instrument', models.CharField(blank=True, max_length=255)),
+                ('certificate_number', models.CharField(blank=True, default='', max_length=255)),
+                ('certificate_timestamp', models.DateTimeField(null=True)),
+                ('customer', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='calibration.Customer')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='calibrationindex',
+            index=models.Index(fields=['customer', 'date'], name='calindex_cust_date'),
+        ),
+        migrations.AddIndex(
+            model_name='calibrationindex',
+            index=models.Index(fields=['date', 'id'], name='calindex_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='calibrationindex',
+            index=models.Index(fields=['certificate_number'], name='calindex_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='calibrationindex',
+            index=models.Index(fields=['customer', 'certificate_number'], name='calindex_cust_cert_no'),
+        ),
+        migrations.AddIndex(
+            model_name='calibrationindex',
+            index=models.Index(fields=['due'], name='calindex_due'),
+        ),
+        migrations.AddIndex(
+            model_name='calibrationindex',
+            index=models.Index(fields=['type', 'date'], name='calindex_type_date'),
+        ),
+        migrations.AddIndex(
+            model_name='calibrationindex',
+            index=models.Index(fields=['serial'], name='calindex_serial'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='calibrationindex',
+            unique_together={('calibration_type', 'calibration_id')},
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
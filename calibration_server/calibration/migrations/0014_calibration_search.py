@@ -0,0 +1,53 @@
+import sqlite3
+
+from django.db import migrations
+
+COLUMNS = ['serial', 'manufacturer', 'model', 'name_of_instrument', 
+    'comments', 'customer']
+
+TABLES = [
+    ('balance', 'calibration_balance'),
+    ('autoclave', 'calibration_autoclave'),
+    ('generic', 'calibration_genericcalibration'),
+]
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    # the trigram tokenizer matches partial serials anywhere in the value, 
+    # older SQLite versions fall back to matching word prefixes
+    tokenizer = 'trigram' if sqlite3.sqlite_version_info >= (3, 34, 0) \
+        else 'unicode61'
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE calibration_search USING fts5(%s, "
+        "tokenize='%s')" % (', '.join(COLUMNS), tokenizer))
+    for typ, table in TABLES:
+        schema_editor.execute(
+            "INSERT INTO calibration_search (rowid, %s) "
+            "SELECT ci.id, c.serial, c.manufacturer, c.model, "
+            "c.name_of_instrument, c.comments, COALESCE(cu.name, '') "
+            "FROM calibration_calibrationindex ci "
+            "JOIN %s c ON c.id = ci.calibration_id "
+            "LEFT JOIN calibration_customer cu ON cu.id = c.customer_id "
+            "WHERE ci.calibration_type = %%s" % (', '.join(COLUMNS), table), 
+            [typ])
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute('DROP TABLE calibration_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calibration', '0013_calibrationindex'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calibration', '0014_calibration_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='heartbeat',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -1,10 +1,17 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.shortcuts import reverse
+from django.utils.functional import cached_property
 import datetime
-from statistics import mean, stdev
+import json
 from builtins import round
 import math
 
+from calibration.balance_stats import BalanceStats, BALANCE_READINGS
+from calibration.standard_index import index_for
+from calibration.uncertainty import combined_uncertainty
+from calibration.units import calculated_pressure, fill_pressures
+
 class Profile(models.Model):
     user = models.OneToOneField('auth.user', on_delete=models.CASCADE)
     profile_type = models.CharField(max_length=16, choices=[
@@ -15,62 +22,138 @@ class Profile(models.Model):
     def __str__(self):
         return self.user.username
 
+def _customer_subquery(model, aggregate, output_field, **filters):
+    '''aggregates the calibrations of one model that belong to the 
+    customer in the outer query'''
+    qs = model.objects.filter(customer=models.OuterRef('pk'), **filters) \
+        .order_by().values('customer').annotate(value=aggregate) \
+        .values('value')
+    return models.Subquery(qs, output_field=output_field)
+
+
+class CustomerQuerySet(models.QuerySet):
+    def with_stats(self):
+        '''annotates the outstanding, total, completed and latest values 
+        read by the Customer properties so that a list of customers can be 
+        rendered with a single query'''
+        total_expr = Coalesce(_customer_subquery(CalibrationIndex, 
+            models.Count('pk'), models.IntegerField()), 0)
+        outstanding_expr = Coalesce(_customer_subquery(CalibrationIndex, 
+            models.Count('pk'), models.IntegerField(), 
+            certificate_number=''), 0)
+
+        return self.annotate(
+            total_calibrations=total_expr,
+            outstanding_calibrations=outstanding_expr,
+            completed_calibrations=models.ExpressionWrapper(
+                total_expr - outstanding_expr, 
+                output_field=models.IntegerField()),
+            latest_calibration=_customer_subquery(CalibrationIndex, 
+                models.Max('date'), models.DateField())
+        )
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=255)
     address = models.TextField(blank=True) 
     email = models.CharField(max_length=255, blank=True)
     phone = models.CharField(max_length=255, blank=True)
+
+    objects = CustomerQuerySet.as_manager()
     
     def get_absolute_url(self):
         return reverse("calibration:customer-details", kwargs={"pk": self.pk})
 
     @property
     def outstanding(self):
-        total = 0
-        total += self.genericcalibration_set.filter(certificate_number__isnull=True).count()
-        total+= self.autoclave_set.filter(certificate_number__isnull=True).count()
-        total += self.balance_set.filter(certificate_number__isnull=True).count()
-        return total 
+        if hasattr(self, 'outstanding_calibrations'):
+            return self.outstanding_calibrations
 
+        return self.calibrationindex_set.filter(certificate_number='').count()
 
     @property
     def total(self):
-        total = 0
-        total += self.genericcalibration_set.all().count()
-        total+= self.autoclave_set.all().count()
-        total += self.balance_set.all().count()
-        return total 
+        if hasattr(self, 'total_calibrations'):
+            return self.total_calibrations
+
+        return self.calibrationindex_set.count()
 
     @property
     def completed(self):
-        return self.total - self.outstanding
+        if hasattr(self, 'completed_calibrations'):
+            return self.completed_calibrations
 
+        return self.total - self.outstanding
 
     @property
     def latest(self):
-        calibrations = []
-        if self.genericcalibration_set.all().count() > 0:
-            calibrations.append(self.genericcalibration_set.latest('date').date)
-
-        if self.autoclave_set.all().count() > 0:
-            calibrations.append(self.autoclave_set.latest('date').date)
+        if hasattr(self, 'latest_calibration'):
+            return self.latest_calibration
 
-        if self.balance_set.all().count() > 0:
-            calibrations.append(self.balance_set.latest('date').date)
-        
-        if len(calibrations) == 0:
-            return None
-
-        return max(calibrations)
+        return self.calibrationindex_set.aggregate(
+            latest=models.Max('date'))['latest']
     
     def __str__(self):
         return self.name
 
 
+def calibration_indexes(prefix):
+    '''the lookups used by the list filters, the keyset pagination, the
+    dashboard and the customer statistics. Outstanding calibrations are
+    counted per customer as well as in total, so certificate_number is
+    indexed on its own and behind customer.'''
+    return [
+        models.Index(fields=['customer', 'date'], name=prefix + '_cust_date'),
+        models.Index(fields=['date', 'id'], name=prefix + '_date_id'),
+        models.Index(fields=['certificate_number'], name=prefix + '_cert_no'),
+        models.Index(fields=['customer', 'certificate_number'],
+            name=prefix + '_cust_cert_no'),
+        models.Index(fields=['due'], name=prefix + '_due'),
+    ]
+
+
+PENDING_DATASHEET = 'Pending Datasheet'
+OVERDUE_DATASHEET = 'Overdue Datasheet'
+CERTIFICATE = 'Certificate'
+STATUS_CHOICES = [(status, status) for status in [
+    PENDING_DATASHEET, OVERDUE_DATASHEET, CERTIFICATE]]
+
+
+def status_conditions(today=None):
+    '''the condition matching each status, mirroring Calibration.status'''
+    today = today or datetime.date.today()
+    datasheet = models.Q(certificate_timestamp__isnull=True)
+    return {
+        CERTIFICATE: models.Q(certificate_timestamp__isnull=False),
+        OVERDUE_DATASHEET: datasheet & models.Q(due__lte=today),
+        PENDING_DATASHEET: datasheet & (
+            models.Q(due__isnull=True) | models.Q(due__gt=today)),
+    }
+
+
+class CalibrationQuerySet(models.QuerySet):
+    def with_status(self):
+        '''annotates the status computed by the database so that lists can 
+        show it without reading certificate_timestamp and due'''
+        conditions = status_conditions()
+        return self.annotate(calibration_status=models.Case(
+            *[models.When(conditions[status], then=models.Value(status)) \
+                for status in [CERTIFICATE, OVERDUE_DATASHEET]],
+            default=models.Value(PENDING_DATASHEET),
+            output_field=models.CharField()))
+
+    def filter_status(self, status):
+        '''filters on the columns rather than the annotation so that the 
+        index on due can be used'''
+        return self.filter(status_conditions()[status])
+
+
 class Calibration(models.Model):
     class Meta:
         abstract = True
 
+    objects = CalibrationQuerySet.as_manager()
+
     certificate_timestamp = models.DateTimeField(null=True)
     certificate_number = models.CharField(blank=True, max_length=255, default='')
     date = models.DateField()
@@ -97,12 +180,15 @@ class Calibration(models.Model):
 
     @property
     def status(self):
+        if hasattr(self, 'calibration_status'):
+            return self.calibration_status
+
         if not self.certificate_timestamp:
             if not self.due or self.due > datetime.date.today():
-                return 'Pending Datasheet'
-            return 'Overdue Datasheet'
+                return PENDING_DATASHEET
+            return OVERDUE_DATASHEET
             
-        return 'Certificate'
+        return CERTIFICATE
 
     @property
     def uncertainty(self):
@@ -125,7 +211,17 @@ class StandardLine(models.Model):
     actual = models.FloatField()
     uncertainty = models.FloatField()
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['standard', 'id'],
+                name='standardline_std_id'),
+        ]
+
 class Autoclave(Calibration):
+    class Meta:
+        indexes = calibration_indexes('autoclave')
+
     #defaults are pressure
     range_temp_lower = models.FloatField()
     range_temp_upper = models.FloatField()
@@ -146,22 +242,35 @@ class Autoclave(Calibration):
         squares of the individual measurement errors. In the case of an autoclave there are two'''
         return None
 
+    @cached_property
+    def pressure_lines(self):
+        '''the pressure lines with their pressures calculated together'''
+        return fill_pressures(
+            list(self.autoclavepressurecalibrationline_set.all()), self.units)
+
     @property
     def uncertainty_pressure(self):
-        return math.sqrt(math.pow(self.resolution, 2) + \
-            sum(math.pow(i.correction,2) for i in self.autoclavepressurecalibrationline_set.all()))
+        return combined_uncertainty(self.resolution,
+            [i.correction for i in self.pressure_lines])
         
 
     @property
     def uncertainty_temp(self):
-        return math.sqrt(math.pow(self.resolution_temp, 2) + \
-            sum(math.pow(i.correction,2) for i in self.autoclavetemperaturecalibrationline_set.all()))
+        return combined_uncertainty(self.resolution_temp, [i.correction \
+            for i in self.autoclavetemperaturecalibrationline_set.all()])
 
 class AutoclaveTemperatureCalibrationLine(models.Model):
     calibration = models.ForeignKey('calibration.Autoclave', on_delete=models.CASCADE)
     input_signal = models.FloatField(default=0.0)
     measured = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='autoclave_temp_line_cal_id'),
+        ]
+
     @property 
     def correction(self):
         return abs(self.input_signal - self.measured)
@@ -173,39 +282,18 @@ class AutoclavePressureCalibrationLine(models.Model):
     input_pressure = models.FloatField(default=0.0)
     measured = models.FloatField(default=0.0)
 
-    @property
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='autoclave_pres_line_cal_id'),
+        ]
+
+    @cached_property
     def calculated_pressure(self):
         '''Ensure input mass is grams'''
-
-        def calculate_pressure_psi(weight):
-            return (weight/45.19)+5.0150254481
-
-        def calculate_pressure_bar(weight):
-            return calculate_pressure_psi(weight) / 14.4038
-                
-        def calculate_pressure_kpa(weight):
-            return calculate_pressure_bar(weight) * 100
-            
-        def calculate_pressure_mpa(weight):
-            return calculate_pressure_bar(weight) / 10
-            
-        def calculate_pressure_pa(weight):
-            return calculate_pressure_bar(weight) / 100000
-
-
-        units = {
-            'bar': calculate_pressure_bar,
-            'kpa': calculate_pressure_kpa,
-            'mpa': calculate_pressure_mpa,
-            'pa': calculate_pressure_pa,
-            'psi': calculate_pressure_psi,
-        }
-        calculator  = units.get(self.calibration.units)
-        if not calculator:
-            return 0
-
-        return calculator(self.applied_mass)
-
+        return calculated_pressure(self.applied_mass,
+            self.calibration.units)
 
     @property
     def correction(self):
@@ -215,18 +303,29 @@ class AutoclavePressureCalibrationLine(models.Model):
 class GenericCalibration(Calibration):
     type = models.CharField(max_length=16)
 
+    class Meta:
+        indexes = calibration_indexes('generic') + [
+            models.Index(fields=['type', 'date'], name='generic_type_date'),
+        ]
+
     @property
     def type_string(self):
         return self.type
 
+    @cached_property
+    def pressure_lines(self):
+        '''the pressure lines with their pressures calculated together'''
+        return fill_pressures(
+            list(self.pressurecalibrationline_set.all()), self.units)
+
     @property 
     def uncertainty(self):
         '''all uncertainty calculations are performed in this method
         will calculate the uncertainty based on the recorded data
         it is the sum of the square of the resolution and the sum of the 
         squares of the individual measurement errors. In the case of an autoclave there are two'''
-        return math.sqrt(math.pow(self.resolution, 2) + \
-            sum(math.pow(i.correction,2) for i in self.genericcalibrationline_set.all()))
+        return combined_uncertainty(self.resolution, [i.correction \
+            for i in self.genericcalibrationline_set.all()])
 
 
 class GenericCalibrationLine(models.Model):
@@ -234,6 +333,13 @@ class GenericCalibrationLine(models.Model):
     input_signal = models.FloatField(default=0.0)
     measured = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='generic_line_cal_id'),
+        ]
+
     @property 
     def correction(self):
         return abs(self.input_signal - self.measured)
@@ -245,206 +351,126 @@ class PressureCalibrationLine(models.Model):
     input_pressure = models.FloatField(default=0.0)
     measured = models.FloatField(default=0.0)
 
-    @property
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='pressure_line_cal_id'),
+        ]
+
+    @cached_property
     def calculated_pressure(self):
         '''Ensure input mass is grams'''
+        return calculated_pressure(self.applied_mass,
+            self.calibration.units)
 
-        def calculate_pressure_psi(weight):
-            return (weight/45.19)+5.0150254481
+    @property
+    def correction(self):
+        return abs(self.measured - self.calculated_pressure)
 
-        def calculate_pressure_bar(weight):
-            return calculate_pressure_psi(weight) / 14.4038
-                
-        def calculate_pressure_kpa(weight):
-            return calculate_pressure_bar(weight) * 100
-            
-        def calculate_pressure_mpa(weight):
-            return calculate_pressure_bar(weight) / 10
-            
-        def calculate_pressure_pa(weight):
-            return calculate_pressure_bar(weight) / 100000
+class BalanceQuerySet(CalibrationQuerySet):
+    def with_readings(self):
+        '''loads the readings and standard used by BalanceStats so that 
+        a certificate renders with a fixed number of queries'''
+        return self.select_related('customer', 'standard').prefetch_related(
+            *BALANCE_READINGS, 'standard__standardline_set')
 
 
-        units = {
-            'bar': calculate_pressure_bar,
-            'kpa': calculate_pressure_kpa,
-            'mpa': calculate_pressure_mpa,
-            'pa': calculate_pressure_pa,
-            'psi': calculate_pressure_psi,
-        }
-        print(self.calibration.units)
-        calculator  = units.get(self.calibration.units)
-        if not calculator:
-            return 0
+class Balance(Calibration):
+    objects = BalanceQuerySet.as_manager()
 
-        return calculator(self.applied_mass)
+    class Meta:
+        indexes = calibration_indexes('balance')
 
+    @cached_property
+    def stats(self):
+        return BalanceStats(self)
 
     @property
-    def correction(self):
-        pass
+    def type_string(self):
+        return 'balance'
+
+    @property 
+    def standard_obj(self):
+        return self.standard
 
-class Balance(Calibration):
     @property
     def cold_nominal(self):
-        qs = self.balancecoldstart_set.all()
-        if qs.exists():
-            return qs.first().nominal
+        return self.stats.cold_nominal
 
-    @property 
+    @property
     def cold_drift(self):
         '''the total cold start readings
         average of maximum and minimum values
         test_weight value - ((max + min)/2) '''
-        cold_values = [i.measurement for i in self.balancecoldstart_set.all()]
-        if len(cold_values) > 0:
-            average_over_span = (min(cold_values) + max(cold_values)) / 2
-            return round(abs(float(self.balancecoldstart_set.first().nominal) - average_over_span), 4) #TODO change
-
-
-    @property
-    def type_string(self):
-        return 'balance'
+        return self.stats.cold_drift
 
-    @property 
-    def standard_obj(self):
-        return Standard.objects.get(name=self.standard)
-        
     @property
     def corner_weight(self):
-        qs = self.balanceoffcenter_set.all()
-        if qs.exists():
-            return qs.first().mass_piece
-
-        return None
+        return self.stats.corner_weight
 
     @property
     def max_corner_error(self):
-        if self.corner_weight:
-            max_error = 0 
-            for i in self.balanceoffcenter_set.all():
-                error = abs(i.measurement - self.corner_weight)
-                if error > max_error:
-                    max_error = error
-
-            return max_error
-        return None
+        return self.stats.max_corner_error
 
     @property
     def settling_average(self):
-        return mean(i.measurement for i in self.balancesettlingtime_set.all())
+        return self.stats.settling_average
 
-    @property 
+    @property
     def half_repeat(self):
-        readings = [i.half_load for i in self.balancerepeatability_set.all()]
-        if len(readings) == 0:
-            return 0
-        return stdev(readings)
+        return self.stats.half_repeat
 
     @property
     def full_repeat(self):
-        readings = [i.full_load for i in self.balancerepeatability_set.all()]
-        if len(readings) == 0:
-            return 0
-        return stdev(readings)
+        return self.stats.full_repeat
 
     @property
     def uncertainty(self):
         """overall uncertainty of the data derived from the 
         uncertainty of the standards, the measurements
         drift, repeatbility """
-
-        def squareroot_of_sum_of_squares(l):
-            squares = [math.pow(i, 2) for i in l]
-            return math.sqrt(sum(squares))
-
-        std_uncertainty = squareroot_of_sum_of_squares([i.uncertainty for i in \
-                                self.standard.standardline_set.all()])
-        
-        resolution_uncertainty = (self.resolution / 2) / math.sqrt(3)
-        drift_uncertainty = self.cold_drift / math.sqrt(3)
-        repeatability_uncertainty = squareroot_of_sum_of_squares(
-            [self.half_repeat, self.full_repeat])
-        
-        return round(squareroot_of_sum_of_squares([std_uncertainty,
-                    resolution_uncertainty,
-                    drift_uncertainty,
-                    repeatability_uncertainty]) * 2, 4)
+        return self.stats.uncertainty
 
     @property
     def up_down_linearity(self):
-        readings = [mea for mea in self.balancelinearityupdown_set.all()]
-        print(readings)
-        up = readings[:5]
-        
-        down = readings[4:9]
-        up2 = readings[10:15]
-        
-        print(len(up))
-        print(len(up2))
-        print(len(down))
-
-        if len(up) != len(down) or len(up) != len(up2):
-            return None
-
-        res = []
-        for i in range(5):
-            data = {}
-            data['nom'] = up[i].nominal
-            data['actual'] = up[i].actual
-            data['up'] = up[i].measurement
-            data['down'] = down[i].measurement
-            data['up2'] = up2[i].measurement
-            reading_list =[up[i].measurement, 
-                                down[i].measurement, 
-                                up2[i].measurement]
-            data['avg'] = round(mean(reading_list), 4)
-            data['stdev'] = round(stdev(reading_list), 4)
-            data['diff'] = round(abs(up[i].actual - mean(reading_list)),4)
-            
-            res.append(data)
-
-        return res
+        return self.stats.up_down_linearity
 
     @property
     def repeat_half_average(self):
-        return mean([i.half_load for i in self.balancerepeatability_set.all()])
+        return self.stats.repeat_half_average
 
     @property
     def repeat_full_average(self):
-        return mean([i.full_load for i in self.balancerepeatability_set.all()])
-        
+        return self.stats.repeat_full_average
 
     @property
     def repeat_half_stdev(self):
-        if self.balancerepeatability_set.all().count() > 1:
-            return round(stdev([i.half_load for i in self.balancerepeatability_set.all()]), 4)
-        
+        return self.stats.repeat_half_stdev
 
     @property
     def repeat_full_stdev(self):
-        if self.balancerepeatability_set.all().count() > 1:
-            return round(stdev([i.full_load for i in self.balancerepeatability_set.all()]), 4)
+        return self.stats.repeat_full_stdev
 
-    @property 
+    @property
     def off_center_min(self):
-        return min(i.measurement for i in self.balanceoffcenter_set.all())
+        return self.stats.off_center_min
 
-    @property 
+    @property
     def off_center_max(self):
-        return max(i.measurement for i in self.balanceoffcenter_set.all())
+        return self.stats.off_center_max
 
-    @property 
+    @property
     def off_center_mean(self):
-        return mean(i.measurement for i in self.balanceoffcenter_set.all())
+        return self.stats.off_center_mean
 
-    @property 
+    @property
     def off_center_min_error(self):
-        return min(i.difference for i in self.balanceoffcenter_set.all())
+        return self.stats.off_center_min_error
 
-    @property 
+    @property
     def off_center_stdev(self):
-        return stdev(i.measurement for i in self.balanceoffcenter_set.all())
+        return self.stats.off_center_stdev
 
 class BalanceColdStart(models.Model):
     #up to 5 measurements
@@ -452,6 +478,13 @@ class BalanceColdStart(models.Model):
     measurement = models.FloatField(default=0.0)
     nominal = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='balance_cold_start_cal_id'),
+        ]
+
     @property
     def actual(self):
         return 0#TODO fix
@@ -466,26 +499,33 @@ class BalanceSettlingTime(models.Model):
     calibration = models.ForeignKey('calibration.Balance', on_delete=models.CASCADE)
     measurement = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='balance_settling_cal_id'),
+        ]
+
 
 class BalanceLinearityUpDown(models.Model):
     #up to 15 measurements
     calibration = models.ForeignKey('calibration.Balance', on_delete=models.CASCADE)
     measurement = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='balance_lin_up_down_cal_id'),
+        ]
+
     @property 
     def closest(self):
         std = self.calibration.standard
         if not std:
             return 
 
-        closest_id = None
-        smallest_difference = None
-        for line in std.standardline_set.all():
-            diff = abs(self.measurement - line.actual)
-            if not smallest_difference or diff < smallest_difference:
-                closest_id = line.id
-
-        return StandardLine.objects.get(pk=closest_id)
+        return index_for(std).nearest(self.measurement)
 
     @property
     def nominal(self):
@@ -504,6 +544,13 @@ class BalanceLinearity(models.Model):
     nominal = models.FloatField(default=0.0)
     measurement = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='balance_linearity_cal_id'),
+        ]
+
     @property
     def difference(self):
         return abs(self.measurement - self.actual)
@@ -514,6 +561,13 @@ class BalanceTaringLinearity(models.Model):
     tare = models.FloatField(default=0.0)
     indicated = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='balance_taring_cal_id'),
+        ]
+
 
 class BalanceRepeatability(models.Model):
     #up to 10 measurements
@@ -521,6 +575,13 @@ class BalanceRepeatability(models.Model):
     half_load = models.FloatField(default=0.0)
     full_load = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='balance_repeat_cal_id'),
+        ]
+
 
     @property 
     def closest_half(self):
@@ -528,14 +589,7 @@ class BalanceRepeatability(models.Model):
         if not std:
             return 
 
-        closest_id = None
-        smallest_difference = None
-        for line in std.standardline_set.all():
-            diff = abs(self.half_load - line.actual)
-            if not smallest_difference or diff < smallest_difference:
-                closest_id = line.id
-
-        return StandardLine.objects.get(pk=closest_id)
+        return index_for(std).nearest(self.half_load)
 
     @property 
     def closest_full(self):
@@ -543,14 +597,7 @@ class BalanceRepeatability(models.Model):
         if not std:
             return 
 
-        closest_id = None
-        smallest_difference = None
-        for line in std.standardline_set.all():
-            diff = abs(self.full_load - line.actual)
-            if not smallest_difference or diff < smallest_difference:
-                closest_id = line.id
-
-        return StandardLine.objects.get(pk=closest_id)
+        return index_for(std).nearest(self.full_load)
 
     @property
     def nominal_half(self):
@@ -578,6 +625,137 @@ class BalanceOffCenter(models.Model):
     measurement = models.FloatField(default=0.0)
     mass_piece = models.FloatField(default=0.0)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['calibration', 'id'],
+                name='balance_off_center_cal_id'),
+        ]
+
     @property 
     def difference(self):
-        return abs(self.mass_piece - self. measurement)
\ No newline at end of file
+        return abs(self.mass_piece - self. measurement)
+
+
+class IngestJob(models.Model):
+    '''an upload received from a tablet that is waiting for, or has been 
+    through, the ingest worker. The payload is kept on disk at payload_path 
+    so large uploads are never held in a single row.'''
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('calibrations', 'Calibrations'),
+        ('standards', 'Standards'),
+    ]
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, 
+        default='queued')
+    payload_path = models.CharField(max_length=255)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    # saved by the worker after every committed batch, a running job whose 
+    # heartbeat stops is taken to have lost its worker
+    heartbeat = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    processed = models.IntegerField(default=0)
+    duplicates = models.IntegerField(default=0)
+    rows = models.IntegerField(default=0)
+    errors = models.TextField(blank=True)
+    # JSON summary of the changes made by a finished job
+    summary = models.TextField(blank=True)
+
+    def as_dict(self):
+        return {
+            'job': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'processed': self.processed,
+            'new': self.processed - self.duplicates,
+            'duplicates': self.duplicates,
+            'rows': self.rows,
+            'errors': [e for e in self.errors.split('\n') if e],
+            'summary': json.loads(self.summary) if self.summary else None,
+        }
+
+
+class UploadFingerprint(models.Model):
+    '''sha256 of the canonical JSON of an uploaded calibration, or of a 
+    whole upload, used to skip records that tablets send again after a 
+    retry'''
+    KIND_CHOICES = [
+        ('calibration', 'Calibration'),
+        ('batch', 'Batch'),
+    ]
+    digest = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class CertificateSnapshot(models.Model):
+    '''the derived results of a calibration, frozen as JSON when its 
+    certificate is issued'''
+    calibration_type = models.CharField(max_length=16)
+    calibration_id = models.IntegerField()
+    certificate_number = models.CharField(max_length=255)
+    version = models.IntegerField()
+    data = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [('calibration_type', 'calibration_id')]
+
+    @property
+    def results(self):
+        return json.loads(self.data)
+
+
+class CalibrationIndex(models.Model):
+    '''one row for every calibration of any type, kept in step with the 
+    calibration tables by calibration.signals so that listing, counting and 
+    searching across types is a single query on one table'''
+    TYPE_CHOICES = [
+        ('balance', 'Balance'),
+        ('autoclave', 'Autoclave'),
+        ('generic', 'Generic'),
+    ]
+    DETAIL_URLS = {
+        'balance': 'calibration:balance-calibration-detail',
+        'autoclave': 'calibration:autoclave-calibration-detail',
+        'generic': 'calibration:calibration-detail',
+    }
+    calibration_type = models.CharField(max_length=16, choices=TYPE_CHOICES)
+    calibration_id = models.IntegerField()
+    # the type_string of the calibration, the instrument type of a generic 
+    # calibration
+    type = models.CharField(max_length=16)
+    customer = models.ForeignKey('calibration.customer', 
+        on_delete=models.SET_NULL, null=True)
+    date = models.DateField()
+    due = models.DateField(blank=True, null=True)
+    serial = models.CharField(max_length=255, blank=True)
+    name_of_instrument = models.CharField(max_length=255, blank=True)
+    certificate_number = models.CharField(blank=True, max_length=255, 
+        default='')
+    certificate_timestamp = models.DateTimeField(null=True)
+
+    objects = CalibrationQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [('calibration_type', 'calibration_id')]
+        indexes = calibration_indexes('calindex') + [
+            models.Index(fields=['type', 'date'], name='calindex_type_date'),
+            models.Index(fields=['serial'], name='calindex_serial'),
+        ]
+
+    status = Calibration.status
+
+    def get_absolute_url(self):
+        return reverse(self.DETAIL_URLS[self.calibration_type], 
+            kwargs={'pk': self.calibration_id})
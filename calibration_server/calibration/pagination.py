@@ -0,0 +1,146 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(values):
+    data = json.dumps(values, cls=DjangoJSONEncoder).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise Http404('Invalid cursor')
+    if not isinstance(values, list):
+        raise Http404('Invalid cursor')
+    return values
+
+
+def reverse_ordering(ordering):
+    return [f[1:] if f.startswith('-') else '-' + f for f in ordering]
+
+
+def after_filter(ordering, values):
+    '''the rows that come after values in the ordering. For (-date, -id)
+    that is date < d or (date = d and id < i)'''
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = '%s__%s' % (name, 'lt' if field.startswith('-') else 'gt')
+        step = Q(**{lookup: values[i]})
+        for prev, value in zip(ordering[:i], values):
+            step &= Q(**{prev.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+class KeysetPage(object):
+    def __init__(self, object_list, has_next, has_previous, ordering,
+            query):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.ordering = ordering
+        self.query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def cursor(self, obj):
+        return encode_cursor([getattr(obj, f.lstrip('-')) \
+            for f in self.ordering])
+
+    def link(self, **params):
+        query = self.query.copy()
+        for key in ['after', 'before', 'page']:
+            query.pop(key, None)
+        query.update(params)
+        return '?' + query.urlencode()
+
+    def first_link(self):
+        return self.link()
+
+    def next_link(self):
+        if not self.object_list:
+            return self.first_link()
+        return self.link(after=self.cursor(self.object_list[-1]))
+
+    def previous_link(self):
+        if not self.object_list:
+            return self.first_link()
+        return self.link(before=self.cursor(self.object_list[0]))
+
+
+class KeysetPaginator(object):
+    '''pages through a queryset by filtering on the last row shown rather
+    than with an OFFSET, so a page deep in a large table costs the same as
+    the first. The ordering must end in a unique field.'''
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+
+    def page(self, query):
+        after = query.get('after')
+        before = query.get('before')
+        if before:
+            values = decode_cursor(before)
+            ordering = reverse_ordering(self.ordering)
+        else:
+            values = decode_cursor(after) if after else None
+            ordering = self.ordering
+
+        qs = self.queryset.order_by(*ordering)
+        if values is not None:
+            if len(values) != len(ordering):
+                raise Http404('Invalid cursor')
+            try:
+                qs = qs.filter(after_filter(ordering, values))
+            except (ValidationError, ValueError, TypeError):
+                raise Http404('Invalid cursor')
+
+        rows = list(qs[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before:
+            rows.reverse()
+            return KeysetPage(rows, True, more, self.ordering, query)
+        return KeysetPage(rows, more, values is not None, self.ordering,
+            query)
+
+
+class KeysetPaginationMixin(object):
+    '''replaces the offset pagination of a list view with keyset
+    pagination over keyset_ordering'''
+    keyset_ordering = ('-date', '-id')
+    pagination_template = 'keyset_pagination.html'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        page = paginator.page(self.request.GET)
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['pagination_template'] = self.pagination_template
+        return context
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+
+DEFAULT_MAX_SIZE = 500 * 1024 * 1024
+
+
+def cache_dir():
+    path = getattr(settings, 'CERTIFICATE_CACHE_DIR',
+        os.path.join(settings.BASE_DIR, 'certificate_cache'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def max_size():
+    return getattr(settings, 'CERTIFICATE_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE)
+
+
+def is_cacheable(obj):
+    '''only issued certificates are cached, they do not change once the
+    certificate number has been set'''
+    return bool(obj.certificate_number)
+
+
+def hash_row(digest, obj):
+    for field in obj._meta.concrete_fields:
+        digest.update(('%s=%r;' % (field.attname,
+            field.value_from_object(obj))).encode('utf-8'))
+
+
+def context_hash(obj, template_names, extra=None):
+    '''hashes the values the certificate is rendered from, the rows of the
+    calibration and its customer, the templates used and any extra
+    context'''
+    digest = hashlib.sha256()
+    hash_row(digest, obj)
+    if obj.customer_id:
+        hash_row(digest, obj.customer)
+    digest.update(repr(list(template_names)).encode('utf-8'))
+    digest.update(repr(sorted((extra or {}).items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_path(obj, template_names, extra=None):
+    certificate = re.sub(r'[^A-Za-z0-9_-]', '_', obj.certificate_number)
+    name = '%s-%d-%s-%s.pdf' % (obj._meta.model_name, obj.pk, certificate,
+        context_hash(obj, template_names, extra)[:16])
+    return os.path.join(cache_dir(), name)
+
+
+def get(path):
+    '''returns path if it is cached, marking it as recently used'''
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def put(path, content):
+    '''writes the pdf atomically so a concurrent reader never sees a
+    partial file, then evicts the least recently used files over the
+    size limit'''
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+    evict(max_size())
+
+
+def entries():
+    '''the cached pdfs as (path, size, last used) tuples, least recently
+    used first'''
+    result = []
+    for entry in os.scandir(cache_dir()):
+        if entry.is_file() and entry.name.endswith('.pdf'):
+            stat = entry.stat()
+            result.append((entry.path, stat.st_size, stat.st_mtime))
+    return sorted(result, key=lambda e: e[2])
+
+
+def evict(limit):
+    cached = entries()
+    total = sum(size for _, size, _ in cached)
+    removed = 0
+    for path, size, _ in cached:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def purge(model_name=None):
+    removed = 0
+    for path, _, _ in entries():
+        if model_name and not os.path.basename(path).startswith(
+                model_name + '-'):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
@@ -0,0 +1,224 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from calibration.query_budget import MIDDLEWARE_FILES, PROJECT_DIR, call_site
+
+MIDDLEWARE_FILES.add(os.path.abspath(__file__))
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+DEFAULT_KEEP = 200
+TOP_FUNCTIONS = 30
+SLOWEST_QUERIES = 10
+
+# where the time of a request goes, each function's own time is counted in
+# the first area its file or name matches
+AREAS = [
+    ('weasyprint', re.compile(r'weasyprint|cairo|pango|tinycss2|cssselect2|'
+        r'html5lib|pyphen|fontTools')),
+    ('database', re.compile(r'django/db/|sqlite3|psycopg2|MySQLdb')),
+    ('templates', re.compile(r'django/template/|templatetags/')),
+    ('statistics', re.compile(r'balance_stats|uncertainty|units\.py|numpy')),
+    ('calibration', re.compile(re.escape(PROJECT_DIR))),
+    ('django', re.compile(r'/django/')),
+]
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILER_DIR', None)
+
+
+def profile_paths(profile_id):
+    '''the .prof dump and the json summary of a profile'''
+    base = os.path.join(profile_dir(), profile_id)
+    return base + '.prof', base + '.json'
+
+
+def function_name(key):
+    filename, line, name = key
+    if filename == '~':
+        return name
+    # relative to the project or the entry of sys.path holding the file
+    for directory in sorted([PROJECT_DIR] + sys.path, key=len,
+            reverse=True):
+        if directory and filename.startswith(directory + os.sep):
+            filename = os.path.relpath(filename, directory)
+            break
+    return '%s:%d(%s)' % (filename, line, name)
+
+
+def area_of(key):
+    filename, _, name = key
+    label = '%s %s' % (filename, name)
+    for area, pattern in AREAS:
+        if pattern.search(label):
+            return area
+    return 'other'
+
+
+def summarize_stats(stats, limit=TOP_FUNCTIONS):
+    '''the functions with the most cumulative time and the own time of
+    every function added up by area'''
+    areas = {}
+    functions = []
+    for key, (_, calls, own, cumulative, _) in stats.stats.items():
+        area = area_of(key)
+        areas[area] = areas.get(area, 0) + own
+        functions.append({
+            'function': function_name(key),
+            'calls': calls,
+            'own_seconds': round(own, 6),
+            'cumulative_seconds': round(cumulative, 6),
+        })
+    functions.sort(key=lambda f: -f['cumulative_seconds'])
+    return functions[:limit], dict((area, round(seconds, 6)) for area, \
+        seconds in sorted(areas.items(), key=lambda a: -a[1]))
+
+
+class TimedQueryRecorder(object):
+    '''a database execute wrapper keeping the sql, call site and duration
+    of every query'''
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        site = call_site()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, site, sql))
+
+    def slowest(self, limit=SLOWEST_QUERIES):
+        return [{'seconds': round(seconds, 6), 'site': site, 'sql': sql} \
+            for seconds, site, sql in sorted(self.queries,
+                key=lambda q: -q[0])[:limit]]
+
+
+def prune(keep):
+    '''removes all but the keep most recent profiles'''
+    summaries = sorted(name for name in os.listdir(profile_dir()) \
+        if name.endswith('.json'))
+    removed = 0
+    for name in summaries[:max(len(summaries) - keep, 0)]:
+        for path in profile_paths(name[:-len('.json')]):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        removed += 1
+    return removed
+
+
+def recent_profiles(limit=None):
+    '''the summaries of the saved profiles, newest first'''
+    directory = profile_dir()
+    if not directory or not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory) \
+        if name.endswith('.json')), reverse=True)
+    summaries = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+
+class ProfilerMiddleware(object):
+    '''profiles requests that ask for it with an X-Profile header or a
+    profile query parameter holding PROFILER_TOKEN, superusers may pass
+    any value. The cProfile dump and a json summary of the slowest
+    functions and queries are saved to PROFILER_DIR. Without a
+    PROFILER_DIR the middleware removes itself.'''
+
+    def __init__(self, get_response):
+        if not profile_dir():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.token = getattr(settings, 'PROFILER_TOKEN', '')
+        self.keep = getattr(settings, 'PROFILER_KEEP', DEFAULT_KEEP)
+
+    def requested(self, request):
+        flag = request.META.get(PROFILE_HEADER) or \
+            request.GET.get(PROFILE_PARAM)
+        if not flag:
+            return False
+        if self.token and constant_time_compare(flag, self.token):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_superuser)
+
+    def __call__(self, request):
+        if not self.requested(request):
+            return self.get_response(request)
+
+        recorder = TimedQueryRecorder()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(recorder))
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        seconds = time.perf_counter() - start
+
+        response['X-Profile-Id'] = self.save(request, response, profile,
+            recorder, seconds)
+        return response
+
+    def save(self, request, response, profile, recorder, seconds):
+        match = getattr(request, 'resolver_match', None)
+        label = match.view_name if match and match.view_name else \
+            request.path
+        created = timezone.now()
+        profile_id = '%s-%s' % (created.strftime('%Y%m%d-%H%M%S-%f'),
+            re.sub(r'[^A-Za-z0-9_-]+', '_', label).strip('_')[:60])
+
+        # the token is not written to disk
+        query = request.GET.copy()
+        query.pop(PROFILE_PARAM, None)
+        path = request.path + ('?' + query.urlencode() if query else '')
+
+        os.makedirs(profile_dir(), exist_ok=True)
+        prof_path, summary_path = profile_paths(profile_id)
+        profile.dump_stats(prof_path)
+        functions, areas = summarize_stats(pstats.Stats(profile))
+        summary = {
+            'id': profile_id,
+            'created': created.isoformat(),
+            'method': request.method,
+            'path': path,
+            'view': label,
+            'status': response.status_code,
+            # a streamed body is produced after the profile has stopped
+            'streaming': response.streaming,
+            'seconds': round(seconds, 6),
+            'queries': len(recorder.queries),
+            'query_seconds': round(sum(q[0] for q in recorder.queries), 6),
+            'areas': areas,
+            'functions': functions,
+            'slowest_queries': recorder.slowest(),
+        }
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        prune(self.keep)
+        return profile_id
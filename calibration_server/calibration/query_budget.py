@@ -0,0 +1,130 @@
+import os
+import sys
+from collections import Counter, OrderedDict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django import db
+from django.db import connections
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THIS_FILE = os.path.abspath(__file__)
+# middleware wrapping the views, their frames are never the call site
+MIDDLEWARE_FILES = set([THIS_FILE])
+# frames in here are the ORM making the query rather than its caller
+ORM_DIR = os.path.dirname(os.path.abspath(db.__file__))
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    '''declares the most queries a function view may make, class based
+    views set a query_budget attribute instead'''
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def budget_for(view):
+    budget = getattr(view, 'query_budget', None)
+    if budget is None and hasattr(view, 'view_class'):
+        budget = getattr(view.view_class, 'query_budget', None)
+    return budget
+
+
+def enforced():
+    return getattr(settings, 'QUERY_BUDGET_ENFORCE', settings.DEBUG)
+
+
+def frame_site(frame):
+    filename = frame.f_code.co_filename
+    if filename.startswith(PROJECT_DIR):
+        filename = os.path.relpath(filename, PROJECT_DIR)
+    return '%s:%d in %s' % (filename, frame.f_lineno, frame.f_code.co_name)
+
+
+def call_site():
+    '''where a query was made from, the innermost frame of the project's
+    own code, or else the innermost frame outside the ORM, and the
+    template line being rendered if there is one'''
+    code = caller = template = None
+    frame = sys._getframe(2)
+    while frame is not None and (code is None or template is None):
+        filename = frame.f_code.co_filename
+        if filename not in MIDDLEWARE_FILES:
+            if code is None and filename.startswith(PROJECT_DIR):
+                code = frame_site(frame)
+            if caller is None and not filename.startswith(ORM_DIR):
+                caller = frame_site(frame)
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template = '%s:%d' % (origin.template_name or origin.name,
+                    token.lineno)
+        frame = frame.f_back
+
+    code = code or caller or 'unknown'
+    if template:
+        return '%s via %s' % (code, template)
+    return code
+
+
+class QueryRecorder(object):
+    '''a database execute wrapper keeping the sql and call site of every
+    query'''
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((call_site(), sql))
+        return execute(sql, params, many, context)
+
+    def report(self):
+        '''the queries grouped by call site, the most repeated first'''
+        sites = OrderedDict()
+        for site, sql in self.queries:
+            sites.setdefault(site, Counter())[sql] += 1
+        lines = []
+        for site, counts in sorted(sites.items(),
+                key=lambda item: -sum(item[1].values())):
+            lines.append('%d queries from %s' % (sum(counts.values()), site))
+            for sql, count in counts.most_common():
+                lines.append('    %dx %s' % (count, sql))
+        return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware(object):
+    '''raises QueryBudgetExceeded when a view with a query_budget makes
+    more queries than it allows, listing the queries by call site so
+    repeated ones stand out. Only active when QUERY_BUDGET_ENFORCE is set,
+    which defaults to DEBUG.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = budget_for(view_func)
+
+    def __call__(self, request):
+        if not enforced():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(recorder))
+            # template responses are rendered before this returns
+            response = self.get_response(request)
+
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and len(recorder.queries) > budget:
+            raise QueryBudgetExceeded('%s made %d queries, its budget is '
+                '%d\n%s' % (request.path, len(recorder.queries), budget,
+                    recorder.report()))
+        return response
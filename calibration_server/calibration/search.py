@@ -0,0 +1,133 @@
+from django.db import connection
+from django.db.models import Q
+
+from calibration import models
+
+SEARCH_TABLE = 'calibration_search'
+
+# the calibration fields copied into the full text index, the customer's
+# name is stored alongside them
+SEARCH_FIELDS = ['serial', 'manufacturer', 'model', 'name_of_instrument',
+    'comments']
+SEARCH_COLUMNS = SEARCH_FIELDS + ['customer']
+
+# searches shorter than this cannot be matched by the trigram tokenizer
+MIN_TERM_LENGTH = 3
+
+
+def available():
+    '''the full text index is an SQLite FTS5 table, other databases fall
+    back to icontains lookups on the calibration index'''
+    return connection.vendor == 'sqlite'
+
+
+def match_query(text):
+    '''turns what the user typed into an FTS5 query matching every term
+    anywhere in the indexed columns'''
+    terms = [term.replace('"', '""') for term in text.split() \
+        if len(term) >= MIN_TERM_LENGTH]
+    return ' '.join('"%s"*' % term for term in terms)
+
+
+def row_values(obj):
+    values = [getattr(obj, field) for field in SEARCH_FIELDS]
+    values.append(obj.customer.name if obj.customer_id else '')
+    return values
+
+
+def update(row_id, obj):
+    '''indexes a calibration under the id of its CalibrationIndex row'''
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % SEARCH_TABLE,
+            [row_id])
+        cursor.execute('INSERT INTO %s (rowid, %s) VALUES (%s)' % (
+            SEARCH_TABLE, ', '.join(SEARCH_COLUMNS),
+            ', '.join(['%s'] * (len(SEARCH_COLUMNS) + 1))),
+            [row_id] + row_values(obj))
+
+
+def remove(row_ids):
+    if not available() or not row_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (
+            SEARCH_TABLE, ', '.join(['%s'] * len(row_ids))), list(row_ids))
+
+
+def update_customer(customer, name=None):
+    '''rewrites the customer name of every calibration of a customer'''
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE %s SET customer = %%s WHERE rowid IN ('
+            'SELECT id FROM %s WHERE customer_id = %%s)' % (
+                SEARCH_TABLE, models.CalibrationIndex._meta.db_table),
+            [customer.name if name is None else name, customer.pk])
+
+
+def rebuild():
+    '''refills the full text index from the calibration index in SQL'''
+    if not available():
+        return
+    index_table = models.CalibrationIndex._meta.db_table
+    customer_table = models.Customer._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % SEARCH_TABLE)
+        for typ, model in [('balance', models.Balance),
+                           ('autoclave', models.Autoclave),
+                           ('generic', models.GenericCalibration)]:
+            cursor.execute(
+                'INSERT INTO {search} (rowid, {columns}) '
+                'SELECT ci.id, {fields}, COALESCE(cu.name, \'\') '
+                'FROM {index} ci '
+                'JOIN {table} c ON c.id = ci.calibration_id '
+                'LEFT JOIN {customer} cu ON cu.id = c.customer_id '
+                'WHERE ci.calibration_type = %s'.format(
+                    search=SEARCH_TABLE,
+                    columns=', '.join(SEARCH_COLUMNS),
+                    fields=', '.join('c.%s' % f for f in SEARCH_FIELDS),
+                    index=index_table,
+                    table=model._meta.db_table,
+                    customer=customer_table), [typ])
+
+
+def filter_queryset(queryset, text):
+    '''restricts a CalibrationIndex queryset to the calibrations matching
+    text, annotating the FTS5 rank where it is available'''
+    if not available():
+        condition = Q()
+        for term in text.split():
+            condition &= Q(serial__icontains=term) | \
+                Q(name_of_instrument__icontains=term) | \
+                Q(customer__name__icontains=term)
+        return queryset.filter(condition)
+
+    query = match_query(text)
+    if not query:
+        return queryset.none()
+
+    table = models.CalibrationIndex._meta.db_table
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[
+            '%s.rowid = %s.id' % (SEARCH_TABLE, table),
+            '%s MATCH %%s' % SEARCH_TABLE,
+        ],
+        params=[query],
+        select={'rank': '%s.rank' % SEARCH_TABLE})
+
+
+def search(text, calibration_type=None, limit=20):
+    '''the calibrations of every type matching text, best match first'''
+    qs = models.CalibrationIndex.objects.with_status().select_related(
+        'customer')
+    if calibration_type:
+        qs = qs.filter(calibration_type=calibration_type)
+    if not available():
+        return filter_queryset(qs, text).order_by('-date', '-id')[:limit]
+    if not match_query(text):
+        return qs.none()
+    return filter_queryset(qs, text).order_by('rank')[:limit]
@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+
+from calibration import calibration_index, models, search
+from calibration.dashboard import invalidate_dashboard_stats
+from calibration.standard_index import bump_version
+
+DASHBOARD_SENDERS = [
+    models.Balance,
+    models.Autoclave,
+    models.GenericCalibration,
+    models.Customer,
+    models.Standard,
+]
+
+
+def invalidate_dashboard(sender, **kwargs):
+    # wait for the commit so a concurrent reader cannot cache a snapshot 
+    # computed before the change is visible
+    transaction.on_commit(invalidate_dashboard_stats)
+
+
+for sender in DASHBOARD_SENDERS:
+    post_save.connect(invalidate_dashboard, sender=sender)
+    post_delete.connect(invalidate_dashboard, sender=sender)
+
+
+def invalidate_standard_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_version(instance.standard_id))
+
+
+post_save.connect(invalidate_standard_index, sender=models.StandardLine)
+post_delete.connect(invalidate_standard_index, sender=models.StandardLine)
+
+
+def sync_calibration_index(sender, instance, **kwargs):
+    calibration_index.sync(instance)
+
+
+def remove_from_calibration_index(sender, instance, **kwargs):
+    calibration_index.remove(instance)
+
+
+for sender in calibration_index.INDEX_MODELS:
+    post_save.connect(sync_calibration_index, sender=sender)
+    post_delete.connect(remove_from_calibration_index, sender=sender)
+
+
+def update_customer_search(sender, instance, **kwargs):
+    search.update_customer(instance)
+
+
+def clear_customer_search(sender, instance, **kwargs):
+    # the calibrations are kept with no customer
+    search.update_customer(instance, name='')
+
+
+post_save.connect(update_customer_search, sender=models.Customer)
+pre_delete.connect(clear_customer_search, sender=models.Customer)
@@ -0,0 +1,77 @@
+import bisect
+import uuid
+
+from django.core.cache import cache
+
+from calibration import metrics
+
+# process wide indexes keyed by (standard id, version)
+_indexes = {}
+
+
+class StandardLineIndex(object):
+    '''the lines of a standard sorted by their actual mass, so the line
+    nearest a reading is found by bisection'''
+
+    def __init__(self, lines):
+        self.lines = sorted(lines, key=lambda l: l.actual)
+        self.actuals = [line.actual for line in self.lines]
+
+    def __len__(self):
+        return len(self.lines)
+
+    def nearest(self, value):
+        '''the line whose actual mass is closest to value, the lighter
+        line on a tie'''
+        if not self.lines:
+            return None
+
+        i = bisect.bisect_left(self.actuals, value)
+        if i == 0:
+            return self.lines[0]
+        if i == len(self.lines):
+            return self.lines[-1]
+
+        before, after = self.lines[i - 1], self.lines[i]
+        if value - before.actual <= after.actual - value:
+            return before
+        return after
+
+    def nearest_many(self, values):
+        return [self.nearest(value) for value in values]
+
+
+def version_key(standard_id):
+    return 'calibration:standard-lines:%d' % standard_id
+
+
+def line_version(standard_id):
+    '''a token that changes whenever the lines of the standard change. A
+    token lost from the cache is replaced, which only forces a rebuild.'''
+    key = version_key(standard_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(standard_id):
+    cache.set(version_key(standard_id), uuid.uuid4().hex, None)
+
+
+def index_for(standard):
+    '''returns the index of a standard's lines, reusing the one built by
+    this process while the lines are unchanged'''
+    if standard is None:
+        return StandardLineIndex([])
+
+    version = line_version(standard.pk)
+    index = _indexes.get((standard.pk, version))
+    metrics.cache_lookup('standard_lines', index is not None)
+    if index is None:
+        index = StandardLineIndex(standard.standardline_set.all())
+        for key in [k for k in _indexes if k[0] == standard.pk]:
+            del _indexes[key]
+        _indexes[(standard.pk, version)] = index
+    return index
@@ -0,0 +1,135 @@
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+DELIMITERS = WHITESPACE + ',:]}'
+
+
+class JSONStreamReader(object):
+    '''Decodes JSON values from a file-like object one value at a time.
+
+    Only the text that has not been consumed yet is kept in the buffer, so
+    memory is bounded by the largest single value read rather than by the
+    size of the document.'''
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.text_decoder = None
+        self.json_decoder = json.JSONDecoder()
+
+    def fill(self):
+        '''reads the next chunk from the stream, returns False once the
+        stream is exhausted'''
+        if self.eof:
+            return False
+
+        data = self.stream.read(self.chunk_size)
+        if self.text_decoder is None:
+            # the same detection json.loads applies to bytes, it needs the
+            # first four bytes of the document
+            while data and len(data) < 4:
+                more = self.stream.read(self.chunk_size)
+                if not more:
+                    break
+                data += more
+            encoding = json.detect_encoding(data) if data else 'utf-8'
+            self.text_decoder = codecs.getincrementaldecoder(encoding)()
+
+        text = self.text_decoder.decode(data, final=not data)
+        if not data:
+            self.eof = True
+
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def error(self, msg):
+        return json.JSONDecodeError(msg, self.buffer, self.pos)
+
+    def peek(self):
+        '''returns the next character that is not whitespace without
+        consuming it, an empty string at the end of the stream'''
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error('Expecting %r' % char)
+        self.pos += 1
+
+    def skip(self, char):
+        '''consumes char if it is next, returns whether it was'''
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+
+            # a number cut by the chunk boundary decodes to its prefix, so
+            # it is only complete once a delimiter follows it
+            if self.eof or end < len(self.buffer) and \
+                    self.buffer[end] in DELIMITERS:
+                self.pos = end
+                return obj
+
+            self.fill()
+
+
+def iter_json_array(stream, key, chunk_size=CHUNK_SIZE):
+    '''yields the elements of the array stored under key in the top level
+    object of a JSON document, reading the stream incrementally. Other
+    members of the object are decoded and discarded.'''
+    reader = JSONStreamReader(stream, chunk_size)
+    found = False
+    reader.expect('{')
+    if reader.skip('}'):
+        raise KeyError(key)
+
+    while True:
+        name = reader.value()
+        if not isinstance(name, str):
+            raise reader.error('Expecting property name')
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            found = True
+            reader.expect('[')
+            if not reader.skip(']'):
+                while True:
+                    yield reader.value()
+                    if reader.skip(','):
+                        continue
+                    reader.expect(']')
+                    break
+        else:
+            reader.value()
+
+        if reader.skip(','):
+            continue
+        reader.expect('}')
+        break
+
+    if reader.peek() != '':
+        raise reader.error('Extra data')
+
+    if not found:
+        raise KeyError(key)
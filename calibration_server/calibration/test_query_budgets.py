@@ -0,0 +1,190 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from calibration import certificates, models, urls, views
+from calibration.fake_data import FakeDataGenerator, tablet_records
+from calibration.query_budget import (
+    QueryBudgetExceeded, QueryBudgetMiddleware, budget_for, query_budget)
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+@query_budget(1)
+def repeated_queries(request):
+    for name in ['a', 'b', 'c']:
+        models.Customer.objects.filter(name=name).exists()
+    return HttpResponse()
+
+
+@query_budget(1)
+def template_queries(request):
+    template = Template('{% for cus in customers %}'
+        '{{ cus.calibrationindex_set.count }}{% endfor %}')
+    return HttpResponse(template.render(Context({
+        'customers': models.Customer.objects.all()})))
+
+
+def run_middleware(view):
+    def get_response(request):
+        middleware.process_view(request, view, (), {})
+        return view(request)
+
+    middleware = QueryBudgetMiddleware(get_response)
+    return middleware(RequestFactory().get('/'))
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    @override_settings(QUERY_BUDGET_ENFORCE=True)
+    def test_duplicates_grouped_by_call_site(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            run_middleware(repeated_queries)
+        report = str(raised.exception)
+        self.assertIn('made 3 queries, its budget is 1', report)
+        self.assertIn('3 queries from calibration/test_query_budgets.py',
+            report)
+        self.assertIn('3x SELECT', report)
+
+    @override_settings(QUERY_BUDGET_ENFORCE=True)
+    def test_template_call_site(self):
+        models.Customer.objects.bulk_create([models.Customer(name=name) \
+            for name in ['a', 'b']])
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            run_middleware(template_queries)
+        self.assertIn('2x SELECT COUNT(*)', str(raised.exception))
+        self.assertIn('via <unknown source>:1', str(raised.exception))
+
+    @override_settings(QUERY_BUDGET_ENFORCE=False)
+    def test_not_enforced(self):
+        self.assertEqual(run_middleware(repeated_queries).status_code, 200)
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True, CACHES=LOCMEM_CACHE)
+class URLQueryBudgetTests(TestCase):
+    '''requests every url of the calibration app against generated data,
+    the middleware fails the request when a view goes over its budget'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.directories = override_settings(
+            CERTIFICATE_CACHE_DIR=cls.directory,
+            INGEST_JOB_DIR=cls.directory)
+        cls.directories.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.directories.disable()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        FakeDataGenerator(seed=1).run(3, 2, 4)
+        cls.customer = models.Customer.objects.first()
+        cls.standard = models.Standard.objects.first()
+        # a draft, an issued certificate and one issued before snapshots
+        # existed of each type
+        cls.calibrations = {}
+        for typ, model in [('balance', models.Balance),
+                           ('autoclave', models.Autoclave),
+                           ('generic', models.GenericCalibration)]:
+            draft, issued, unsnapshotted = model.objects.order_by('pk')[:3]
+            model.objects.filter(pk=draft.pk).update(certificate_number='')
+            for obj in [issued, unsnapshotted]:
+                obj.certificate_number = 'C-%s-%d' % (typ, obj.pk)
+                obj.save()
+            certificates.issue(issued)
+            cls.calibrations[typ] = [draft, issued, unsnapshotted]
+        cls.job = models.IngestJob.objects.create(kind='calibrations',
+            payload_path='')
+
+    def requests(self):
+        '''(name, kwargs, query or post body) for every url, uploads are
+        posted. The certificates are requested in every state.'''
+        upload = json.dumps({'calibrations': tablet_records(3,
+            [self.customer.name], self.standard.name)})
+        requests = [
+            ('dashboard', {}, {}),
+            ('create-customer', {}, {}),
+            ('create-profile', {}, {}),
+            ('reset-profile', {}, {}),
+            ('change-password', {}, {}),
+            ('customer-list', {}, {}),
+            ('update-customer', {'pk': self.customer.pk}, {}),
+            ('customer-details', {'pk': self.customer.pk}, {}),
+            ('create-standard', {}, {}),
+            ('standard-list', {}, {}),
+            ('update-standard', {'pk': self.standard.pk}, {}),
+            ('standard-details', {'pk': self.standard.pk}, {}),
+            ('calibration-list', {}, {}),
+            ('all-calibrations', {}, {'q': 'balance'}),
+            ('balance-calibration-list', {}, {}),
+            # selects no certificates, the zip is not read
+            ('export-certificates', {}, {'customer': self.customer.pk,
+                'start': '2100-01-01'}),
+            ('autoclave-calibration-list', {}, {}),
+            ('upload', {}, {}),
+            ('upload-standards', {}, json.dumps({'standards': []})),
+            ('upload-calibrations', {}, upload),
+            ('upload-status', {'job_id': self.job.pk}, {}),
+            ('search', {}, {'q': 'balance'}),
+            ('metrics', {}, {}),
+        ]
+        for typ, detail, pdf in [
+                ('balance', 'balance-calibration-detail', 'balance-pdf'),
+                ('autoclave', 'autoclave-calibration-detail',
+                    'autoclave-pdf'),
+                ('generic', 'calibration-detail', 'generic-pdf')]:
+            for obj in self.calibrations[typ]:
+                requests += [
+                    (detail, {'pk': obj.pk}, {}),
+                    (pdf, {'pk': obj.pk}, {}),
+                    ('generate-certificate', {'type': typ, 'pk': obj.pk},
+                        {}),
+                ]
+        return requests
+
+    def test_every_url_is_requested(self):
+        names = set(pattern.name for pattern in urls.urlpatterns)
+        self.assertEqual(names, set(name for name, _, _ in self.requests()))
+
+    def test_every_view_has_a_budget(self):
+        for pattern in urls.urlpatterns:
+            with self.subTest(pattern.name):
+                self.assertIsNotNone(budget_for(pattern.callback))
+
+    def test_budgets(self):
+        for name, kwargs, data in self.requests():
+            url = reverse('calibration:%s' % name, kwargs=kwargs)
+            with self.subTest(url):
+                if isinstance(data, str):
+                    response = self.client.post(url, data,
+                        content_type='application/json')
+                else:
+                    response = self.client.get(url, data)
+                self.assertLess(response.status_code, 400)
+
+    def test_call_sites_through_every_middleware(self):
+        draft = self.calibrations['generic'][0]
+        url = reverse('calibration:calibration-detail',
+            kwargs={'pk': draft.pk})
+        with mock.patch.object(views.GenericDetailView, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                self.client.get(url)
+        report = str(raised.exception)
+        # the readings are prefetched by the view itself
+        self.assertIn('2 queries from calibration/views.py', report)
+        self.assertNotIn('metrics.py', report)
+        self.assertNotIn('profiling.py', report)
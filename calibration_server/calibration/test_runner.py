@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class CalibrationTestRunner(DiscoverRunner):
+    '''runs the tests against a local memory cache, with the certificate
+    cache and the ingest jobs in a temporary directory, so a test run
+    leaves nothing behind in the checkout'''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directory = tempfile.mkdtemp()
+        self.overrides = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }},
+            CERTIFICATE_CACHE_DIR=os.path.join(self.directory,
+                'certificate_cache'),
+            INGEST_JOB_DIR=os.path.join(self.directory, 'ingest_jobs'),
+            METRICS_DIR=None)
+        self.overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.overrides.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1117 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import Http404, HttpResponse, QueryDict
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings)
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+
+from calibration import (
+    calibration_index, certificates, export, fake_data, jobs, metrics,
+    models, pdf_cache, profiling, search, streaming, uncertainty)
+from calibration.balance_stats import BalanceStats
+from calibration.dashboard import dashboard_stats
+from calibration.export import (
+    SelectionError, export_headings, select_certificates, stream_csv)
+from calibration.ingest import CalibrationIngest, StandardIngest
+from calibration.pagination import KeysetPaginator
+from calibration.standard_index import StandardLineIndex, line_version
+
+# results of the uncertainty properties before they were moved to
+# calibration.uncertainty, for the readings created in UncertaintyModelTests
+GENERIC_UNCERTAINTY = 0.37802116342871206
+AUTOCLAVE_PRESSURE_UNCERTAINTY = 0.9802606493616658
+AUTOCLAVE_TEMPERATURE_UNCERTAINTY = 0.5099019513592896
+BALANCE_UNCERTAINTY = 0.0054
+
+GENERIC_READINGS = [(0, 0.02), (25, 25.1), (50, 49.85), (75, 75.3),
+    (100, 99.9)]
+GENERIC_ERRORS = [abs(inp - measured) for inp, measured in GENERIC_READINGS]
+
+
+class UncertaintyTests(SimpleTestCase):
+    def test_combined_uncertainty(self):
+        self.assertAlmostEqual(
+            uncertainty.combined_uncertainty(0.1, GENERIC_ERRORS),
+            GENERIC_UNCERTAINTY, places=12)
+
+    def test_combined_uncertainty_without_errors(self):
+        self.assertEqual(uncertainty.combined_uncertainty(0.1, []), 0.1)
+
+    def test_expanded_uncertainty(self):
+        self.assertEqual(uncertainty.expanded_uncertainty(0.25), 0.5)
+        self.assertEqual(uncertainty.expanded_uncertainty(0.25, k=3), 0.75)
+
+    def test_balance_uncertainty(self):
+        self.assertEqual(uncertainty.balance_uncertainty(
+            [0.00003, 0.00004, 0.00006, 0.0001], 0.001, 0.0025,
+            0.0015811388300849985, 0.0015811388300827516),
+            BALANCE_UNCERTAINTY)
+
+    def test_pure_python_path(self):
+        np = uncertainty.np
+        uncertainty.np = None
+        try:
+            self.assertEqual(
+                uncertainty.combined_uncertainty(0.1, GENERIC_ERRORS),
+                GENERIC_UNCERTAINTY)
+            self.assertEqual(uncertainty.combined_uncertainty(0.5, []), 0.5)
+        finally:
+            uncertainty.np = np
+
+
+class UncertaintyModelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        date = datetime.date(2020, 1, 1)
+        std = models.Standard.objects.create(name='Mass set',
+            certificate='C1', serial='S1', traceability='t')
+        for nom, act, unc in [(10, 10.0001, 0.00003),
+                              (20, 20.0002, 0.00004),
+                              (50, 50.0003, 0.00006),
+                              (100, 100.0005, 0.0001)]:
+            models.StandardLine.objects.create(standard=std, nominal=nom,
+                actual=act, uncertainty=unc)
+
+        cls.generic = models.GenericCalibration.objects.create(date=date,
+            resolution=0.1, type='temperature', standard=std)
+        for inp, measured in GENERIC_READINGS:
+            models.GenericCalibrationLine.objects.create(
+                calibration=cls.generic, input_signal=inp, measured=measured)
+
+        cls.autoclave = models.Autoclave.objects.create(date=date,
+            resolution=0.05, units='bar', standard=std, range_temp_lower=0,
+            range_temp_upper=150, resolution_temp=0.1, temp_standard=std,
+            temp_unit='C')
+        for mass, measured in [(1000, 1.4), (2000, 2.9), (3000, 4.5),
+                               (4000, 6.0)]:
+            models.AutoclavePressureCalibrationLine.objects.create(
+                calibration=cls.autoclave, applied_mass=mass,
+                measured=measured)
+        for inp, measured in [(121, 121.4), (134, 133.7)]:
+            models.AutoclaveTemperatureCalibrationLine.objects.create(
+                calibration=cls.autoclave, input_signal=inp,
+                measured=measured)
+
+        cls.balance = models.Balance.objects.create(date=date,
+            resolution=0.001, units='g', standard=std)
+        for measurement in [100.003, 100.001, 100.004, 100.002, 100.003]:
+            models.BalanceColdStart.objects.create(calibration=cls.balance,
+                measurement=measurement, nominal=100)
+        for half, full in [(50.001, 100.002), (50.0, 99.999),
+                           (49.998, 100.001), (50.002, 100.0),
+                           (49.999, 99.998)]:
+            models.BalanceRepeatability.objects.create(
+                calibration=cls.balance, half_load=half, full_load=full)
+
+    def test_generic_uncertainty(self):
+        self.assertAlmostEqual(self.generic.uncertainty,
+            GENERIC_UNCERTAINTY, places=12)
+
+    def test_autoclave_uncertainty(self):
+        autoclave = models.Autoclave.objects.get(pk=self.autoclave.pk)
+        self.assertAlmostEqual(autoclave.uncertainty_pressure,
+            AUTOCLAVE_PRESSURE_UNCERTAINTY, places=12)
+        self.assertAlmostEqual(autoclave.uncertainty_temp,
+            AUTOCLAVE_TEMPERATURE_UNCERTAINTY, places=12)
+
+    def test_balance_uncertainty(self):
+        balance = models.Balance.objects.with_readings().get(
+            pk=self.balance.pk)
+        self.assertEqual(balance.uncertainty, BALANCE_UNCERTAINTY)
+
+
+class FakeDataTests(TestCase):
+    def generate(self):
+        fake_data.FakeDataGenerator(seed=1, chunk_size=7).run(5, 2, 10)
+        return list(models.GenericCalibration.objects.order_by('pk') \
+            .values_list('type', 'serial', 'customer_id', 'date'))
+
+    def test_readings(self):
+        self.generate()
+        self.assertEqual(models.Customer.objects.count(), 5)
+        self.assertEqual(models.Standard.objects.count(), 2)
+        for model in [models.Balance, models.Autoclave,
+                models.GenericCalibration]:
+            self.assertEqual(model.objects.count(), 10)
+        for model, count in list(fake_data.BALANCE_READINGS.items()) + \
+                list(fake_data.AUTOCLAVE_READINGS.items()):
+            self.assertEqual(model.objects.count(), count * 10)
+        self.assertEqual(models.GenericCalibrationLine.objects.count() + \
+            models.PressureCalibrationLine.objects.count(),
+            fake_data.GENERIC_READINGS * 10)
+        self.assertEqual(models.CalibrationIndex.objects.count(), 30)
+
+    def test_deterministic(self):
+        first = self.generate()
+        for model in [models.GenericCalibration, models.Balance,
+                models.Autoclave, models.Standard, models.Customer]:
+            model.objects.all().delete()
+        self.assertEqual(self.generate(), first)
+
+
+def customer_count(request):
+    return HttpResponse(str(models.Customer.objects.count()))
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILER_DIR=directory.name,
+            PROFILER_TOKEN='secret', PROFILER_KEEP=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.middleware = profiling.ProfilerMiddleware(customer_count)
+
+    def test_disabled_without_directory(self):
+        with override_settings(PROFILER_DIR=None):
+            with self.assertRaises(MiddlewareNotUsed):
+                profiling.ProfilerMiddleware(customer_count)
+
+    def test_not_profiled(self):
+        for request in [RequestFactory().get('/'),
+                RequestFactory().get('/', {'profile': 'wrong'})]:
+            self.assertNotIn('X-Profile-Id', self.middleware(request))
+        self.assertEqual(profiling.recent_profiles(), [])
+
+    def test_profiled(self):
+        response = self.middleware(RequestFactory().get('/customers',
+            HTTP_X_PROFILE='secret'))
+        summary, = profiling.recent_profiles()
+        self.assertEqual(summary['id'], response['X-Profile-Id'])
+        self.assertEqual(summary['path'], '/customers')
+        self.assertEqual(summary['queries'], 1)
+        self.assertIn('COUNT(*)', summary['slowest_queries'][0]['sql'])
+        self.assertIn('calibration/tests.py',
+            summary['slowest_queries'][0]['site'])
+        self.assertIn('database', summary['areas'])
+
+        out = io.StringIO()
+        call_command('profiles', 'latest', stdout=out)
+        self.assertIn('GET /customers -> 200', out.getvalue())
+        self.assertIn('customer_count', out.getvalue())
+
+    def test_keeps_recent(self):
+        ids = [self.middleware(RequestFactory().get('/', {
+            'profile': 'secret', 'page': 2}))['X-Profile-Id'] \
+            for _ in range(3)]
+        self.assertEqual(profiling.recent_profiles(1)[0]['path'], '/?page=2')
+        self.assertEqual([s['id'] for s in profiling.recent_profiles()],
+            ids[:0:-1])
+        out = io.StringIO()
+        call_command('profiles', stdout=out)
+        self.assertIn(ids[2], out.getvalue())
+        self.assertNotIn(ids[0], out.getvalue())
+
+
+def named_view(request):
+    request.resolver_match = ResolverMatch(named_view, (), {},
+        url_name='named', namespaces=['calibration'])
+    models.Customer.objects.exists()
+    return HttpResponse()
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.registry = metrics.Registry()
+        self.requests = self.registry.register(metrics.Counter(
+            'test_requests_total', 'Requests', ['view']))
+        self.seconds = self.registry.register(metrics.Histogram(
+            'test_seconds', 'Seconds', ['view'], buckets=(0.1, 1)))
+
+    def test_exposition(self):
+        self.requests.inc(view='a')
+        self.requests.inc(2, view='a "b"')
+        for seconds in [0.05, 0.5, 5]:
+            self.seconds.observe(seconds, view='a')
+        lines = self.registry.exposition().splitlines()
+        for line in ['# TYPE test_requests_total counter',
+                'test_requests_total{view="a"} 1',
+                'test_requests_total{view="a \\"b\\""} 2',
+                '# TYPE test_seconds histogram',
+                'test_seconds_bucket{view="a",le="0.1"} 1',
+                'test_seconds_bucket{view="a",le="1"} 2',
+                'test_seconds_bucket{view="a",le="+Inf"} 3',
+                'test_seconds_sum{view="a"} 5.55',
+                'test_seconds_count{view="a"} 3']:
+            self.assertIn(line, lines)
+
+    def copy_flushed(self, *names):
+        worker, = [name for name in os.listdir(self.directory) \
+            if name.startswith('%d-' % os.getpid())]
+        for name in names:
+            shutil.copy(os.path.join(self.directory, worker),
+                os.path.join(self.directory, name))
+
+    def test_workers_add_up(self):
+        self.requests.inc(view='a')
+        self.seconds.observe(0.5, view='a')
+        self.registry.flush(force=True)
+        # a running worker that has written the same values
+        self.copy_flushed('%d-%d.json' % (os.getppid(), time.time()))
+
+        lines = self.registry.exposition().splitlines()
+        self.assertIn('test_requests_total{view="a"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="1"} 2', lines)
+
+    def test_exited_workers_are_kept(self):
+        self.requests.inc(view='a')
+        self.seconds.observe(0.5, view='a')
+        self.registry.flush(force=True)
+        # a worker that has exited, and a file whose pid now belongs to a
+        # process started after it was written
+        self.copy_flushed('999999999-1.json', '%d-1.json' % os.getppid())
+
+        for _ in range(2):
+            lines = self.registry.exposition().splitlines()
+            self.assertIn('test_requests_total{view="a"} 3', lines)
+            self.assertIn('test_seconds_bucket{view="a",le="1"} 3', lines)
+            self.assertIn('test_seconds_sum{view="a"} 1.5', lines)
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) \
+            if name.endswith('.json')), sorted([metrics.EXITED_FILE,
+                self.registry.filename()]))
+
+        # the totals only grow as later workers exit
+        self.requests.inc(view='a')
+        self.registry.flush(force=True)
+        self.copy_flushed('999999998-1.json')
+        self.assertIn('test_requests_total{view="a"} 6',
+            self.registry.exposition().splitlines())
+
+    def test_middleware(self):
+        key = ('calibration:named', 'GET', '200')
+        before = metrics.REQUESTS.values.get(key, 0)
+        metrics.MetricsMiddleware(named_view)(RequestFactory().get('/'))
+        self.assertEqual(metrics.REQUESTS.values[key], before + 1)
+        self.assertIn('calibration_request_queries_bucket{'
+            'view="calibration:named",le="1"}', metrics.registry.exposition())
+
+
+class JobRecoveryTests(TestCase):
+    def stale_job(self, errors='', heartbeat=None):
+        payload = tempfile.NamedTemporaryFile(delete=False)
+        payload.close()
+        self.addCleanup(lambda: os.path.exists(payload.name) and \
+            os.remove(payload.name))
+        return models.IngestJob.objects.create(kind='calibrations',
+            payload_path=payload.name, status='running', errors=errors,
+            started=timezone.now() - datetime.timedelta(hours=2),
+            heartbeat=heartbeat)
+
+    def test_stale_job_is_claimed_again(self):
+        job = self.stale_job()
+        models.IngestJob.objects.create(kind='calibrations', status='running',
+            payload_path='', started=timezone.now())
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, 'running')
+        self.assertIn('WorkerStopped', claimed.errors)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_failed_after_repeated_stops(self):
+        job = self.stale_job(errors='WorkerStopped: a\nWorkerStopped: b\n')
+        self.assertEqual(jobs.recover_stale_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(os.path.exists(job.payload_path))
+
+    def test_job_making_progress_is_left_running(self):
+        job = self.stale_job(heartbeat=timezone.now())
+        self.assertEqual(jobs.recover_stale_jobs(), (0, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_stale_heartbeat(self):
+        heartbeat = timezone.now() - datetime.timedelta(hours=1, minutes=1)
+        job = self.stale_job(heartbeat=heartbeat)
+        self.assertEqual(jobs.recover_stale_jobs(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIsNone(job.heartbeat)
+        self.assertIn('no progress since %s' % heartbeat.isoformat(),
+            job.errors)
+
+    def test_progress_saves_heartbeat(self):
+        models.Standard.objects.create(name='Mass set')
+        jobs.enqueue('calibrations', io.BytesIO(json.dumps({
+            'calibrations': fake_data.tablet_records(3, ['Acme'],
+                'Mass set')}).encode('utf-8')))
+        job = jobs.claim_next_job()
+        claimed = job.heartbeat
+        self.assertEqual(claimed, job.started)
+        job = jobs.run_job(job)
+        self.assertEqual(job.status, 'done')
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat, claimed)
+
+
+def uploaded_standard(name, lines):
+    return {'name': name, 'certificate': 'C-%s' % name, 'serial': name,
+        'traceability': 'NMI', 'data': [{'nominal': nominal,
+        'actual': nominal + 0.001, 'uncertainty': 0.002} \
+            for nominal in lines]}
+
+
+class StandardIngestTests(TransactionTestCase):
+    def test_upload_invalidates_dashboard(self):
+        models.Standard.objects.create(name='first')
+        self.assertEqual(dashboard_stats()['standard_count'], 1)
+        StandardIngest().run([uploaded_standard('second', [1, 2])])
+        self.assertEqual(dashboard_stats()['standard_count'], 2)
+
+    def stored(self, name):
+        return dict((line.nominal, line) for line in \
+            models.StandardLine.objects.filter(standard__name=name))
+
+    def test_new_standards(self):
+        summary = StandardIngest().run([uploaded_standard('mass', [1, 2]),
+            uploaded_standard('weights', [5])])
+        self.assertEqual(summary, {'standards': 2, 'created': 2,
+            'updated': 0, 'unchanged': 0, 'lines_created': 3,
+            'lines_updated': 0, 'lines_deleted': 0, 'rows': 5})
+        standard = models.Standard.objects.get(name='mass')
+        self.assertEqual(standard.certificate, 'C-mass')
+        self.assertEqual(self.stored('mass')[2].actual, 2.001)
+
+    def test_lines_diffed_by_nominal(self):
+        StandardIngest().run([uploaded_standard('mass', [1, 2, 5])])
+        before = self.stored('mass')
+        upload = uploaded_standard('mass', [1, 2, 10])
+        upload['serial'] = 'S-2'
+        upload['data'][0]['actual'] = 1.005
+
+        summary = StandardIngest().run([upload])
+        self.assertEqual(summary, {'standards': 1, 'created': 0,
+            'updated': 1, 'unchanged': 0, 'lines_created': 1,
+            'lines_updated': 1, 'lines_deleted': 1, 'rows': 4})
+        self.assertEqual(models.Standard.objects.get(name='mass').serial,
+            'S-2')
+        after = self.stored('mass')
+        self.assertEqual(sorted(after), [1, 2, 10])
+        self.assertEqual(after[1].actual, 1.005)
+        # matched lines are updated in place
+        self.assertEqual(after[1].pk, before[1].pk)
+        self.assertEqual(after[2].pk, before[2].pk)
+
+        summary = StandardIngest().run([upload])
+        self.assertEqual(summary['unchanged'], 1)
+        self.assertEqual(summary['rows'], 0)
+
+    def test_last_copy_wins(self):
+        summary = StandardIngest().run([uploaded_standard('mass', [1]),
+            uploaded_standard('mass', [2, 5])])
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(sorted(self.stored('mass')), [2, 5])
+
+    def test_line_index_version_bumped(self):
+        StandardIngest().run([uploaded_standard('mass', [1, 2])])
+        standard = models.Standard.objects.get(name='mass')
+        version = line_version(standard.pk)
+        StandardIngest().run([uploaded_standard('mass', [1, 2, 5])])
+        self.assertNotEqual(line_version(standard.pk), version)
+
+
+class SelectCertificatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.FakeDataGenerator(seed=1).run(2, 1, 6)
+        cls.issued = models.Balance.objects.exclude(certificate_number='') \
+            .order_by('pk').first()
+        cls.draft = models.Balance.objects.filter(certificate_number='') \
+            .order_by('pk').first()
+
+    def test_ids_skip_drafts(self):
+        self.assertEqual(select_certificates(ids=['balance:%d' % \
+            self.issued.pk, 'balance:%d' % self.draft.pk]), [('balance',
+                self.issued.pk, self.issued.certificate_number)])
+
+    def test_customer_skips_drafts(self):
+        selected = select_certificates(customer=self.draft.customer_id)
+        self.assertNotIn(self.draft.pk, [pk for typ, pk, _ in selected \
+            if typ == 'balance'])
+        self.assertTrue(all(number for _, _, number in selected))
+
+    def test_bad_selection(self):
+        for kwargs in [{'ids': ['balance']}, {'ids': ['oven:1']},
+                {'ids': ['balance:x']}, {'customer': 'x'},
+                {'start': '2020-13-01'}, {'end': 'yesterday'}]:
+            with self.subTest(**kwargs):
+                with self.assertRaises(SelectionError):
+                    select_certificates(**kwargs)
+
+    def test_view_rejects_bad_selection(self):
+        url = reverse('calibration:export-certificates')
+        for query in [{}, {'start': '2020-01-01'}, {'ids': 'oven:1'},
+                {'customer': 'x'}, {'start': 'x', 'end': '2020-01-01'}]:
+            with self.subTest(**query):
+                self.assertEqual(self.client.get(url, query).status_code,
+                    400)
+
+
+class CalibrationStatusTests(TestCase):
+    def test_database_status_matches_property(self):
+        fake_data.FakeDataGenerator(seed=1).run(2, 1, 8)
+        today = datetime.date.today()
+        dues = [None, today - datetime.timedelta(days=1), today,
+            today + datetime.timedelta(days=1)]
+        for i, gc in enumerate(models.GenericCalibration.objects.order_by(
+                'pk')):
+            models.GenericCalibration.objects.filter(pk=gc.pk).update(
+                due=dues[i % len(dues)],
+                certificate_timestamp=timezone.now() if i >= len(dues) \
+                    else None)
+
+        expected = dict((gc.pk, gc.status) for gc in \
+            models.GenericCalibration.objects.all())
+        self.assertEqual(set(expected.values()), set(
+            status for status, _ in models.STATUS_CHOICES))
+        self.assertEqual(dict((gc.pk, gc.status) for gc in \
+            models.GenericCalibration.objects.with_status()), expected)
+        for status, _ in models.STATUS_CHOICES:
+            self.assertEqual(set(models.GenericCalibration.objects \
+                .filter_status(status).values_list('pk', flat=True)),
+                set(pk for pk in expected if expected[pk] == status))
+
+
+def balance_count(stats):
+    return [typ['count'] for typ in stats['types'] \
+        if typ['name'] == 'Balance'][0]
+
+
+class CalibrationIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake_data.FakeDataGenerator(seed=1).run(2, 1, 3)
+
+    def index_row(self, obj):
+        return models.CalibrationIndex.objects.get(calibration_type='generic',
+            calibration_id=obj.pk)
+
+    def test_synced_on_save(self):
+        gc = models.GenericCalibration.objects.first()
+        gc.serial = 'RENAMED-42'
+        gc.certificate_number = ''
+        gc.save()
+        row = self.index_row(gc)
+        self.assertEqual(row.serial, 'RENAMED-42')
+        self.assertEqual(row.certificate_number, '')
+        self.assertEqual([cal.calibration_id for cal in \
+            search.search('RENAMED-42')], [gc.pk])
+
+    def test_removed_on_delete(self):
+        gc = models.GenericCalibration.objects.first()
+        serial = gc.serial
+        gc.delete()
+        self.assertFalse(models.CalibrationIndex.objects.filter(
+            calibration_type='generic', calibration_id=gc.pk).exists())
+        self.assertNotIn(gc.pk, [cal.calibration_id for cal in \
+            search.search(serial, calibration_type='generic')])
+
+    def test_rebuild(self):
+        models.CalibrationIndex.objects.all().delete()
+        self.assertEqual(calibration_index.rebuild(), 9)
+        self.assertEqual(set(models.CalibrationIndex.objects.values_list(
+            'calibration_type', 'calibration_id', 'serial')), set(
+            ('balance', b.pk, b.serial) for b in models.Balance.objects.all()) \
+            | set(('autoclave', a.pk, a.serial) for a in \
+                models.Autoclave.objects.all()) \
+            | set(('generic', g.pk, g.serial) for g in \
+                models.GenericCalibration.objects.all()))
+
+
+class CalibrationIndexRebuildTests(TransactionTestCase):
+    def test_rebuild_invalidates_dashboard(self):
+        fake_data.FakeDataGenerator(seed=1).run(2, 1, 3)
+        self.assertEqual(balance_count(dashboard_stats()), 3)
+        # bulk_create sends no signals, only the rebuild indexes the copy
+        balance = models.Balance.objects.first()
+        balance.pk = None
+        models.Balance.objects.bulk_create([balance])
+        self.assertEqual(balance_count(dashboard_stats()), 3)
+        calibration_index.rebuild()
+        self.assertEqual(balance_count(dashboard_stats()), 4)
+
+
+class CalibrationIngestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        models.Standard.objects.create(name='Mass set')
+
+    def records(self, count, seed=0):
+        return fake_data.tablet_records(count, ['Acme', 'Globex'],
+            'Mass set', seed=seed)
+
+    def calibration_count(self):
+        return sum(model.objects.count() for model in [models.Balance,
+            models.Autoclave, models.GenericCalibration])
+
+    def test_writes_every_type(self):
+        summary = CalibrationIngest(batch_size=2).run(self.records(6))
+        self.assertEqual(summary['calibrations'], 6)
+        self.assertEqual(summary['new'], 6)
+        self.assertEqual(models.Balance.objects.count(), 2)
+        self.assertEqual(models.Autoclave.objects.count(), 2)
+        self.assertEqual(models.GenericCalibration.objects.count(), 2)
+        self.assertEqual(models.BalanceColdStart.objects.count(), 10)
+
+    def test_failed_batch_is_rolled_back(self):
+        records = self.records(4)
+        del records[3]['date']
+        ingest = CalibrationIngest(batch_size=2)
+        with self.assertRaises(KeyError):
+            ingest.run(records)
+        # the first batch is committed, nothing of the second is kept
+        self.assertEqual(ingest.calibrations, 2)
+        self.assertEqual(self.calibration_count(), 2)
+        self.assertEqual(models.UploadFingerprint.objects.count(), 2)
+
+    def test_repeated_upload_is_skipped(self):
+        CalibrationIngest(batch_size=2).run(self.records(5))
+        summary = CalibrationIngest(batch_size=2).run(self.records(5))
+        self.assertEqual(summary['duplicates'], 5)
+        self.assertEqual(summary['new'], 0)
+        self.assertEqual(summary['rows'], 0)
+        self.assertTrue(summary['duplicate_batch'])
+        self.assertEqual(self.calibration_count(), 5)
+
+    def test_overlapping_upload(self):
+        CalibrationIngest().run(self.records(3))
+        summary = CalibrationIngest().run(self.records(5))
+        self.assertEqual(summary['duplicates'], 3)
+        self.assertEqual(summary['new'], 2)
+        self.assertFalse(summary['duplicate_batch'])
+        self.assertEqual(self.calibration_count(), 5)
+
+    def test_record_repeated_within_upload(self):
+        records = self.records(3)
+        summary = CalibrationIngest(batch_size=2).run(records + records[:1])
+        self.assertEqual(summary['duplicates'], 1)
+        self.assertEqual(self.calibration_count(), 3)
+
+
+class StreamingTests(SimpleTestCase):
+    document = {
+        'version': 2,
+        'standards': [{'name': 'Mass set', 'lines': [[1, 1.00002]]}],
+        'calibrations': [
+            {'customer': 'Ünïcode €', 'data': [[100, 99.99987], [1e-05, -3]]},
+            12345678.125,
+            'a "quoted" \\ string',
+            None,
+            [],
+        ],
+        'notes': {'calibrations': 'not this one'},
+    }
+
+    def parse(self, text, key='calibrations', chunk_size=1,
+            encoding='utf-8'):
+        return list(streaming.iter_json_array(
+            io.BytesIO(text.encode(encoding)), key, chunk_size))
+
+    def test_every_chunk_boundary(self):
+        text = json.dumps(self.document, ensure_ascii=False, indent=1)
+        for chunk_size in range(1, len(text.encode('utf-8')) + 2):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(text, chunk_size=chunk_size),
+                    self.document['calibrations'])
+
+    def test_utf16(self):
+        text = json.dumps(self.document, ensure_ascii=False)
+        for chunk_size in [1, 3, 7]:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(text, chunk_size=chunk_size,
+                    encoding='utf-16-le'), self.document['calibrations'])
+
+    def test_empty_array(self):
+        self.assertEqual(self.parse('{"calibrations": []}'), [])
+
+    def test_missing_key(self):
+        for text in ['{}', '{"calibrations": {}}', '{"standards": [1]}']:
+            with self.subTest(text=text):
+                with self.assertRaises(KeyError):
+                    self.parse(text)
+
+    def test_malformed(self):
+        for text in ['{"calibrations": [1 2]}', '{"calibrations": [1]} []',
+                '{"calibrations": [1]', '[]']:
+            with self.subTest(text=text):
+                with self.assertRaises(json.JSONDecodeError):
+                    self.parse(text)
+
+
+class PDFCacheTests(SimpleTestCase):
+    templates = ['calibration/balance_certificate.html']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CERTIFICATE_CACHE_DIR=directory.name,
+            CERTIFICATE_CACHE_MAX_SIZE=100)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.balance = models.Balance(pk=1, certificate_number='B/001',
+            serial='S1', resolution=0.01)
+
+    def test_hit(self):
+        path = pdf_cache.cache_path(self.balance, self.templates)
+        self.assertIsNone(pdf_cache.get(path))
+        pdf_cache.put(path, b'%PDF')
+        self.assertEqual(pdf_cache.get(path), path)
+        self.assertEqual(pdf_cache.get(pdf_cache.cache_path(self.balance,
+            self.templates)), path)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF')
+
+    def test_changes_invalidate(self):
+        path = pdf_cache.cache_path(self.balance, self.templates)
+        pdf_cache.put(path, b'%PDF')
+        self.balance.serial = 'S2'
+        self.assertNotEqual(pdf_cache.cache_path(self.balance,
+            self.templates), path)
+        self.balance.serial = 'S1'
+        self.assertNotEqual(pdf_cache.cache_path(self.balance,
+            self.templates + ['other.html']), path)
+        self.assertNotEqual(pdf_cache.cache_path(self.balance,
+            self.templates, {'logo': 'new'}), path)
+
+    def test_customer_changes_invalidate(self):
+        self.balance.customer = models.Customer(pk=1, name='Acme',
+            address='1 Road')
+        path = pdf_cache.cache_path(self.balance, self.templates)
+        self.balance.customer.address = '2 Road'
+        self.assertNotEqual(pdf_cache.cache_path(self.balance,
+            self.templates), path)
+
+    def test_drafts_are_not_cached(self):
+        self.assertTrue(pdf_cache.is_cacheable(self.balance))
+        self.assertFalse(pdf_cache.is_cacheable(models.Balance(pk=2)))
+
+    def test_least_recently_used_evicted(self):
+        paths = []
+        for i in range(3):
+            self.balance.pk = i + 1
+            paths.append(pdf_cache.cache_path(self.balance, self.templates))
+            pdf_cache.put(paths[-1], b'x' * 30)
+            os.utime(paths[-1], (1000 + i, 1000 + i))
+        first, second, third = paths
+
+        # reading the oldest makes the second the least recently used
+        pdf_cache.get(first)
+        self.assertEqual(pdf_cache.evict(60), 1)
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
+
+        # put keeps the cache under CERTIFICATE_CACHE_MAX_SIZE
+        self.balance.pk = 4
+        pdf_cache.put(pdf_cache.cache_path(self.balance, self.templates),
+            b'x' * 50)
+        self.assertFalse(os.path.exists(third))
+        self.assertEqual(len(pdf_cache.entries()), 2)
+
+
+class BalanceStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.standard = models.Standard.objects.create(name='Mass set',
+            certificate='C1', serial='S1', traceability='t')
+        for nom, act, unc in [(50, 50.0003, 0.00006),
+                              (100, 100.0005, 0.0001)]:
+            models.StandardLine.objects.create(standard=cls.standard,
+                nominal=nom, actual=act, uncertainty=unc)
+
+    def balance(self):
+        return models.Balance.objects.create(date=datetime.date(2020, 1, 1),
+            resolution=0.001, units='g', standard=self.standard)
+
+    def stats(self, balance):
+        return BalanceStats(models.Balance.objects.with_readings().get(
+            pk=balance.pk))
+
+    def test_no_readings(self):
+        stats = self.stats(self.balance())
+        for name in ['cold_nominal', 'cold_drift', 'corner_weight',
+                'max_corner_error', 'off_center_min', 'off_center_max',
+                'off_center_mean', 'off_center_min_error',
+                'off_center_stdev', 'repeat_half_average',
+                'repeat_full_average', 'repeat_half_stdev',
+                'repeat_full_stdev', 'repeat_nominal_half',
+                'repeat_nominal_full', 'settling_average']:
+            with self.subTest(name=name):
+                self.assertIsNone(getattr(stats, name))
+        self.assertEqual(stats.half_repeat, 0)
+        self.assertEqual(stats.full_repeat, 0)
+        self.assertEqual(stats.up_down_linearity, [])
+        self.assertGreater(stats.uncertainty, 0)
+
+    def test_single_reading(self):
+        balance = self.balance()
+        models.BalanceColdStart.objects.create(calibration=balance,
+            measurement=100.004, nominal=100)
+        models.BalanceSettlingTime.objects.create(calibration=balance,
+            measurement=100.002)
+        models.BalanceOffCenter.objects.create(calibration=balance,
+            measurement=50.003, mass_piece=50)
+        models.BalanceRepeatability.objects.create(calibration=balance,
+            half_load=50.001, full_load=100.002)
+        stats = self.stats(balance)
+
+        self.assertEqual(stats.cold_drift, 0.004)
+        self.assertEqual(stats.settling_average, 100.002)
+        self.assertAlmostEqual(stats.max_corner_error, 0.003)
+        self.assertEqual(stats.off_center_mean, 50.003)
+        self.assertIsNone(stats.off_center_stdev)
+        self.assertEqual(stats.half_repeat, 0)
+        self.assertEqual(stats.full_repeat, 0)
+        self.assertIsNone(stats.repeat_half_stdev)
+        self.assertEqual(stats.repeat_half_average, 50.001)
+        self.assertEqual(stats.repeat_nominal_half, 50)
+        self.assertEqual(stats.repeat_nominal_full, 100)
+
+
+class CertificateSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        std = models.Standard.objects.create(name='Thermometer',
+            certificate='C1', serial='S1', traceability='t')
+        models.StandardLine.objects.create(standard=std, nominal=100,
+            actual=100.01, uncertainty=0.02)
+        cls.generic = models.GenericCalibration.objects.create(
+            date=datetime.date(2020, 1, 1), resolution=0.1,
+            type='temperature', standard=std, certificate_number='G-1')
+        for inp, measured in GENERIC_READINGS:
+            models.GenericCalibrationLine.objects.create(
+                calibration=cls.generic, input_signal=inp, measured=measured)
+
+    def reload(self):
+        return models.GenericCalibration.objects.get(pk=self.generic.pk)
+
+    def test_issued_results_are_frozen(self):
+        issued = certificates.certificate_results(self.reload())
+        certificates.issue(self.reload())
+        models.GenericCalibrationLine.objects.filter(
+            calibration=self.generic).update(measured=0)
+        models.Standard.objects.update(name='Renamed')
+
+        generic = self.reload()
+        self.assertEqual(certificates.results_for(generic), issued)
+        self.assertNotEqual(certificates.certificate_results(generic),
+            issued)
+
+    def test_reissue_replaces_snapshot(self):
+        certificates.issue(self.reload())
+        models.GenericCalibrationLine.objects.filter(
+            calibration=self.generic).update(measured=0)
+        generic = self.reload()
+        generic.certificate_number = 'G-2'
+        # a number without a snapshot renders from the readings
+        self.assertEqual(certificates.results_for(generic),
+            certificates.certificate_results(generic))
+
+        certificates.issue(generic)
+        self.assertEqual(models.CertificateSnapshot.objects.count(), 1)
+        self.assertEqual(certificates.results_for(generic),
+            certificates.certificate_results(generic))
+
+    def test_issued_certificate_reads_snapshot_only(self):
+        url = reverse('calibration:calibration-detail',
+            kwargs={'pk': self.generic.pk})
+        certificates.issue(self.reload())
+        # the calibration with its customer and standard, and the snapshot
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.context['results'],
+            certificates.results_for(self.reload()))
+
+        models.CertificateSnapshot.objects.all().delete()
+        # without a snapshot both line tables are prefetched
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_drafts_use_readings(self):
+        generic = self.reload()
+        generic.certificate_number = ''
+        certificates.issue(self.reload())
+        models.GenericCalibrationLine.objects.filter(
+            calibration=self.generic).update(measured=0)
+        self.assertEqual(certificates.results_for(generic),
+            certificates.certificate_results(generic))
+
+
+class StandardLineIndexTests(SimpleTestCase):
+    def setUp(self):
+        # out of order, as the lines of a standard may be entered
+        self.lines = [models.StandardLine(nominal=nominal, actual=actual) \
+            for nominal, actual in [(50, 50.0), (10, 10.0), (100, 100.0),
+                                    (20, 20.0)]]
+        self.index = StandardLineIndex(self.lines)
+
+    def scan(self, value):
+        # the linear search the index replaced
+        return min(sorted(self.lines, key=lambda l: l.actual),
+            key=lambda l: abs(l.actual - value))
+
+    def test_nearest(self):
+        for value, nominal in [(-5, 10), (10, 10), (12, 10), (15, 10),
+                               (16, 20), (35, 20), (49, 50), (75, 50),
+                               (99.9, 100), (100, 100), (250, 100)]:
+            with self.subTest(value=value):
+                self.assertEqual(self.index.nearest(value).nominal, nominal)
+                self.assertIs(self.index.nearest(value), self.scan(value))
+
+    def test_nearest_many(self):
+        values = [0, 14.999, 15, 15.001, 60, 1000]
+        self.assertEqual(self.index.nearest_many(values),
+            [self.scan(value) for value in values])
+
+    def test_empty(self):
+        index = StandardLineIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.nearest(10))
+        self.assertEqual(index.nearest_many([1, 2]), [None, None])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # runs of equal dates, so pages break inside a date
+        for day in [3, 1, 3, 2, 3, 1, 3, 2]:
+            models.Balance.objects.create(date=datetime.date(2020, 1, day),
+                resolution=0.001)
+        cls.expected = list(models.Balance.objects.order_by('-date', '-id'))
+
+    def page(self, link='?'):
+        paginator = KeysetPaginator(models.Balance.objects.all(), 3,
+            ['-date', '-id'])
+        return paginator.page(QueryDict(link[1:]))
+
+    def test_next_and_previous(self):
+        pages = [self.page()]
+        self.assertFalse(pages[0].has_previous())
+        while pages[-1].has_next():
+            pages.append(self.page(pages[-1].next_link()))
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual([obj for page in pages for obj in page],
+            self.expected)
+
+        # and back again from the last page
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(self.page(back[-1].previous_link()))
+        self.assertEqual([list(page) for page in reversed(back)],
+            [list(page) for page in pages])
+        self.assertTrue(back[-1].has_next())
+
+    def test_links_keep_filters(self):
+        page = self.page('?customer=1')
+        self.assertEqual(QueryDict(page.next_link()[1:])['customer'], '1')
+
+    def test_invalid_cursor(self):
+        for link in ['?after=garbage', '?before=WyJ4Il0']:
+            with self.subTest(link=link):
+                with self.assertRaises(Http404):
+                    self.page(link)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        date = datetime.date(2020, 1, 1)
+        acme = models.Customer.objects.create(name='Acme Laboratories')
+        cls.thermometer = models.GenericCalibration.objects.create(
+            date=date, resolution=0.1, type='temperature', customer=acme,
+            serial='SN-778812', manufacturer='Fluke',
+            name_of_instrument='Thermometer')
+        cls.gauge = models.GenericCalibration.objects.create(date=date,
+            resolution=0.1, type='pressure', serial='PG-1002',
+            manufacturer='Wika', name_of_instrument='Pressure gauge')
+        cls.balance = models.Balance.objects.create(date=date,
+            resolution=0.001, customer=acme, serial='BAL-55',
+            manufacturer='Ohaus', name_of_instrument='Balance')
+
+    def found(self, text, calibration_type=None):
+        return set((row.calibration_type, row.calibration_id) for row in \
+            search.search(text, calibration_type))
+
+    def test_match_query(self):
+        self.assertEqual(search.match_query('flu SN-77 ab'),
+            '"flu"* "SN-77"*')
+        self.assertEqual(search.match_query('say "hi"'), '"say"* """hi"""*')
+        self.assertEqual(search.match_query('a bc'), '')
+
+    def test_prefix_and_substring(self):
+        thermometer = ('generic', self.thermometer.pk)
+        for text in ['Flu', 'fluke', 'SN-77', '7788', 'thermo', 'lab thermo']:
+            with self.subTest(text=text):
+                self.assertEqual(self.found(text), {thermometer})
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.found('acme'), {('generic',
+            self.thermometer.pk), ('balance', self.balance.pk)})
+        self.assertEqual(self.found('acme ohaus'), {('balance',
+            self.balance.pk)})
+        self.assertEqual(self.found('acme wika'), set())
+        self.assertEqual(self.found('acme', 'balance'), {('balance',
+            self.balance.pk)})
+
+    def test_short_terms(self):
+        # too short for the trigram index, they are dropped from the query
+        self.assertEqual(self.found('PG'), set())
+        self.assertEqual(self.found(''), set())
+        self.assertEqual(self.found('PG wika'), {('generic',
+            self.gauge.pk)})
+
+    def test_quotes(self):
+        self.assertEqual(self.found('"fluke'), set())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        date = datetime.date(2020, 1, 1)
+        gauge = models.GenericCalibration.objects.create(date=date,
+            resolution=0.01, type='pressure', serial='PG-1',
+            certificate_number='P-1')
+        models.GenericCalibrationLine.objects.create(calibration=gauge,
+            input_signal=4, measured=4.02)
+        for mass, measured in [(1000, 1.4), (2000, 2.9)]:
+            models.PressureCalibrationLine.objects.create(calibration=gauge,
+                applied_mass=mass, measured=measured)
+        models.GenericCalibration.objects.create(
+            date=datetime.date(2019, 1, 1), resolution=0.01,
+            type='pressure', serial='PG-2')
+
+    def rows(self, chunk_size):
+        text = ''.join(stream_csv(
+            models.GenericCalibration.objects.with_status(), chunk_size))
+        return list(csv.DictReader(io.StringIO(text)))
+
+    def test_row_per_reading(self):
+        for chunk_size in [1, 500]:
+            with self.subTest(chunk_size=chunk_size):
+                rows = self.rows(chunk_size)
+                self.assertEqual([(row['serial'], row['reading']) for row in \
+                    rows], [
+                    ('PG-1', 'generic calibration line'),
+                    ('PG-1', 'pressure calibration line'),
+                    ('PG-1', 'pressure calibration line'),
+                    ('PG-2', ''),
+                ])
+                self.assertEqual([row['applied_mass'] for row in rows],
+                    ['', '1000.0', '2000.0', ''])
+                self.assertEqual([row['measured'] for row in rows],
+                    ['4.02', '1.4', '2.9', ''])
+                self.assertEqual(rows[0]['input_signal'], '4.0')
+                self.assertEqual(rows[0]['certificate_number'], 'P-1')
+
+    def test_headings(self):
+        text = ''.join(stream_csv(
+            models.GenericCalibration.objects.with_status().none()))
+        self.assertEqual(next(csv.reader(io.StringIO(text))),
+            export_headings(models.GenericCalibration))
+        self.assertEqual(len(text.splitlines()), 1)
+
+
+class CertificatePDFTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.Customer.objects.create(name='Acme',
+            address='1 Road')
+        cls.generic = models.GenericCalibration.objects.create(
+            date=datetime.date(2020, 1, 1), resolution=0.1,
+            type='temperature', customer=cls.customer,
+            certificate_number='G-1')
+        for inp, measured in GENERIC_READINGS:
+            models.GenericCalibrationLine.objects.create(
+                calibration=cls.generic, input_signal=inp, measured=measured)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CERTIFICATE_CACHE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def download(self):
+        response = self.client.get(reverse('calibration:generic-pdf',
+            kwargs={'pk': self.generic.pk}))
+        self.assertEqual(response.status_code, 200)
+        return set(path for path, _, _ in pdf_cache.entries())
+
+    def test_cached_until_rendered_values_change(self):
+        certificates.issue(models.GenericCalibration.objects.get(
+            pk=self.generic.pk))
+        cached = self.download()
+        self.assertEqual(len(cached), 1)
+        self.assertEqual(self.download(), cached)
+
+        self.customer.address = '2 Road'
+        self.customer.save()
+        cached = self.download()
+        self.assertEqual(len(cached), 2)
+
+        # issued again with the same number after the readings changed
+        models.GenericCalibrationLine.objects.filter(
+            calibration=self.generic).update(measured=0)
+        certificates.issue(models.GenericCalibration.objects.get(
+            pk=self.generic.pk))
+        self.assertEqual(len(self.download()), 3)
+
+    def test_certificates_issued_before_snapshots(self):
+        cached = self.download()
+        self.assertEqual(len(cached), 1)
+        models.GenericCalibrationLine.objects.filter(
+            calibration=self.generic).update(measured=0)
+        self.assertEqual(len(self.download()), 2)
+
+
+def render_or_fail(typ, pk):
+    if pk == 2:
+        raise ValueError('no standard')
+    return ('%s %d' % (typ, pk)).encode('ascii')
+
+
+class CertificateZipTests(SimpleTestCase):
+    certificates = [('balance', 1, 'B-1'), ('generic', 2, 'G-2'),
+        ('autoclave', 3, '')]
+
+    def test_failures_are_listed(self):
+        # the pool is forked, so its workers render with the patch
+        with mock.patch.object(export, 'render_certificate', render_or_fail):
+            data = b''.join(export.stream_zip(self.certificates, workers=2))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(sorted(archive.namelist()), [
+                'autoclave-3-draft.pdf', 'balance-1-B-1.pdf', 'errors.txt'])
+            self.assertEqual(archive.read('balance-1-B-1.pdf'), b'balance 1')
+            self.assertEqual(archive.read('errors.txt'),
+                b'generic-2-G-2.pdf ValueError: no standard\n')
+
+    def test_every_certificate_rendered(self):
+        with mock.patch.object(export, 'render_certificate',
+                lambda typ, pk: b'pdf'):
+            rendered = list(export.render_all(self.certificates * 3,
+                workers=2))
+        self.assertEqual(sorted(cert for cert, _, _ in rendered),
+            sorted(self.certificates * 3))
+        self.assertEqual(set((pdf, error) for _, pdf, error in rendered),
+            {(b'pdf', None)})
@@ -0,0 +1,51 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the expanded uncertainty is reported at a 95% confidence level
+COVERAGE_FACTOR = 2
+
+
+def sum_of_squares(values):
+    if np is not None:
+        return float(np.sum(np.square(np.asarray(values, dtype=float))))
+    return sum(math.pow(i, 2) for i in values)
+
+
+def root_sum_of_squares(values):
+    return math.sqrt(sum_of_squares(values))
+
+
+def rectangular(half_width):
+    '''standard uncertainty of a value known only to lie within
+    +/- half_width'''
+    return half_width / math.sqrt(3)
+
+
+def combined_uncertainty(resolution, errors):
+    '''the square root of the square of the resolution plus the sum of the
+    squares of the measurement errors'''
+    return math.sqrt(math.pow(resolution, 2) + sum_of_squares(errors))
+
+
+def expanded_uncertainty(combined, k=COVERAGE_FACTOR):
+    return combined * k
+
+
+def balance_uncertainty(standard_uncertainties, resolution, drift,
+        half_repeat, full_repeat):
+    '''combines the uncertainty of the standards, the resolution, the cold
+    start drift and the repeatability of a balance'''
+    std_uncertainty = root_sum_of_squares(standard_uncertainties)
+    resolution_uncertainty = rectangular(resolution / 2)
+    drift_uncertainty = rectangular(drift or 0)
+    repeatability_uncertainty = root_sum_of_squares(
+        [half_repeat, full_repeat])
+
+    return round(expanded_uncertainty(root_sum_of_squares([std_uncertainty,
+        resolution_uncertainty,
+        drift_uncertainty,
+        repeatability_uncertainty])), 4)
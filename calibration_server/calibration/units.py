@@ -0,0 +1,54 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# grams of applied mass per psi on the dead weight tester and the pressure
+# it produces with no mass applied
+GRAMS_PER_PSI = 45.19
+PSI_OFFSET = 5.0150254481
+PSI_PER_BAR = 14.4038
+
+# converts a pressure in psi to each unit, written so the same expression
+# works on a float and on an array of floats
+PRESSURE_UNITS = {
+    'psi': lambda psi: psi,
+    'bar': lambda psi: psi / PSI_PER_BAR,
+    'kpa': lambda psi: psi / PSI_PER_BAR * 100,
+    'mpa': lambda psi: psi / PSI_PER_BAR / 10,
+    'pa': lambda psi: psi / PSI_PER_BAR / 100000,
+}
+
+
+def pressure_psi(applied_mass):
+    '''applied mass in grams'''
+    return (applied_mass / GRAMS_PER_PSI) + PSI_OFFSET
+
+
+def calculated_pressures(applied_masses, units):
+    '''converts every applied mass of a calibration to a pressure in its
+    units in one pass, unknown units give 0 as they always have'''
+    convert = PRESSURE_UNITS.get(units)
+    if np is not None:
+        masses = np.asarray(applied_masses, dtype=float)
+        if not convert:
+            return np.zeros(len(masses)).tolist()
+        return convert(pressure_psi(masses)).tolist()
+
+    if not convert:
+        return [0] * len(applied_masses)
+    return [convert(pressure_psi(mass)) for mass in applied_masses]
+
+
+def calculated_pressure(applied_mass, units):
+    return calculated_pressures([applied_mass], units)[0]
+
+
+def fill_pressures(lines, units):
+    '''sets calculated_pressure on pressure calibration lines that share
+    the units of their calibration'''
+    pressures = calculated_pressures([line.applied_mass for line in lines],
+        units)
+    for line, pressure in zip(lines, pressures):
+        line.calculated_pressure = pressure
+    return lines
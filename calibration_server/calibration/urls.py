@@ -29,6 +29,8 @@ urlpatterns = [
         name='standard-details'),
     path('calibration-list/', views.CalibrationListView.as_view(), 
         name='calibration-list'),
+    path('all-calibrations/', views.CalibrationIndexListView.as_view(), 
+        name='all-calibrations'),
     path('balance-calibration-list/', views.BalanceCalibrationListView.as_view(), 
         name='balance-calibration-list'),
     path('balance-calibration-detail/<int:pk>/', views.BalanceDetailView.as_view(), 
@@ -43,6 +45,8 @@ urlpatterns = [
         name='autoclave-calibration-detail'),
     path('calibration-detail/<int:pk>/', views.GenericDetailView.as_view(), 
         name='calibration-detail'),
+    path('export-certificates/', views.export_certificates, 
+        name='export-certificates'),
     path('generate-certificate/<str:type>/<int:pk>/', views.GenerateCertificateView.as_view(), 
         name='generate-certificate'),
     path('autoclave-calibration-list/', views.AutoclaveCalibrationListView.as_view(), 
@@ -53,4 +57,10 @@ urlpatterns = [
         name='upload-standards'),
     path('upload-calibrations/', views.upload_calibrations, 
         name='upload-calibrations'),
+    path('upload-status/<int:job_id>/', views.upload_status, 
+        name='upload-status'),
+    path('search/', views.search_calibrations, 
+        name='search'),
+    path('metrics/', views.metrics_view, 
+        name='metrics'),
 ]
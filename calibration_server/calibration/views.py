@@ -1,4 +1,4 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.views.generic import (
     TemplateView,
     CreateView,
@@ -11,6 +11,14 @@ from django.urls import reverse_lazy as reverse
 from django_filters.views import FilterView
 import os 
 from calibration import forms, models, filters
+from calibration import certificates, jobs, metrics, pdf_cache, search
+from calibration.balance_stats import BALANCE_READINGS
+from calibration.dashboard import dashboard_stats
+from calibration.export import (
+    SelectionError, select_certificates, stream_zip, stream_csv, xlsx_file,
+    xlsxwriter)
+from calibration.pagination import KeysetPaginationMixin
+from calibration.query_budget import query_budget
 import socket 
 from django.http import JsonResponse
 import json
@@ -20,7 +28,11 @@ from django.contrib.auth.models import User
 
 from django_weasyprint import WeasyTemplateResponseMixin
 from calibration_server import settings
-from django.http import HttpResponse
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, FileResponse, StreamingHttpResponse,
+    Http404)
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import prefetch_related_objects
 from django.template import Context
 from django.template.loader import get_template
 
@@ -36,6 +48,7 @@ class ContextMixin(object):
 
 class ProfileCreateView(ContextMixin, FormView):
     template_name = os.path.join('calibration', 'create_template.html')
+    query_budget = 5
     form_class = forms.ProfileCreateForm
     context = {
         'title': 'Create Profile'
@@ -59,6 +72,7 @@ class ProfileCreateView(ContextMixin, FormView):
 
 class PasswordResetView(FormView):
     template_name = os.path.join('calibration', 'create_template.html')
+    query_budget = 5
     form_class = forms.ProfilePasswordResetForm
     context = {
         'title': 'Reset Profile Password'
@@ -75,6 +89,7 @@ class PasswordResetView(FormView):
 
 class PasswordChangeView(ContextMixin, FormView):
     template_name = os.path.join('calibration', 'create_template.html')
+    query_budget = 5
     form_class = forms.ProfilePasswordChangeForm
     context = {
         'title': 'Change Profile Password'
@@ -96,50 +111,16 @@ DELETE_TEMPLATE = os.path.join('calibration', 'delete_template.html')
 
 class DashboardView(TemplateView):
     template_name = os.path.join('calibration', 'dashboard.html')
+    query_budget = 3
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['customers'] = models.Customer.objects.all()
-        context['standards'] = models.Standard.objects.all()
-        outstanding_balances = models.Balance.objects.filter(certificate_number="").count()
-        outstanding_autoclaves = models.Autoclave.objects.filter(certificate_number="").count()
-        outstanding_generic = models.GenericCalibration.objects.filter(certificate_number="").count()
-        context['outstanding'] = outstanding_autoclaves + outstanding_balances + outstanding_generic
-        types = []
-        types.append({'name': 'Balance', 'count': models.Balance.objects.all().count()})
-        types.append({'name': 'Autoclave', 'count': models.Autoclave.objects.all().count()})
-        types.append({
-            'name': 'Temperature', 
-            'count': models.GenericCalibration.objects.filter(type='temperature').count()
-            })
-        types.append({
-            'name': 'Pressure', 
-            'count': models.GenericCalibration.objects.filter(type='pressure').count()
-            })
-        types.append({
-            'name': 'Current', 
-            'count': models.GenericCalibration.objects.filter(type='current').count()
-            })
-        types.append({
-            'name': 'Flow', 
-            'count': models.GenericCalibration.objects.filter(type='flow').count()
-            })
-        types.append({
-            'name': 'Voltage', 
-            'count': models.GenericCalibration.objects.filter(type='voltage').count()
-            })
-        types.append({
-            'name': 'PH', 
-            'count': models.GenericCalibration.objects.filter(type='ph').count()
-            })
-        types.append({
-            'name': 'Conductivity', 
-            'count': models.GenericCalibration.objects.filter(type='conductivity').count()
-            })
-        context['types'] = types
+        context.update(dashboard_stats())
         return context
+
 class CustomerCreateView(ContextMixin, CreateView):
     template_name = CREATE_TEMPLATE
+    query_budget = 5
     form_class = forms.CustomerForm
     context = {
         'title': 'Create New Customer'
@@ -147,17 +128,20 @@ class CustomerCreateView(ContextMixin, CreateView):
 
 class CustomerUpdateView(ContextMixin, UpdateView):
     template_name = CREATE_TEMPLATE
+    query_budget = 5
     form_class = forms.CustomerForm
     model = models.Customer
     context = {
         'title': 'Edit Customer'
     }
 
-class CustomerListView(ContextMixin, FilterView):
+class CustomerListView(KeysetPaginationMixin, ContextMixin, FilterView):
     filterset_class = filters.CustomerFilter
     template_name = os.path.join('calibration', 'customer', 'list.html')
-    queryset = models.Customer.objects.all()
+    query_budget = 1
+    queryset = models.Customer.objects.only('name', 'phone', 'email')
     paginate_by = 10
+    keyset_ordering = ('name', 'id')
     context = {
         'title': 'Customer List',
         'new_link': reverse('calibration:create-customer')
@@ -166,7 +150,14 @@ class CustomerListView(ContextMixin, FilterView):
 
 class CustomerDetailView(DetailView):
     template_name = os.path.join('calibration', 'customer', 'details.html')
-    model = models.Customer
+    query_budget = 2
+    queryset = models.Customer.objects.with_stats()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['calibrations'] = models.CalibrationIndex.objects.filter(
+            customer=self.object).with_status().order_by('-date', '-id')
+        return context
 
 class CustomerDeleteView(DeleteView):
     template_name = DELETE_TEMPLATE
@@ -176,6 +167,7 @@ class CustomerDeleteView(DeleteView):
 
 class StandardCreateView(ContextMixin, CreateView):
     template_name = CREATE_TEMPLATE
+    query_budget = 5
     form_class = forms.StandardForm
     context = {
         'title': 'Create Standard'
@@ -183,6 +175,7 @@ class StandardCreateView(ContextMixin, CreateView):
 
 class StandardUpdateView(ContextMixin, UpdateView):
     template_name = CREATE_TEMPLATE
+    query_budget = 5
     form_class = forms.StandardForm
     model = models.Standard
     context = {
@@ -191,6 +184,7 @@ class StandardUpdateView(ContextMixin, UpdateView):
 
 class StandardListView(ContextMixin, FilterView):
     template_name = os.path.join('calibration','standard', 'list.html')
+    query_budget = 2
     queryset = models.Standard.objects.all()
     filterset_class = filters.StandardFilter
     paginate_by = 10
@@ -202,6 +196,7 @@ class StandardListView(ContextMixin, FilterView):
 
 class StandardDetailView(DetailView):
     template_name = os.path.join('calibration', 'standard', 'details.html')
+    query_budget = 2
     model = models.Standard
 
 class StandardDeleteView(DeleteView):
@@ -210,9 +205,70 @@ class StandardDeleteView(DeleteView):
     model = models.Standard
 
 
-class CalibrationListView(ContextMixin, FilterView):
+class CalibrationListMixin(object):
+    '''loads the columns shown by the calibration lists with the status 
+    computed by the database'''
+    list_fields = ['date', 'name_of_instrument', 'customer__name']
+
+    def get_queryset(self):
+        # built per request as the status depends on today's date
+        return self.model.objects.with_status().select_related(
+            'customer').only(*self.list_fields)
+
+
+class ExportMixin(object):
+    '''lets a filtered list be downloaded with ?export=csv or ?export=xlsx,
+    the export covers every row matched by the filters rather than the 
+    current page'''
+    export_name = 'calibrations'
+
+    def get(self, request, *args, **kwargs):
+        export = request.GET.get('export')
+        if not export:
+            return super().get(request, *args, **kwargs)
+
+        # the same queryset FilterView lists
+        self.filterset = self.get_filterset(self.get_filterset_class())
+        if self.filterset.is_bound and not self.filterset.is_valid() and \
+                self.get_strict():
+            queryset = self.filterset.queryset.none()
+        else:
+            queryset = self.filterset.qs
+
+        if export == 'csv':
+            response = StreamingHttpResponse(stream_csv(queryset), 
+                content_type='text/csv')
+        elif export == 'xlsx' and xlsxwriter is not None:
+            response = FileResponse(xlsx_file(queryset), content_type=\
+                'application/vnd.openxmlformats-officedocument.'
+                'spreadsheetml.sheet')
+        else:
+            raise Http404('Unsupported export format')
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+            self.export_name, export)
+        return response
+
+    def export_link(self, export):
+        query = self.request.GET.copy()
+        for key in ['after', 'before', 'page']:
+            query.pop(key, None)
+        query['export'] = export
+        return '?' + query.urlencode()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['export_links'] = [('CSV', self.export_link('csv'))]
+        if xlsxwriter is not None:
+            context['export_links'].append(('XLSX', self.export_link('xlsx')))
+        return context
+
+
+class CalibrationListView(CalibrationListMixin, KeysetPaginationMixin, 
+        ExportMixin, ContextMixin, FilterView):
     template_name = os.path.join('calibration', 'list.html')
-    queryset = models.GenericCalibration.objects.all()
+    query_budget = 2
+    model = models.GenericCalibration
+    list_fields = CalibrationListMixin.list_fields + ['type']
     filterset_class = filters.CalibrationFilter
     paginate_by = 10
 
@@ -221,17 +277,24 @@ class CalibrationListView(ContextMixin, FilterView):
     }
 
 
-class AutoclaveCalibrationListView(ContextMixin, FilterView):
+class AutoclaveCalibrationListView(CalibrationListMixin, 
+        KeysetPaginationMixin, ExportMixin, ContextMixin, FilterView):
     template_name = os.path.join('calibration', 'autoclave_list.html')
-    queryset = models.Autoclave.objects.all()
+    query_budget = 2
+    model = models.Autoclave
+    export_name = 'autoclave-calibrations'
     filterset_class = filters.AutoclaveCalibrationFilter
+    paginate_by = 10
     context = {
         'title': 'Autoclave Calibration List',
     }
 
-class BalanceCalibrationListView(ContextMixin, FilterView):
+class BalanceCalibrationListView(CalibrationListMixin, 
+        KeysetPaginationMixin, ExportMixin, ContextMixin, FilterView):
     template_name = os.path.join('calibration', 'balance_list.html')
-    queryset = models.Balance.objects.all()
+    query_budget = 2
+    model = models.Balance
+    export_name = 'balance-calibrations'
     filterset_class = filters.BalanceCalibrationFilter
     paginate_by = 10
 
@@ -240,23 +303,101 @@ class BalanceCalibrationListView(ContextMixin, FilterView):
     }
 
 
+class CalibrationIndexListView(KeysetPaginationMixin, ExportMixin, 
+        ContextMixin, FilterView):
+    '''every calibration of any type from the calibration index'''
+    template_name = os.path.join('calibration', 'index_list.html')
+    query_budget = 2
+    export_name = 'all-calibrations'
+    filterset_class = filters.CalibrationIndexFilter
+    paginate_by = 10
+
+    context = {
+        'title': 'All Calibrations',
+    }
+
+    def get_queryset(self):
+        return models.CalibrationIndex.objects.with_status().select_related(
+            'customer')
+
+
 class UploadView(ContextMixin, TemplateView):
     template_name = os.path.join('calibration', 'upload.html')
+    query_budget = 0
     context = {
         'ip': socket.gethostbyname(socket.gethostname())
     }
 
 
-class BalanceDetailView(DetailView):
-    model = models.Balance
+class CachedPDFMixin(object):
+    '''serves issued certificates from the on disk pdf cache, rendering 
+    and storing them on the first download'''
+    def render_pdf(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        with metrics.PDF_RENDER_SECONDS.time(
+                certificate=self.object._meta.model_name):
+            response.render()
+        return response
+
+    def render_to_response(self, context, **response_kwargs):
+        if not pdf_cache.is_cacheable(self.object):
+            return self.render_pdf(context, **response_kwargs)
+
+        # the results are those of the snapshot, or of the readings for a
+        # certificate issued before snapshots existed
+        snapshot = getattr(self, 'snapshot', None)
+        path = pdf_cache.cache_path(self.object, self.get_template_names(), {
+            'preview': context.get('preview'),
+            'snapshot': (snapshot.pk, snapshot.created) if snapshot else None,
+            'results': json.dumps(context.get('results'), sort_keys=True,
+                cls=DjangoJSONEncoder),
+        })
+        cached = pdf_cache.get(path)
+        metrics.cache_lookup('certificate_pdf', cached)
+        if cached:
+            try:
+                return FileResponse(open(path, 'rb'), 
+                    content_type='application/pdf', as_attachment=True,
+                    filename=self.get_pdf_filename())
+            except FileNotFoundError:
+                # evicted since the lookup, render it again
+                pass
+
+        response = self.render_pdf(context, **response_kwargs)
+        pdf_cache.put(path, response.content)
+        return response
+
+
+class CertificateResultsMixin(object):
+    '''adds the certificate results, read from the snapshot once the 
+    certificate has been issued. The readings are only loaded, with the 
+    reading_prefetches, for drafts and for certificates issued before 
+    snapshots existed.'''
+    reading_prefetches = []
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        self.snapshot = certificates.snapshot_for(self.object)
+        if self.snapshot:
+            context['results'] = self.snapshot.results
+        else:
+            prefetch_related_objects([self.object], *self.reading_prefetches)
+            context['results'] = certificates.certificate_results(self.object)
+        return context
+
+
+class BalanceDetailView(CertificateResultsMixin, DetailView):
+    queryset = models.Balance.objects.select_related('customer', 'standard')
+    reading_prefetches = BALANCE_READINGS + ['standard__standardline_set']
     template_name = os.path.join('calibration', 'certificates', 'balances.html')
+    query_budget = 10
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['preview'] = True
         return context
 
-class BalancePDFView(WeasyTemplateResponseMixin, BalanceDetailView):
+class BalancePDFView(CachedPDFMixin, WeasyTemplateResponseMixin, BalanceDetailView):
     pdf_filename = 'certificate.pdf'
 
     def get_context_data(self, **kwargs):
@@ -265,16 +406,25 @@ class BalancePDFView(WeasyTemplateResponseMixin, BalanceDetailView):
         return context
 
 
-class AutoclaveDetailView(DetailView):
-    model = models.Autoclave
+class AutoclaveDetailView(CertificateResultsMixin, DetailView):
+    queryset = models.Autoclave.objects.select_related('customer', 
+        'standard', 'temp_standard')
+    reading_prefetches = ['autoclavepressurecalibrationline_set', 
+        'autoclavetemperaturecalibrationline_set']
     template_name = os.path.join('calibration', 'certificates', 'autoclave.html')
+    query_budget = 4
 
 
-class AutoclavePDFView(WeasyTemplateResponseMixin, AutoclaveDetailView):
+class AutoclavePDFView(CachedPDFMixin, WeasyTemplateResponseMixin, AutoclaveDetailView):
     pdf_filename = 'certificate.pdf'
 
-class GenericDetailView(DetailView):
-    model = models.GenericCalibration
+class GenericDetailView(CertificateResultsMixin, DetailView):
+    queryset = models.GenericCalibration.objects.select_related('customer', 
+        'standard')
+    reading_prefetches = ['genericcalibrationline_set', 
+        'pressurecalibrationline_set']
+    query_budget = 4
+
     def get_template_names(self):
         mapping = {
             'current': 'current.html',
@@ -293,202 +443,55 @@ class GenericDetailView(DetailView):
 
         return [os.path.join('calibration', 'certificates', mapping[self.object.type])]
 
-class GenericPDFView(WeasyTemplateResponseMixin, GenericDetailView):
+class GenericPDFView(CachedPDFMixin, WeasyTemplateResponseMixin, GenericDetailView):
     pdf_filename = 'certificate.pdf'
 
+def queued_response(job):
+    return JsonResponse({
+        'status': 'ok',
+        'job': job.pk,
+        'status_url': reverse('calibration:upload-status', 
+            kwargs={'job_id': job.pk}),
+    })
+
 @csrf_exempt
+@query_budget(1)
 def upload_standards(request):
-    data = json.loads(request.body)
-    for std in data['standards']:
-        if models.Standard.objects.filter(name=std['name']).exists():
-            continue
-        standard = models.Standard.objects.create(
-            name=std['name'],
-            certificate=std['certificate'],
-            serial=std['serial'],
-            traceability=std['traceability']
-        )
-
-        for line in std['data']:
-            models.StandardLine.objects.create(
-                standard=standard,
-                nominal=line['nominal'],
-                actual=line['actual'],
-                uncertainty=line['uncertainty']
-            )
-    return JsonResponse({'status': 'ok'})
+    return queued_response(jobs.enqueue('standards', request))
 
 @csrf_exempt
+@query_budget(1)
 def upload_calibrations(request):
-    data = json.loads(request.body)
-    for cal in data['calibrations']:
-        date, start_time = cal['date'].split('T')
-        time = datetime.datetime.strptime(start_time.split('.')[0], '%H:%M:%S')
-        customer = None
-        cus_qs = models.Customer.objects.filter(name=cal['customer'])
-        if cus_qs.exists():
-            customer = cus_qs.first()
-        else:
-            customer = models.Customer.objects.create(name=cal['customer'])
-        if cal['type'] == 'balance':
-            bal = models.Balance.objects.create(
-                date=date,
-                start_time=time,
-                customer=customer,
-                manufacturer=cal['manufacturer'],
-                serial=cal['serial'],
-                immersion_depth=cal['immersion'],
-                model=cal['model'],
-                name_of_instrument=cal['instrument'],
-                resolution=cal['resolution'],
-                range_lower=cal['rangeLower'],
-                range_upper=cal['rangeUpper'],
-                units = cal['unit'],
-                standard=models.Standard.objects.filter(
-                    name=cal['standard']).first(),
-                location=cal['location'],
-                comments=cal.get('comments', '')
-            )
-
-            for cs in cal['cold_start']:
-                models.BalanceColdStart.objects.create(
-                    calibration=bal,
-                    measurement=cs[1],
-                    nominal=cal['cold_start_nominal']
-                )
-
-            for st in cal['settling_time']:
-                models.BalanceSettlingTime.objects.create(
-                    calibration=bal,
-                    measurement=st[1],   
-                )
-
-            for lin in cal['linearity_up']:
-                nominal, actual, linearity = lin
-                models.BalanceLinearity.objects.create(
-                    calibration=bal,
-                    actual=actual,
-                    nominal=nominal,
-                    measurement=linearity
-                )
-
-            for lin in cal['linearity']:
-                models.BalanceLinearityUpDown.objects.create(
-                    calibration=bal,
-                    measurement=lin[0],
-                )
-
-            for tare in cal['tare']:
-                t, indicated = tare
-                models.BalanceTaringLinearity.objects.create(
-                    calibration=bal,
-                    tare=t,
-                    indicated=indicated
-                )
-
-            
-            half = cal.get('repeatability', [])[:5]
-            full = cal.get('repeatability', [])[5:10]
-            
-            if len(half) == len(full):
-                for i, j in zip(half, full):
-                    models.BalanceRepeatability.objects.create(
-                        calibration=bal,
-                        half_load=i[0],
-                        full_load=j[0]
-                    )
-            for oc in cal['off_center_data']:
-                models.BalanceOffCenter.objects.create(
-                    calibration=bal,
-                    measurement=oc[1],
-                    mass_piece=cal['off_center_mass_piece']
-                )
-           
-            continue
-
-        elif cal['type'] == 'autoclave':
-            auto = models.Autoclave.objects.create(
-                date=date,
-                start_time=time,
-                customer=customer,
-                manufacturer=cal['manufacturer'],
-                serial=cal['serial'],
-                immersion_depth=cal['immersion'],
-                model=cal['model'],
-                name_of_instrument=cal['instrument'],
-                resolution=cal['pressureResolution'],
-                range_lower=cal['pressureRangeLower'],
-                range_upper=cal['pressureRangeUpper'],
-                units = cal['pressureUnit'],
-                standard=models.Standard.objects.filter(
-                    name=cal['pressureStandard']).first(),
-                resolution_temp=cal['resolution'],
-                range_temp_lower=cal['rangeLower'],
-                range_temp_upper=cal['rangeUpper'],
-                temp_unit = cal['unit'],
-                temp_standard=models.Standard.objects.filter(
-                    name=cal['standard']).first(),
-                location=cal['location'],
-                comments=cal.get('comments', '')
-            )
-
-            for temp in cal['tempData']:
-                inp, measured = temp
-                models.AutoclaveTemperatureCalibrationLine.objects.create(
-                    calibration=auto,
-                    input_signal=inp,
-                    measured=measured
-                )
-
-            for pres in cal['data']:
-                inp, measured = pres
-                models.AutoclavePressureCalibrationLine.objects.create(
-                    calibration=auto,
-                    applied_mass=inp,
-                    measured=measured
-                )
-            continue
-                
-        gc = models.GenericCalibration.objects.create(
-            date=date,
-                start_time=time,
-                customer=customer,
-                manufacturer=cal['manufacturer'],
-                serial=cal['serial'],
-                immersion_depth=cal['immersion'],
-                model=cal['model'],
-                name_of_instrument=cal['instrument'],
-                resolution=cal['resolution'],
-                range_lower=cal['rangeLower'],
-                range_upper=cal['rangeUpper'],
-                units = cal['unit'],
-                standard=models.Standard.objects.filter(
-                    name=cal['standard']).first(),
-                location=cal['location'],
-                comments=cal.get('comments', ''),
-                type=cal['type']
-        )
-        if cal['type'] == 'pressure':
-            for pres in cal['data']:
-                inp, measured = pres
-                models.PressureCalibrationLine.objects.create(
-                    calibration=gc,
-                    applied_mass=inp,
-                    measured=measured
-                )
-            continue
-
-        else:
-            for mea in cal['data']:
-                inp, measured = mea
-                models.GenericCalibrationLine.objects.create(
-                    calibration=gc,
-                    input_signal=inp,
-                    measured=measured
-                )
-    
-    
-    return JsonResponse({'status': 'ok'})
+    return queued_response(jobs.enqueue('calibrations', request))
+
+@query_budget(1)
+def upload_status(request, job_id=None):
+    job = get_object_or_404(models.IngestJob, pk=job_id)
+    return JsonResponse(job.as_dict())
+
+
+@query_budget(1)
+def search_calibrations(request):
+    '''ranked calibrations of every type matching the q parameter'''
+    try:
+        limit = min(int(request.GET.get('limit') or 20), 100)
+    except ValueError:
+        limit = 20
+    results = search.search(request.GET.get('q', ''), 
+        calibration_type=request.GET.get('type'), limit=limit)
+    return JsonResponse({
+        'query': request.GET.get('q', ''),
+        'results': [{
+            'type': cal.calibration_type,
+            'id': cal.calibration_id,
+            'url': cal.get_absolute_url(),
+            'instrument': cal.name_of_instrument,
+            'serial': cal.serial,
+            'customer': cal.customer.name if cal.customer else None,
+            'date': cal.date,
+            'status': cal.status,
+        } for cal in results],
+    })
 
 # def link_callback(uri, rel):
 #     """
@@ -537,9 +540,40 @@ def upload_calibrations(request):
 #     return response
 
 
+@query_budget(0)
+def metrics_view(request):
+    '''the metrics of every worker in the prometheus text format'''
+    return HttpResponse(metrics.registry.exposition(),
+        content_type=metrics.CONTENT_TYPE)
+
+
+@query_budget(3)
+def export_certificates(request):
+    '''streams a zip of the certificates selected by the customer, start 
+    and end query parameters, or by ids given as type:pk'''
+    ids = [i for i in request.GET.get('ids', '').split(',') if i]
+    customer = request.GET.get('customer') or None
+    start = request.GET.get('start') or None
+    end = request.GET.get('end') or None
+    # every certificate ever issued is too much to render in a request
+    if not (ids or customer or (start and end)):
+        return HttpResponseBadRequest('select a customer, a start and end '
+            'date or ids')
+    try:
+        certificates = select_certificates(customer=customer, start=start,
+            end=end, ids=ids)
+    except SelectionError as e:
+        return HttpResponseBadRequest(str(e))
+    response = StreamingHttpResponse(stream_zip(certificates), 
+        content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="certificates.zip"'
+    return response
+
+
 class GenerateCertificateView(FormView):
     form_class = forms.CertificateForm
     template_name = os.path.join('calibration', 'generate_certificate.html')
+    query_budget = 25
     
 
     def get_context_data(self, **kwargs):
@@ -563,6 +597,7 @@ class GenerateCertificateView(FormView):
         obj.temperature = form.cleaned_data['temperature']
         obj.humidity = form.cleaned_data['humidity']
         obj.save()
+        certificates.issue(obj)
 
         return super().form_valid(form)
 
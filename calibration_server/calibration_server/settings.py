@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'calibration.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +51,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'calibration.profiling.ProfilerMiddleware',
+    'calibration.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'calibration_server.urls'
@@ -72,6 +75,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'calibration_server.wsgi.application'
 
+# the tests use a local memory cache and temporary directories
+TEST_RUNNER = 'calibration.test_runner.CalibrationTestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -83,6 +89,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# file based so that every worker process sees the same dashboard snapshot
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -126,3 +143,33 @@ LOGIN_URL = '/login'
 LOGIN_REDIRECT_URL = '/dashboard'
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# uploads are written here until the ingest worker has processed them
+INGEST_JOB_DIR = os.path.join(BASE_DIR, 'ingest_jobs')
+# seconds without progress after which a running job is taken to have lost
+# its worker and is queued again, it must be longer than a batch takes
+INGEST_JOB_TIMEOUT = 60 * 60
+
+# issued certificate pdfs, least recently used files are evicted once the 
+# directory grows past the size limit in bytes
+CERTIFICATE_CACHE_DIR = os.path.join(BASE_DIR, 'certificate_cache')
+CERTIFICATE_CACHE_MAX_SIZE = 500 * 1024 * 1024
+
+# views that declare a query_budget raise when they make more queries, see
+# calibration.query_budget
+QUERY_BUDGET_ENFORCE = DEBUG
+
+# requests with an X-Profile header or profile parameter holding the token
+# (any value for superusers) are profiled into this directory, the
+# profiler is off while it is None, see calibration.profiling
+PROFILER_DIR = None
+PROFILER_TOKEN = ''
+PROFILER_KEEP = 200
+
+# without a directory /metrics/ serves the values of the process answering
+# it. Set it to a directory outside the checkout, such as
+# /run/calibration/metrics, to add up the gunicorn workers and the ingest
+# worker, each process then writes its values there and /metrics/ serves
+# the sum over the processes still running.
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5